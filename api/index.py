@@ -1,23 +1,30 @@
-from flask import Flask, render_template, request, jsonify
 import os
-import pdfplumber
-import re
-import csv
-import json
-from datetime import datetime
-from collections import defaultdict
-import logging
 import sys
 
 # Add parent directory to path to import firebase_db
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-import firebase_db
+import startup_timing
+
+# pdfplumber and firebase_admin are imported on first use (see get_pdfplumber and firebase_db),
+# so a cold start only pays for them when a request needs them
+with startup_timing.phase('imports'):
+    from flask import Flask, render_template, request, jsonify
+    import re
+    import csv
+    import json
+    import copy
+    from datetime import datetime
+    from collections import defaultdict
+    import logging
+    import firebase_db
+    import table_cache
 
 # suppress noisy pdfminer/pdfplumber warnings about invalid color tokens
 logging.getLogger('pdfminer').setLevel(logging.ERROR)
 logging.getLogger('pdfplumber').setLevel(logging.ERROR)
 
-app = Flask(__name__, template_folder='../templates')
+with startup_timing.phase('app setup'):
+    app = Flask(__name__, template_folder='../templates')
 
 # Use /tmp for uploads on Vercel (serverless environment)
 # Local development will still use 'uploads' folder
@@ -31,6 +38,12 @@ else:
 # Inventory folder is in parent directory
 app.config['INVENTORY_FOLDER'] = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'inventory')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+# Firebase state lives under stores/<DEFAULT_STORE>, the same node app.py uses for that store
+app.config['DEFAULT_STORE'] = os.environ.get('DEFAULT_STORE', 'default')
+# Compiled conversion/recipe tables (see table_cache.py): next to the CSVs so they can ship
+# with the deployment, then /tmp on Vercel where the deployment is read-only
+app.config['TABLE_CACHE_FILES'] = table_cache.cache_locations(
+    app.config['INVENTORY_FOLDER'], '/tmp' if os.environ.get('VERCEL') else None)
 
 try:
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -43,24 +56,69 @@ recipes = defaultdict(list)  # pos_item_name -> list of ingredients
 current_inventory = {}  # item_number -> {quantity, unit, description}
 invoice_history = []  # list of processed invoices
 sales_history = []  # list of processed sales
+# What Firebase holds: the inventory as last saved and how many history entries it has
+_firebase_saved = {'inventory': {}, 'invoice_history': 0, 'sales_history': 0}
 
 # Track if data is loaded
 _data_loaded = False
 
+_pdfplumber = None
+
 def ensure_data_loaded():
     """Ensure conversion and recipe data is loaded"""
     global _data_loaded
     if not _data_loaded:
+        with startup_timing.phase('tables'):
+            load_tables()
+        with startup_timing.phase('inventory state'):
+            load_inventory_state()
+        _data_loaded = True
+        print(f"Cold start: {startup_timing.summary()}")
+
+def get_pdfplumber():
+    """Import the PDF stack on first use; most requests never touch a PDF"""
+    global _pdfplumber
+    if _pdfplumber is None:
+        with startup_timing.phase('pdf imports'):
+            import pdfplumber
+        _pdfplumber = pdfplumber
+    return _pdfplumber
+
+def table_files():
+    """Paths of the conversion and recipe CSVs"""
+    return table_cache.table_files(app.config['INVENTORY_FOLDER'])
+
+def load_tables():
+    """Load conversions and recipes from the compiled tables file, rebuilding it when a CSV changed"""
+    try:
+        tables = table_cache.open_tables(app.config['TABLE_CACHE_FILES'], table_files())
+    except (OSError, ValueError) as e:
+        print(f"Compiled tables unavailable ({e}), parsing the CSVs")
         load_conversions()
         load_recipes()
-        load_inventory_state()
-        _data_loaded = True
+        return
+
+    with tables:
+        for item_number, (description, order_unit, items_per_case, usable_unit, notes) in tables.conversions():
+            conversions[item_number] = {
+                'description': description,
+                'order_unit': order_unit,
+                'items_per_case': items_per_case,
+                'usable_unit': usable_unit,
+                'notes': notes
+            }
+        for pos_item, ingredients in tables.recipes():
+            recipes[pos_item].extend(
+                {'item_number': item_number, 'description': description, 'quantity_used': quantity_used, 'unit': unit}
+                for item_number, description, quantity_used, unit in ingredients
+            )
+    print(f"Loaded {len(conversions)} conversion entries and recipes for {len(recipes)} POS items from {tables.path}")
 
 def load_conversions():
     """Load conversion table from CSV"""
     global conversions
     try:
-        conversion_file = os.path.join(app.config['INVENTORY_FOLDER'], 'DQ inventory - Conversion.csv')
+        conversion_file = table_files()[0]
         if not os.path.exists(conversion_file):
             print(f"Warning: Conversion file not found at {conversion_file}")
             return
@@ -85,7 +143,7 @@ def load_recipes():
     """Load recipe table from CSV"""
     global recipes
     try:
-        recipe_file = os.path.join(app.config['INVENTORY_FOLDER'], 'DQ inventory - Recipe.csv')
+        recipe_file = table_files()[1]
         if not os.path.exists(recipe_file):
             print(f"Warning: Recipe file not found at {recipe_file}")
             return
@@ -106,25 +164,70 @@ def load_recipes():
     except Exception as e:
         print(f"Error loading recipes: {e}")
 
+def history_entries(value):
+    """History list from Firebase, which returns a dict instead when some indexes are missing"""
+    if isinstance(value, dict):
+        return [entry for _, entry in sorted(value.items(), key=lambda item: int(item[0]))]
+    return list(value or [])
+
+def load_firebase_history(history_key, count):
+    """A store's whole invoice or sales history from Firebase, keeping each entry at its index"""
+    page = firebase_db.get_history_page(history_key, None, count, app.config['DEFAULT_STORE']) if count else {}
+    if page is None:
+        # Unread entries stay None so new ones are still written after them
+        print(f"Could not read {history_key} from Firebase")
+        page = {}
+    return [page.get(index) for index in range(count)]
+
+def inventory_state_delta():
+    """Changes since the last Firebase save, as a firebase_db.save_inventory_delta update"""
+    saved = _firebase_saved['inventory']
+    delta = {
+        'inventory': {item_number: item for item_number, item in current_inventory.items()
+                      if saved.get(item_number) != item},
+        'counters': {'invoice_count': len(invoice_history), 'sales_count': len(sales_history)},
+        'last_updated': datetime.now().isoformat()
+    }
+    for item_number in saved:
+        if item_number not in current_inventory:
+            delta['inventory'][item_number] = None
+    for history_key, history in (('invoice_history', invoice_history), ('sales_history', sales_history)):
+        if len(history) < _firebase_saved[history_key]:
+            # Cleared: replace the list, and forget the hashes app.py keeps for the cleared invoices
+            delta.setdefault('replace', {})[history_key] = history
+            if history_key == 'invoice_history':
+                delta['replace']['invoice_hashes'] = None
+        else:
+            delta[history_key] = {str(index): history[index]
+                                  for index in range(_firebase_saved[history_key], len(history))}
+    return delta
+
+def mark_firebase_saved():
+    """Remember what Firebase holds now, so the next save only writes what changed after this"""
+    _firebase_saved['inventory'] = copy.deepcopy(current_inventory)
+    _firebase_saved['invoice_history'] = len(invoice_history)
+    _firebase_saved['sales_history'] = len(sales_history)
+
 def save_inventory_state():
     """Save current inventory state to Firebase (with local file fallback)"""
     try:
-        state = {
-            'inventory': current_inventory,
-            'invoice_history': invoice_history,
-            'sales_history': sales_history,
-            'last_updated': datetime.now().isoformat()
-        }
-
-        # Try to save to Firebase first
+        # Try to save to Firebase first, under the same stores/<id> node app.py uses
         if firebase_db.is_firebase_configured():
-            success = firebase_db.save_inventory_state(state)
+            success = firebase_db.save_inventory_delta(inventory_state_delta(), app.config['DEFAULT_STORE'])
             if success:
+                mark_firebase_saved()
                 print("Inventory state saved to Firebase")
                 return
             else:
                 print("Failed to save to Firebase, falling back to local file")
 
+        state = {
+            'inventory': current_inventory,
+            'invoice_history': invoice_history,
+            'sales_history': sales_history,
+            'last_updated': datetime.now().isoformat()
+        }
+
         # Fallback to local file if Firebase not configured or fails
         with open(app.config['INVENTORY_STATE_FILE'], 'w') as f:
             json.dump(state, f, indent=2)
@@ -138,15 +241,27 @@ def load_inventory_state():
     try:
         # Try to load from Firebase first
         if firebase_db.is_firebase_configured():
+            summary = firebase_db.load_inventory_summary(app.config['DEFAULT_STORE'])
+            if summary:
+                counters = summary['counters']
+                current_inventory = summary['inventory']
+                invoice_history = load_firebase_history('invoice_history', counters.get('invoice_count', 0))
+                sales_history = load_firebase_history('sales_history', counters.get('sales_count', 0))
+                mark_firebase_saved()
+                print(f"Loaded inventory state from Firebase with {len(current_inventory)} items")
+                return
+
+            # The single-store node written before stores existed; moved under the store once
             state = firebase_db.load_inventory_state()
             if state:
-                current_inventory = state.get('inventory', {})
-                invoice_history = state.get('invoice_history', [])
-                sales_history = state.get('sales_history', [])
-                print(f"Loaded inventory state from Firebase with {len(current_inventory)} items")
+                current_inventory = state.get('inventory') or {}
+                invoice_history = history_entries(state.get('invoice_history'))
+                sales_history = history_entries(state.get('sales_history'))
+                save_inventory_state()
+                print(f"Moved the single-store inventory state into store {app.config['DEFAULT_STORE']} "
+                      f"({len(current_inventory)} items)")
                 return
-            else:
-                print("No data in Firebase, checking local file...")
+            print("No data in Firebase, checking local file...")
 
         # Fallback to local file
         if os.path.exists(app.config['INVENTORY_STATE_FILE']):
@@ -172,7 +287,7 @@ def extract_invoice_data(pdf_path):
     }
 
     try:
-        with pdfplumber.open(pdf_path) as pdf:
+        with get_pdfplumber().open(pdf_path) as pdf:
             full_text = ''
             for page in pdf.pages:
                 page_text = page.extract_text() or ''
@@ -250,7 +365,7 @@ def extract_invoice_data(pdf_path):
 
 @app.route('/')
 def index():
-    ensure_data_loaded()
+    # The page fetches /inventory itself, so serving it doesn't wait for the data load
     return render_template('index.html')
 
 def process_invoice_to_inventory(invoice_data):
@@ -512,6 +627,8 @@ def upload_starting_inventory():
         'items_added': result['items_added']
     })
 
+INVENTORY_FIELDS = ('item_number', 'description', 'quantity', 'unit')
+
 @app.route('/inventory')
 def get_inventory():
     """Get current inventory state"""
@@ -525,29 +642,75 @@ def get_inventory():
         }
         for item_number, data in sorted(current_inventory.items(), key=lambda x: x[1]['description'])
     ]
+    total_items = len(inventory_list)
+
+    # Optional filters and paging, as in app.py (the cursor here is an offset into the filtered list)
+    prefix = request.args.get('prefix', '').upper()
+    unit = request.args.get('unit', '').lower()
+    try:
+        low_stock = float(request.args['low_stock']) if request.args.get('low_stock') else None
+        start = int(request.args.get('cursor') or 0)
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+        if start < 0:
+            raise ValueError('cursor is negative')
+    except ValueError:
+        return jsonify({'error': 'Invalid low_stock, cursor or limit'}), 400
+
+    fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+    unknown = [field for field in fields if field not in INVENTORY_FIELDS]
+    if unknown:
+        return jsonify({'error': f"Unknown fields: {', '.join(unknown)}"}), 400
+
+    if prefix:
+        inventory_list = [item for item in inventory_list if item['item_number'].upper().startswith(prefix)]
+    if unit:
+        inventory_list = [item for item in inventory_list if (item['unit'] or '').lower() == unit]
+    if low_stock is not None:
+        inventory_list = [item for item in inventory_list if item['quantity'] < low_stock]
+
+    next_cursor = None
+    if limit is not None:
+        limit = max(1, min(limit, 1000))
+        if start + limit < len(inventory_list):
+            next_cursor = str(start + limit)
+        inventory_list = inventory_list[start:start + limit]
+    else:
+        # Without a limit the cursor still skips the pages already read
+        inventory_list = inventory_list[start:]
+
+    if fields:
+        inventory_list = [{field: item[field] for field in fields} for item in inventory_list]
 
     return jsonify({
         'inventory': inventory_list,
-        'total_items': len(inventory_list),
+        'total_items': total_items,
         'invoice_count': len(invoice_history),
-        'sales_count': len(sales_history)
+        'sales_count': len(sales_history),
+        'next_cursor': next_cursor
     })
 
-@app.route('/update_inventory', methods=['POST'])
-def update_inventory():
-    """Manually update inventory quantity"""
-    ensure_data_loaded()
-    data = request.get_json()
+def read_count(data):
+    """(item_number, quantity, None) for one manual count, or (None, None, error message)"""
+    if not isinstance(data, dict):
+        data = {}
     item_number = data.get('item_number')
     new_quantity = data.get('quantity')
 
     if not item_number or new_quantity is None:
-        return jsonify({'error': 'Missing item_number or quantity'}), 400
+        return None, None, 'Missing item_number or quantity'
 
     try:
-        new_quantity = float(new_quantity)
-    except:
-        return jsonify({'error': 'Invalid quantity format'}), 400
+        return item_number, float(new_quantity), None
+    except (TypeError, ValueError):
+        return None, None, 'Invalid quantity format'
+
+@app.route('/update_inventory', methods=['POST'])
+def update_inventory():
+    """Manually update inventory quantity"""
+    ensure_data_loaded()
+    item_number, new_quantity, error = read_count(request.get_json(silent=True))
+    if error:
+        return jsonify({'error': error}), 400
 
     if item_number in current_inventory:
         old_quantity = current_inventory[item_number]['quantity']
@@ -564,6 +727,48 @@ def update_inventory():
     else:
         return jsonify({'error': 'Item not found in inventory'}), 404
 
+@app.route('/update_inventory/batch', methods=['POST'])
+def update_inventory_batch():
+    """Manually update the quantities of many items with one save"""
+    ensure_data_loaded()
+    data = request.get_json(silent=True)
+    updates = data.get('updates') if isinstance(data, dict) else data
+    if not isinstance(updates, list) or not updates:
+        return jsonify({'error': 'Missing updates'}), 400
+
+    # Check every count before changing anything
+    counts = []
+    for position, entry in enumerate(updates):
+        item_number, new_quantity, error = read_count(entry)
+        if error:
+            return jsonify({'error': f'{error} (update {position})'}), 400
+        counts.append((item_number, new_quantity))
+
+    items = []
+    not_found = []
+    for item_number, new_quantity in counts:
+        if item_number in current_inventory:
+            old_quantity = current_inventory[item_number]['quantity']
+            current_inventory[item_number]['quantity'] = new_quantity
+            items.append({
+                'item_number': item_number,
+                'description': current_inventory[item_number]['description'],
+                'old_quantity': old_quantity,
+                'new_quantity': new_quantity
+            })
+        else:
+            not_found.append(item_number)
+
+    if items:
+        save_inventory_state()
+
+    return jsonify({
+        'success': True,
+        'updated': len(items),
+        'items': items,
+        'not_found': not_found
+    })
+
 @app.route('/clear', methods=['POST'])
 def clear_inventory():
     """Clear all inventory data and history"""
@@ -584,5 +789,10 @@ def clear_inventory():
 
     return jsonify({'success': True})
 
+@app.route('/startup')
+def startup_timings():
+    """How long each phase of this instance's cold start took"""
+    return jsonify(startup_timing.report())
+
 # For Vercel serverless - data will be lazy-loaded on first request
 # The 'app' variable is automatically used by Vercel's Python runtime
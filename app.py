@@ -1,240 +1,645 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context
 import os
-import pdfplumber
-import re
+import io
 import csv
 import json
+import hashlib
 from datetime import datetime
 from collections import defaultdict
-import logging
 import socket
+import shutil
+import time
+import uuid
+import atexit
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from werkzeug.utils import secure_filename
 import firebase_db
-
-# suppress noisy pdfminer/pdfplumber warnings about invalid color tokens
-logging.getLogger('pdfminer').setLevel(logging.ERROR)
-logging.getLogger('pdfplumber').setLevel(logging.ERROR)
+from catalog import CatalogManager
+from catalog_cache import CatalogCache
+from event_log import EventLog, apply_event
+from inventory_store import add_op, deduct_op, set_op, set_quantity_op
+from inventory_view import decode_cursor, encode_cursor
+from reorder import ReorderEngine
+from records import Conversion, RecipeIngredient, intern_text
+from invoice_extraction import (EXTRACTION_MODES, PARSER_VERSION, discard_pool, process_pool,
+                                timed_extract_invoice_data)
+from line_parsers import PARSERS
+from column_templates import TEMPLATES
+from parse_cache import ParseCache, hash_file
+from history import PagedHistory
+from jobs import JobQueue
+from stores import Store, StoreRegistry, valid_store_id
+from timeseries import TimeSeriesStore
+import table_cache
+from write_behind import WriteBehindScheduler
 
 app = Flask(__name__)
 
 # Use /tmp for uploads on Vercel (serverless environment)
 # Local development will still use 'uploads' folder
+# Each store keeps its state files in STORES_FOLDER/<store_id>/. The INVENTORY_* files are the
+# single-store state from before stores existed; the default store starts from them.
 if os.environ.get('VERCEL'):
     app.config['UPLOAD_FOLDER'] = '/tmp/uploads'
+    app.config['STORES_FOLDER'] = '/tmp/stores'
     app.config['INVENTORY_STATE_FILE'] = '/tmp/inventory_state.json'
+    app.config['INVENTORY_SNAPSHOT_FILE'] = '/tmp/inventory_state.snapshot'
+    app.config['INVENTORY_EVENT_LOG'] = '/tmp/inventory_events.log'
 else:
     app.config['UPLOAD_FOLDER'] = 'uploads'
+    app.config['STORES_FOLDER'] = 'stores'
     app.config['INVENTORY_STATE_FILE'] = 'inventory_state.json'
+    app.config['INVENTORY_SNAPSHOT_FILE'] = 'inventory_state.snapshot'
+    app.config['INVENTORY_EVENT_LOG'] = 'inventory_events.log'
 
 app.config['INVENTORY_FOLDER'] = 'inventory'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+# Worker processes used to parse PDFs from a multi-file upload (1 = parse serially)
+app.config['UPLOAD_WORKERS'] = int(os.environ.get('UPLOAD_WORKERS', os.cpu_count() or 1))
+# 'delta' writes only what changed since the last save, 'full' rewrites the whole state every time
+app.config['PERSISTENCE_MODE'] = os.environ.get('PERSISTENCE_MODE', 'delta')
+# Take a binary snapshot of the local state after this many logged events
+app.config['SNAPSHOT_EVERY'] = int(os.environ.get('SNAPSHOT_EVERY', 100))
+# 'write_behind' saves on a background thread, 'sync' saves before the request returns.
+# Serverless platforms freeze background threads between requests, so they default to sync.
+_serverless = bool(os.environ.get('VERCEL') or os.environ.get('K_SERVICE'))
+app.config['DURABILITY_MODE'] = os.environ.get('DURABILITY_MODE', 'sync' if _serverless else 'write_behind')
+# Write-behind flushes after this many seconds, or sooner once this many changes are waiting
+app.config['WRITE_BEHIND_INTERVAL'] = float(os.environ.get('WRITE_BEHIND_INTERVAL', 2.0))
+app.config['WRITE_BEHIND_MAX_PENDING'] = int(os.environ.get('WRITE_BEHIND_MAX_PENDING', 50))
+# CSV uploads are applied to inventory in batches of this many rows as they are read
+app.config['CSV_CHUNK_ROWS'] = int(os.environ.get('CSV_CHUNK_ROWS', 1000))
+# Parsed invoices are cached by the SHA-256 of the PDF; least recently used entries go first
+app.config['PARSE_CACHE_DIR'] = os.environ.get('PARSE_CACHE_DIR', '/tmp/parse_cache' if _serverless else 'parse_cache')
+app.config['PARSE_CACHE_MAX_ENTRIES'] = int(os.environ.get('PARSE_CACHE_MAX_ENTRIES', 500))
+app.config['PARSE_CACHE_MAX_BYTES'] = int(os.environ.get('PARSE_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+# An invoice PDF that was already added is 'skip'ped, or added again and 'flag'ged in the response
+app.config['DUPLICATE_INVOICES'] = os.environ.get('DUPLICATE_INVOICES', 'skip')
+# How invoice lines are found: 'text' (regex over page text) or 'table' (word positions + column
+# templates). An upload can pick its own with the 'extraction' and 'supplier' form fields.
+app.config['INVOICE_EXTRACTION'] = os.environ.get('INVOICE_EXTRACTION', 'text')
+# Compiled conversion/recipe tables (see table_cache.py): next to the CSVs, then /tmp on
+# serverless platforms where the deployment is read-only
+app.config['TABLE_CACHE_FILES'] = table_cache.cache_locations(app.config['INVENTORY_FOLDER'], '/tmp' if _serverless else None)
+# Where conversions and recipes come from: 'local' (the CSVs) or 'firebase' (conversion_table and
+# recipe_table, reloaded whenever they change there; the CSVs are used if Firebase has no tables)
+app.config['CATALOG_SOURCE'] = os.environ.get('CATALOG_SOURCE', 'local')
+# Last catalog downloaded from Firebase; reused while catalog_version is unchanged, and when offline
+app.config['CATALOG_CACHE_FILE'] = os.environ.get('CATALOG_CACHE_FILE', '/tmp/catalog_cache.json' if _serverless else 'catalog_cache.json')
+# Seconds between checks of the CSVs for changes (0 = only reload through POST /catalog/reload)
+app.config['CATALOG_RELOAD_INTERVAL'] = float(os.environ.get('CATALOG_RELOAD_INTERVAL', 5.0))
+# 'async' queues /upload as a background job and returns its id at once; 'sync' processes it in the
+# request. Serverless platforms freeze background threads between requests, so they default to sync.
+app.config['UPLOAD_MODE'] = os.environ.get('UPLOAD_MODE', 'sync' if _serverless else 'async')
+# SQLite file holding queued upload jobs and their progress, the worker threads that run them and
+# how long finished jobs stay available at /jobs/<id>
+app.config['JOB_DB'] = os.environ.get('JOB_DB', '/tmp/jobs.sqlite3' if _serverless else 'jobs.sqlite3')
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['JOB_RETENTION_HOURS'] = float(os.environ.get('JOB_RETENTION_HOURS', 7 * 24))
+# Store used by routes without a /stores/<store_id> prefix
+app.config['DEFAULT_STORE'] = os.environ.get('DEFAULT_STORE', 'default')
+# Stores kept in memory; the least recently used idle store is written out and dropped beyond this
+app.config['MAX_LOADED_STORES'] = int(os.environ.get('MAX_LOADED_STORES', 16))
+# Reorder alerts: usage is averaged over the last REORDER_WINDOW_DAYS days; an item needs ordering when it
+# covers fewer than REORDER_LEAD_DAYS days, and the suggested order lasts REORDER_TARGET_DAYS days after delivery
+app.config['REORDER_WINDOW_DAYS'] = int(os.environ.get('REORDER_WINDOW_DAYS', 28))
+app.config['REORDER_LEAD_DAYS'] = float(os.environ.get('REORDER_LEAD_DAYS', 3))
+app.config['REORDER_TARGET_DAYS'] = float(os.environ.get('REORDER_TARGET_DAYS', 7))
+# Quantity history: days each item's raw changes, hourly and daily rollups are kept
+app.config['TIMESERIES_RAW_DAYS'] = float(os.environ.get('TIMESERIES_RAW_DAYS', 7))
+app.config['TIMESERIES_HOURLY_DAYS'] = float(os.environ.get('TIMESERIES_HOURLY_DAYS', 90))
+app.config['TIMESERIES_DAILY_DAYS'] = float(os.environ.get('TIMESERIES_DAILY_DAYS', 5 * 365))
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# Data structures
-conversions = {}  # item_number -> conversion info
-recipes = defaultdict(list)  # pos_item_name -> list of ingredients
-current_inventory = {}  # item_number -> {quantity, unit, description}
-invoice_history = []  # list of processed invoices
-sales_history = []  # list of processed sales
-
-def load_conversions():
-    """Load conversion table from CSV"""
-    global conversions
-    conversion_file = os.path.join(app.config['INVENTORY_FOLDER'], 'DQ inventory - Conversion.csv')
-    if not os.path.exists(conversion_file):
-        print(f"Warning: Conversion file not found at {conversion_file}")
-        return
+# Inventory, history and event log live on a Store per location (see stores.py);
+# parsed invoices and the catalog are shared by all stores
+parse_cache = ParseCache(app.config['PARSE_CACHE_DIR'], PARSER_VERSION,
+                         max_entries=app.config['PARSE_CACHE_MAX_ENTRIES'],
+                         max_bytes=app.config['PARSE_CACHE_MAX_BYTES'])
 
-    with open(conversion_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            item_number = row['item_number'].strip()
-            if item_number:
-                conversions[item_number] = {
-                    'description': row['description'].strip(),
-                    'order_unit': row['order_unit'].strip(),
-                    'items_per_case': row['items_per_case'].strip(),
-                    'usable_unit': row['usable_unit'].strip(),
-                    'notes': row.get('notes', '').strip()
-                }
-    print(f"Loaded {len(conversions)} conversion entries")
-
-def load_recipes():
-    """Load recipe table from CSV"""
-    global recipes
-    recipe_file = os.path.join(app.config['INVENTORY_FOLDER'], 'DQ inventory - Recipe.csv')
-    if not os.path.exists(recipe_file):
-        print(f"Warning: Recipe file not found at {recipe_file}")
+def read_local_tables():
+    """Catalog tables from the compiled tables file (rebuilt when a CSV changed), or straight from the CSVs"""
+    csv_paths = table_cache.table_files(app.config['INVENTORY_FOLDER'])
+    try:
+        with table_cache.open_tables(app.config['TABLE_CACHE_FILES'], csv_paths) as tables:
+            conversion_rows = dict(tables.conversions())
+            recipe_rows = dict(tables.recipes())
+            checksum, source = tables.checksum, tables.path
+    except OSError as e:
+        print(f"Compiled tables unavailable ({e}), parsing the CSVs")
+        checksum, source = table_cache.tables_checksum(csv_paths), app.config['INVENTORY_FOLDER']
+        conversion_rows, recipe_rows = table_cache.read_csv_tables(*csv_paths)
+
+    conversions = {item_number: Conversion(*fields) for item_number, fields in conversion_rows.items()}
+    recipes = {
+        pos_item: [RecipeIngredient(*ingredient) for ingredient in ingredients]
+        for pos_item, ingredients in recipe_rows.items()
+    }
+    return conversions, recipes, checksum.hex(), source
+
+def download_catalog_tables():
+    """Both catalog tables from Firebase, or None if either is missing or unreachable"""
+    conversion_table = firebase_db.load_conversion_table()
+    recipe_table = firebase_db.load_recipe_table()
+    if not conversion_table or not recipe_table:
+        return None
+    return conversion_table, recipe_table
+
+def read_firebase_tables():
+    """Catalog tables from Firebase through the local catalog cache, or None if neither has them"""
+    if firebase_db.is_firebase_configured():
+        cached = catalog_cache.get_tables(firebase_db.get_catalog_version, download_catalog_tables)
+    else:
+        # Offline: whatever was downloaded last
+        cached = catalog_cache.get_tables(lambda: None, lambda: None)
+    if cached is None:
+        return None
+    conversion_table, recipe_table = cached['conversion_table'], cached['recipe_table']
+
+    # Firebase returns keys sorted; 'position' (written by /catalog/publish) restores the CSV order
+    # that invoice matching depends on
+    ordered = sorted((item for item in conversion_table.items() if item[1]),
+                     key=lambda item: item[1].get('position', len(conversion_table)))
+    conversions = {
+        intern_text(item_number): Conversion(
+            conv.get('description', ''),
+            conv.get('order_unit', ''),
+            str(conv.get('items_per_case', '')),
+            conv.get('usable_unit', ''),
+            conv.get('notes', '')
+        )
+        for item_number, conv in ordered
+    }
+    recipes = {
+        intern_text(pos_item): [
+            RecipeIngredient(
+                ingredient['item_number'],
+                ingredient.get('description', ''),
+                float(ingredient.get('quantity_used') or 0),
+                ingredient.get('unit', '')
+            )
+            for ingredient in ingredients if ingredient
+        ]
+        for pos_item, ingredients in recipe_table.items() if ingredients
+    }
+    checksum = hashlib.sha256(json.dumps([conversion_table, recipe_table], sort_keys=True).encode('utf-8'))
+    return conversions, recipes, checksum.hexdigest(), f"firebase ({cached['status']})"
+
+def read_catalog_tables():
+    """Conversions, recipes, checksum and source for a new catalog version (CatalogManager loader)"""
+    tables = None
+    if app.config['CATALOG_SOURCE'] == 'firebase':
+        tables = read_firebase_tables()
+        if tables is None:
+            print("No catalog tables in Firebase or the catalog cache, using the local files")
+    if tables is None:
+        tables = read_local_tables()
+    conversions, recipes, _, source = tables
+    print(f"Read {len(conversions)} conversion entries and recipes for {len(recipes)} POS items from {source}")
+    return tables
+
+def catalog_publish_tables():
+    """The local catalog tables in the shape stored in Firebase (conversions keep their CSV position)"""
+    conversions, recipes, _, _ = read_local_tables()
+    conversion_table = {}
+    for position, (item_number, conv) in enumerate(conversions.items()):
+        conversion_table[item_number] = conv.to_dict()
+        conversion_table[item_number]['position'] = position
+    recipe_table = {
+        pos_item: [ingredient.to_dict() for ingredient in ingredients]
+        for pos_item, ingredients in recipes.items()
+    }
+    return conversion_table, recipe_table
+
+catalog_cache = CatalogCache(app.config['CATALOG_CACHE_FILE'])
+
+# Conversions and recipes, with their matching index and recipe matrix, as one versioned snapshot.
+# A request reads catalog_manager.current once and uses that snapshot throughout.
+catalog_manager = CatalogManager(read_catalog_tables, table_cache.table_files(app.config['INVENTORY_FOLDER']),
+                                 interval=app.config['CATALOG_RELOAD_INTERVAL'])
+
+def capture_inventory_state(store):
+    """Consistent copy of a store's full state plus the sequence number of the last event in it"""
+    # Pull in history that is still only in Firebase before taking the locks
+    for history in (store.invoice_history, store.sales_history):
+        if not history.complete:
+            history.to_list()
+
+    # Same lock order as apply_inventory_batch: item stripes first, then the event lock
+    with store.inventory.lock_all(), store.event_lock:
+        state = {
+            'inventory': store.inventory.to_dict(),
+            'invoice_history': store.invoice_history.to_list(),
+            'sales_history': store.sales_history.to_list(),
+            'last_updated': datetime.now().isoformat()
+        }
+        return state, store.persisted['seq']
+
+def build_inventory_state(store):
+    """Full state document as stored in the local state file"""
+    return capture_inventory_state(store)[0]
+
+def capture_firebase_state(store):
+    """Full Firebase write (as a save_inventory_delta update) plus its event sequence number.
+
+    The inventory, counters and invoice hashes are replaced outright. History
+    is only replaced when all of it is in memory; otherwise the entries we hold
+    are written back and the rest is left alone in Firebase.
+    """
+    with store.inventory.lock_all(), store.event_lock:
+        delta = {
+            'replace': {'inventory': store.inventory.to_dict()},
+            'counters': {'invoice_count': store.invoice_history.count, 'sales_count': store.sales_history.count},
+            'last_updated': datetime.now().isoformat()
+        }
+        for history_key, history in (('invoice_history', store.invoice_history),
+                                     ('sales_history', store.sales_history)):
+            if history.complete:
+                delta['replace'][history_key] = history.to_list()
+            else:
+                delta[history_key] = {str(index): entry for index, entry in history.known().items()}
+        with store.invoice_hash_lock:
+            if store.invoice_history.complete:
+                delta['replace']['invoice_hashes'] = {content_hash: True for content_hash in store.invoice_hashes}
+            else:
+                delta['invoice_hashes'] = list(store.invoice_hashes)
+        return delta, store.persisted['seq']
+
+def record_event(store, event_type, items, history_key=None, entry=None):
+    """Record a mutation as an event.
+
+    items maps each touched item number to its new value (None if removed).
+    When given, entry is appended to the named history list. The event is
+    written on the store's next save.
+    """
+    with store.event_lock:
+        store.persisted['seq'] += 1
+        event = {
+            'seq': store.persisted['seq'],
+            'type': event_type,
+            'at': datetime.now().isoformat(),
+            'inventory': dict(items)
+        }
+        if history_key:
+            history = store.invoice_history if history_key == 'invoice_history' else store.sales_history
+            event[history_key] = {str(history.append(entry)): entry}
+        store.pending_events.append(event)
+    return event
+
+def apply_inventory_batch(store, ops, event_type, history_key=None, make_entry=None):
+    """Apply inventory ops to a store atomically and record them as a single event.
+
+    make_entry(results) may return a history entry to append, or None to skip it.
+    The event is recorded while the item locks are still held, so event order
+    always matches the order the changes were applied in.
+    """
+    def record(results):
+        entry = make_entry(results) if make_entry else None
+        changed = {result.op.item_number: result.new for result in results if result.applied}
+        if changed or entry is not None:
+            record_event(store, event_type, changed, history_key if entry is not None else None, entry)
+            store.inventory_view.apply(results)
+            # Only the items in this batch are checked for reorder alerts
+            store.reorder.apply(results, catalog_manager.current.conversions)
+            store.timeseries.record(results, event_type)
+
+    return store.inventory.apply_batch(ops, on_applied=record)
+
+def collect_delta(events):
+    """Merge events into one delta: last value per item, all new history entries
+    and the history counters and invoice hashes that go with them"""
+    delta = {'inventory': {}, 'invoice_history': {}, 'sales_history': {}, 'counters': {}}
+    for event in events:
+        delta['inventory'].update(event.get('inventory', {}))
+        for history_key in ('invoice_history', 'sales_history'):
+            delta[history_key].update(event.get(history_key, {}))
+    for history_key, counter in (('invoice_history', 'invoice_count'), ('sales_history', 'sales_count')):
+        if delta[history_key]:
+            delta['counters'][counter] = max(int(index) for index in delta[history_key]) + 1
+    delta['invoice_hashes'] = [entry['content_hash'] for entry in delta['invoice_history'].values()
+                               if entry and entry.get('content_hash')]
+    delta['last_updated'] = datetime.now().isoformat()
+    return delta
+
+def write_local_state(store):
+    """Write the full state as JSON (PERSISTENCE_MODE=full)"""
+    tmp_path = store.state_file + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(build_inventory_state(store), f)
+    os.replace(tmp_path, store.state_file)
+    # The JSON file is now the newest copy of the state
+    store.event_log.clear()
+
+def write_local_snapshot(store):
+    """Snapshot the full state and truncate the event log"""
+    state, seq = capture_inventory_state(store)
+    store.event_log.write_snapshot(state, seq)
+
+def drain_pending_events(store, count):
+    """Drop the first count pending events once they have been written"""
+    with store.event_lock:
+        del store.pending_events[:count]
+
+def save_inventory_state(store, full=False):
+    """Save a store's inventory state to Firebase (with local file fallback).
+
+    In delta mode only the events recorded since the last save are written:
+    Firebase gets a multi-path update of the touched items and new history
+    entries, the local store appends them to the event log and snapshots every
+    SNAPSHOT_EVERY events. Pass full=True (or set PERSISTENCE_MODE=full) to
+    rewrite everything.
+    """
+    # Usage rates and quantity history are only kept locally
+    store.reorder.save()
+    store.timeseries.flush()
+
+    if full or app.config['PERSISTENCE_MODE'] != 'delta':
+        save_full_inventory_state(store)
         return
 
-    with open(recipe_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            pos_item = row['pos_item_name'].strip()
-            item_number = row['inventory_item_number'].strip()
-            if pos_item and item_number:
-                recipes[pos_item].append({
-                    'item_number': item_number,
-                    'description': row['inventory_description'].strip(),
-                    'quantity_used': float(row['quantity_used']) if row['quantity_used'] else 0,
-                    'unit': row['unit'].strip()
-                })
-    print(f"Loaded recipes for {len(recipes)} POS items")
-
-def save_inventory_state():
-    """Save current inventory state to Firebase"""
-    state = {
-        'inventory': current_inventory,
-        'invoice_history': invoice_history,
-        'sales_history': sales_history,
-        'last_updated': datetime.now().isoformat()
-    }
+    # Take only what is there now; events recorded while we write stay pending
+    with store.event_lock:
+        events = store.pending_events[:]
+    if not events:
+        return
 
-    # Try to save to Firebase first
     if firebase_db.is_firebase_configured():
-        success = firebase_db.save_inventory_state(state)
+        if store.persisted['firebase_synced']:
+            delta = collect_delta(events)
+            success = firebase_db.save_inventory_delta(delta, store.store_id)
+        else:
+            # Firebase may be behind (first save, or an earlier write failed)
+            success = firebase_db.save_inventory_delta(capture_firebase_state(store)[0], store.store_id)
         if success:
-            print("Inventory state saved to Firebase")
+            store.persisted['firebase_synced'] = True
+            drain_pending_events(store, len(events))
+            print(f"Inventory delta for store {store.store_id} saved to Firebase ({len(events)} events)")
             return
         else:
-            print("Failed to save to Firebase, falling back to local file")
+            store.persisted['firebase_synced'] = False
+            print("Failed to save to Firebase, falling back to local snapshot")
+            write_local_snapshot(store)
+            drain_pending_events(store, len(events))
+            print(f"Inventory state for store {store.store_id} saved to local snapshot")
+            return
 
-    # Fallback to local file if Firebase not configured or fails
-    with open(app.config['INVENTORY_STATE_FILE'], 'w') as f:
-        json.dump(state, f, indent=2)
-    print("Inventory state saved to local file")
+    store.event_log.append(events)
+    drain_pending_events(store, len(events))
+    print(f"Appended {len(events)} events to the event log of store {store.store_id}")
 
-def load_inventory_state():
-    """Load inventory state from Firebase (with local file fallback)"""
-    global current_inventory, invoice_history, sales_history
+    if (store.event_log.events_since_snapshot >= app.config['SNAPSHOT_EVERY'] or
+            not os.path.exists(store.event_log.snapshot_path)):
+        write_local_snapshot(store)
+        print(f"Wrote local inventory snapshot for store {store.store_id}")
 
-    # Try to load from Firebase first
-    if firebase_db.is_firebase_configured():
-        state = firebase_db.load_inventory_state()
-        if state:
-            current_inventory = state.get('inventory', {})
-            invoice_history = state.get('invoice_history', [])
-            sales_history = state.get('sales_history', [])
-            print(f"Loaded inventory state from Firebase with {len(current_inventory)} items")
+def save_full_inventory_state(store):
+    """Rewrite a store's complete inventory state"""
+    firebase = firebase_db.is_firebase_configured()
+    state, seq = capture_firebase_state(store) if firebase else capture_inventory_state(store)
+    with store.event_lock:
+        # Everything up to seq is in this copy
+        store.pending_events[:] = [event for event in store.pending_events if event['seq'] > seq]
+
+    # Try to save to Firebase first
+    if firebase:
+        success = firebase_db.save_inventory_delta(state, store.store_id)
+        store.persisted['firebase_synced'] = success
+        if success:
+            print(f"Inventory state for store {store.store_id} saved to Firebase")
             return
         else:
-            print("No data in Firebase, checking local file...")
+            print("Failed to save to Firebase, falling back to local file")
 
-    # Fallback to local file
-    if os.path.exists(app.config['INVENTORY_STATE_FILE']):
-        with open(app.config['INVENTORY_STATE_FILE'], 'r') as f:
-            state = json.load(f)
-            current_inventory = state.get('inventory', {})
-            invoice_history = state.get('invoice_history', [])
-            sales_history = state.get('sales_history', [])
-        print(f"Loaded inventory state from local file with {len(current_inventory)} items")
+    # Fallback to local file if Firebase not configured or fails
+    if app.config['PERSISTENCE_MODE'] == 'delta':
+        write_local_snapshot(store)
     else:
-        print("No existing inventory state found, starting fresh")
-
-def extract_invoice_data(pdf_path):
-    """Extract data from PDF invoice"""
-    data = {
-        'items': [],
-        'invoice_number': None,
-        'date': None,
-        'supplier': None,
-        'total': None
-    }
+        write_local_state(store)
+    print(f"Inventory state for store {store.store_id} saved to local file")
 
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            full_text = ''
-            for page in pdf.pages:
-                page_text = page.extract_text() or ''
-                full_text += page_text + '\n'
-
-            # Extract invoice number
-            invoice_match = re.search(r'invoice\s*#?\s*:?\s*(\w+)', full_text, re.IGNORECASE)
-            if invoice_match:
-                data['invoice_number'] = invoice_match.group(1)
-
-            # Extract date
-            date_patterns = [
-                r'date\s*:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-                r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})'
-            ]
-            for pattern in date_patterns:
-                date_match = re.search(pattern, full_text, re.IGNORECASE)
-                if date_match:
-                    data['date'] = date_match.group(1)
-                    break
-
-            # Extract supplier/vendor
-            supplier_match = re.search(r'(?:from|vendor|supplier)\s*:?\s*([A-Za-z\s]+)', full_text, re.IGNORECASE)
-            if supplier_match:
-                data['supplier'] = supplier_match.group(1).strip()
-
-            # Extract line items - Performance Foodservice format
-            # Format: QTY UNIT SIZE BRAND ITEM# DESCRIPTION ... prices at end
-            lines = full_text.split('\n')
-            for line in lines:
-                # Simpler pattern: QTY UNIT SIZE ... DESCRIPTION ... last_two_numbers
-                # Match lines starting with number and CS/EA/LB, extract description, get last price
-                perf_match = re.search(r'^\s*(\d+)\s+(?:CS|EA|LB|BG|GL|CT|BX)\s+[\d/\.]+\s*\w*\s+(\w+)\s+(\w+)\s+(.+?)\s+([\d,]+\.?\d+)\s+([\d,]+\.?\d+)\s*$', line)
-
-                if perf_match:
-                    quantity = int(perf_match.group(1))
-                    # Combine brand, item#, and description
-                    description = perf_match.group(4).strip()
-                    # Use the extension (total) price - last number on the line
-                    try:
-                        extension = float(perf_match.group(6).replace(',', ''))
-                    except Exception:
-                        # skip line if price can't be parsed
-                        continue
+def request_save(store):
+    """Persist a store's pending changes now (sync mode) or leave them to its write-behind scheduler"""
+    if app.config['DURABILITY_MODE'] == 'sync':
+        store.save_scheduler.flush()
+    else:
+        store.save_scheduler.mark_dirty(max(len(store.pending_events), 1))
+
+def install_inventory_state(store, inventory, invoices, sales, seq=None, hashes=None):
+    """Swap in a complete state (load, clear) and drop anything still pending.
+
+    invoices and sales are lists or PagedHistory objects. hashes are the content
+    hashes of the invoices; when None they are read from the invoice entries.
+    """
+    if not isinstance(invoices, PagedHistory):
+        invoices = PagedHistory(list(invoices))
+    if not isinstance(sales, PagedHistory):
+        sales = PagedHistory(list(sales))
+    if hashes is None:
+        hashes = [entry['content_hash'] for entry in invoices.known().values()
+                  if entry and entry.get('content_hash')]
+
+    with store.inventory.lock_all(), store.event_lock:
+        store.inventory.replace_all(inventory)
+        items = store.inventory.to_dict()
+        store.inventory_view.reset(items)
+        store.reorder.reset(items, catalog_manager.current.conversions)
+        store.invoice_history = invoices
+        store.sales_history = sales
+        store.pending_events.clear()
+        if seq is not None:
+            store.persisted['seq'] = seq
+        with store.invoice_hash_lock:
+            store.invoice_hashes.clear()
+            store.invoice_hashes.update(hashes)
+
+def read_local_state(event_log, state_file):
+    """State from a local snapshot plus the events logged after it, or from the JSON state file
+    written by full mode. Returns (state, seq, description) or None if neither exists."""
+    snapshot = event_log.load_snapshot()
+    if snapshot:
+        state, seq = snapshot
+        source = 'snapshot'
+    elif os.path.exists(state_file):
+        with open(state_file, 'r') as f:
+            state = json.load(f)
+        seq = 0
+        source = 'local file'
+    else:
+        return None
 
-                    # Clean description - remove leading item codes
-                    description_parts = description.split()
-                    # Skip numeric-looking parts at the start
-                    clean_parts = []
-                    skip_next = 0
-                    for i, part in enumerate(description_parts):
-                        if skip_next > 0:
-                            skip_next -= 1
-                            continue
-                        # Keep parts that look like actual product names
-                        if not re.match(r'^\d+$', part) or i > 2:
-                            clean_parts.append(part)
-
-                    description = ' '.join(clean_parts) if clean_parts else description
-
-                    # Filter out header rows, misc charges, and empty items
-                    if (len(description) > 3 and
-                        quantity > 0 and
-                        extension > 0 and
-                        not re.match(r'^(item|description|qty|quantity|price|total|fuel|delivery|perishable|continued)', description, re.IGNORECASE)):
-                        data['items'].append({
-                            'name': description[:60],  # Limit description length
-                            'quantity': quantity,
-                            'price': extension  # Total price for that line item
-                        })
-
-            # Extract total
-            total_match = re.search(r'total\s*:?\s*[\$€£]?([\d,]+\.?\d*)', full_text, re.IGNORECASE)
-            if total_match:
-                try:
-                    data['total'] = float(total_match.group(1).replace(',', ''))
-                except Exception:
-                    data['total'] = None
+    state = {
+        'inventory': state.get('inventory', {}),
+        'invoice_history': state.get('invoice_history', []),
+        'sales_history': state.get('sales_history', [])
+    }
+    # Replay only what happened after the snapshot
+    events = event_log.read_events(after_seq=seq)
+    for event in events:
+        apply_event(state, event)
+    event_log.events_since_snapshot = len(events)
+    return state, events[-1]['seq'] if events else seq, f"{source} ({len(events)} events replayed)"
+
+def history_entries(value):
+    """History list from Firebase, which returns a dict instead when some indexes are missing"""
+    if isinstance(value, dict):
+        return [entry for _, entry in sorted(value.items(), key=lambda item: int(item[0]))]
+    return list(value or [])
+
+def load_inventory_state(store):
+    """Load a store's inventory state from Firebase (with local snapshot/event log fallback).
+
+    The default store starts from the single-store state written before stores
+    existed when it has none of its own, and saves it under its own path.
+    """
+    legacy = store.store_id == app.config['DEFAULT_STORE']
 
-    except Exception as e:
-        print(f"Error processing PDF: {e}")
+    # Try to load from Firebase first
+    if firebase_db.is_firebase_configured():
+        # Inventory now; history pages only when someone asks for them
+        summary = firebase_db.load_inventory_summary(store.store_id)
+        if summary:
+            counters = summary['counters']
+            install_inventory_state(
+                store,
+                summary['inventory'],
+                PagedHistory(count=counters.get('invoice_count', 0),
+                             fetch_page=partial(firebase_db.get_history_page, 'invoice_history',
+                                                store_id=store.store_id)),
+                PagedHistory(count=counters.get('sales_count', 0),
+                             fetch_page=partial(firebase_db.get_history_page, 'sales_history',
+                                                store_id=store.store_id)),
+                hashes=summary['invoice_hashes'].keys()
+            )
+            store.persisted['firebase_synced'] = True
+            print(f"Loaded store {store.store_id} from Firebase with {len(store.inventory)} items "
+                  f"({store.invoice_history.count} invoices, {store.sales_history.count} sales files in history)")
+            return
 
-    return data
+        state = firebase_db.load_inventory_state() if legacy else None
+        if state:
+            # Copied over in full once, so the history comes along too
+            install_inventory_state(store, state.get('inventory') or {},
+                                    history_entries(state.get('invoice_history')),
+                                    history_entries(state.get('sales_history')))
+            save_full_inventory_state(store)
+            print(f"Moved the single-store inventory state into store {store.store_id} "
+                  f"({len(store.inventory)} items)")
+            return
+        print(f"No data in Firebase for store {store.store_id}, checking local files...")
+
+    # Fallback to the local snapshot, or the JSON state file written by full mode
+    loaded = read_local_state(store.event_log, store.state_file)
+    moved = False
+    if loaded is None and legacy:
+        loaded = read_local_state(EventLog(app.config['INVENTORY_EVENT_LOG'], app.config['INVENTORY_SNAPSHOT_FILE']),
+                                  app.config['INVENTORY_STATE_FILE'])
+        moved = loaded is not None
+    if loaded is None:
+        print(f"No existing inventory state found for store {store.store_id}, starting fresh")
+        return
 
-@app.route('/')
+    state, seq, source = loaded
+    install_inventory_state(store, state['inventory'], state['invoice_history'], state['sales_history'],
+                            seq=seq)
+    if moved:
+        # The single-store files are left in place; the store's own files take over from here
+        write_local_snapshot(store)
+        source = f"single-store {source}"
+    print(f"Loaded store {store.store_id} from {source} with {len(store.inventory)} items")
+
+def open_store(store_id):
+    """Create a store's in-memory state and load it from storage (StoreRegistry open_store)"""
+    folder = os.path.join(app.config['STORES_FOLDER'], store_id)
+    upload_folder = os.path.join(app.config['UPLOAD_FOLDER'], store_id)
+    os.makedirs(folder, exist_ok=True)
+    os.makedirs(upload_folder, exist_ok=True)
+
+    store = Store(
+        store_id,
+        EventLog(os.path.join(folder, 'inventory_events.log'), os.path.join(folder, 'inventory_state.snapshot')),
+        os.path.join(folder, 'inventory_state.json'),
+        upload_folder
+    )
+    store.reorder = ReorderEngine(
+        os.path.join(folder, 'usage.json'),
+        window_days=app.config['REORDER_WINDOW_DAYS'],
+        lead_days=app.config['REORDER_LEAD_DAYS'],
+        target_days=app.config['REORDER_TARGET_DAYS']
+    )
+    store.reorder.load()
+    store.timeseries = TimeSeriesStore(
+        folder,
+        raw_days=app.config['TIMESERIES_RAW_DAYS'],
+        hourly_days=app.config['TIMESERIES_HOURLY_DAYS'],
+        daily_days=app.config['TIMESERIES_DAILY_DAYS']
+    )
+    store.timeseries.load()
+    store.save_scheduler = WriteBehindScheduler(
+        partial(save_inventory_state, store),
+        interval=app.config['WRITE_BEHIND_INTERVAL'],
+        max_pending=app.config['WRITE_BEHIND_MAX_PENDING']
+    )
+    load_inventory_state(store)
+    return store
+
+def close_store(store):
+    """Stop a store's save scheduler, writing out anything still pending (StoreRegistry close_store)"""
+    store.save_scheduler.stop()
+
+stores = StoreRegistry(open_store, close_store, max_stores=app.config['MAX_LOADED_STORES'])
+# Don't lose buffered changes when the process exits normally
+atexit.register(stores.close_all)
+
+@app.url_value_preprocessor
+def pull_store_id(endpoint, values):
+    """Take the store id out of /stores/<store_id>/... URLs so views don't need the argument"""
+    g.store_id = (values or {}).pop('store_id', None) or app.config['DEFAULT_STORE']
+
+@app.before_request
+def check_store_id():
+    if not valid_store_id(g.store_id):
+        return jsonify({'error': 'Invalid store id'}), 404
+
+@app.teardown_request
+def release_store(exc):
+    store = g.pop('store', None)
+    if store is not None:
+        stores.release(store.store_id)
+
+def store_prefix():
+    """URL prefix of the store this request is for ('' for the default store at the unprefixed routes)"""
+    return f'/stores/{g.store_id}' if request.path.startswith('/stores/') else ''
+
+def current_store():
+    """The store this request is for, loaded on first use and kept in memory until the request ends"""
+    if 'store' not in g:
+        g.store = stores.acquire(g.store_id)
+    return g.store
+
+def store_route(rule, **options):
+    """Register a view for the default store at rule and for any store at /stores/<store_id>rule"""
+    def decorator(view):
+        app.add_url_rule(rule, view_func=view, **options)
+        app.add_url_rule('/stores/<store_id>' + rule, view_func=view, **options)
+        return view
+    return decorator
+
+@store_route('/')
 def index():
-    return render_template('index.html')
+    # Pages served under /stores/<store_id>/ call that store's endpoints
+    return render_template('index.html', api_base=store_prefix())
+
+def process_invoice_to_inventory(store, invoice_data, filename=None, content_hash=None):
+    """Add invoice items to a store's inventory using conversions.
 
-def process_invoice_to_inventory(invoice_data):
-    """Add invoice items to current inventory using conversions"""
-    global current_inventory
-    added_items = []
+    All lines of the invoice are applied as one atomic batch. When filename is
+    given the invoice is also added to invoice_history, along with the PDF's
+    content hash so a re-upload can be recognised.
+    """
+    catalog = catalog_manager.current
+    ops = []
 
     for item in invoice_data['items']:
         item_name = item['name']
@@ -242,42 +647,161 @@ def process_invoice_to_inventory(invoice_data):
 
         # Try to match with conversion table
         matched = False
-        for item_number, conv in conversions.items():
-            # Simple matching - look for product code or description in item name
-            if item_number in item_name or conv['description'].upper() in item_name.upper():
-                matched = True
+        # Candidates come back in conversion-table order, so the first one that
+        # converts wins - same result as scanning every entry
+        for item_number in catalog.conversion_index.candidates(item_name):
+            conv = catalog.conversions[item_number]
+            matched = True
 
-                # Convert from cases to usable units
-                try:
-                    items_per_case = float(conv['items_per_case']) if conv['items_per_case'] not in ['?', '', 'diffreent depending on size'] else 1
-                    usable_quantity = quantity * items_per_case
-                    usable_unit = conv['usable_unit']
-
-                    # Add to inventory
-                    if item_number not in current_inventory:
-                        current_inventory[item_number] = {
-                            'quantity': 0,
-                            'unit': usable_unit,
-                            'description': conv['description']
-                        }
-
-                    current_inventory[item_number]['quantity'] += usable_quantity
-                    added_items.append({
-                        'item_number': item_number,
-                        'description': conv['description'],
-                        'quantity_added': usable_quantity,
-                        'unit': usable_unit
-                    })
-                    break
-                except:
-                    continue
+            # Convert from cases to usable units
+            try:
+                usable_quantity = quantity * conv.case_multiplier()
+                ops.append(add_op(item_number, usable_quantity, conv.usable_unit, conv.description))
+                break
+            except ValueError:
+                continue
 
         if not matched:
             print(f"Warning: Could not find conversion for '{item_name}'")
 
-    return added_items
+    def history_entry(results):
+        if filename is None:
+            return None
+        entry = {
+            'filename': filename,
+            'date': invoice_data.get('date', datetime.now().isoformat()),
+            'items_added': len(results),
+            'processed_at': datetime.now().isoformat()
+        }
+        if content_hash:
+            entry['content_hash'] = content_hash
+        return entry
+
+    results = apply_inventory_batch(store, ops, 'invoice_added', 'invoice_history', history_entry)
+    return [
+        {
+            'item_number': result.op.item_number,
+            'description': result.op.description,
+            'quantity_added': result.op.quantity,
+            'unit': result.op.unit
+        }
+        for result in results
+    ]
 
-@app.route('/upload', methods=['POST'])
+def parse_cache_key(content_hash, supplier=None, mode='text'):
+    """Cache key for one PDF parsed one way (Firebase keys can't contain dots)"""
+    return f"{content_hash}-{mode}-{supplier or 'auto'}"
+
+def cached_invoice(cache_key):
+    """Parsed invoice from the local cache, then Firebase; None on a miss"""
+    data = parse_cache.get(cache_key)
+    if data is None and firebase_db.is_firebase_configured():
+        entry = firebase_db.get_parsed_invoice(cache_key)
+        if entry and entry.get('parser_version') == PARSER_VERSION:
+            # Firebase drops empty values, so fill the shape back in
+            data = {'items': [], 'invoice_number': None, 'date': None, 'supplier': None, 'total': None}
+            data.update(entry.get('data') or {})
+            parse_cache.put(cache_key, data)
+    return data
+
+def store_parsed_invoice(cache_key, data):
+    """Cache a parsed invoice locally and in Firebase"""
+    parse_cache.put(cache_key, data)
+    if firebase_db.is_firebase_configured():
+        firebase_db.save_parsed_invoice(cache_key, {'parser_version': PARSER_VERSION, 'data': data})
+
+def extract_invoices(pdf_paths, content_hashes=None, supplier=None, mode='text', on_parsed=None):
+    """Extract several PDF invoices, in parallel when more than one worker is configured.
+
+    PDFs whose hash (content_hashes: path -> SHA-256) is in the parse cache are not
+    parsed again. supplier and mode pick the parser (see extract_invoice_data).
+    on_parsed(path) is called as each PDF's result becomes available.
+    Returns the results in the same order as pdf_paths plus timing stats.
+    """
+    started = time.perf_counter()
+    cache_keys = {path: parse_cache_key(content_hash, supplier, mode)
+                  for path, content_hash in (content_hashes or {}).items()}
+    cached = {}
+    for path in pdf_paths:
+        if path in cache_keys:
+            data = cached_invoice(cache_keys[path])
+            if data is not None:
+                cached[path] = data
+                if on_parsed:
+                    on_parsed(path)
+    to_parse = [path for path in pdf_paths if path not in cached]
+
+    def collect(results):
+        # Results arrive in to_parse order
+        collected = []
+        for path, result in zip(to_parse, results):
+            collected.append(result)
+            if on_parsed:
+                on_parsed(path)
+        return collected
+
+    workers = min(app.config['UPLOAD_WORKERS'], len(to_parse))
+    results = None
+
+    if workers > 1:
+        pool = None
+        try:
+            pool = process_pool(app.config['UPLOAD_WORKERS'])
+            extract = partial(timed_extract_invoice_data, supplier=supplier, mode=mode)
+            results = collect(pool.map(extract, to_parse))
+        except (OSError, NotImplementedError, BrokenProcessPool) as e:
+            # Some serverless sandboxes can't create worker processes, and a worker can die
+            print(f"Process pool unavailable ({e}), parsing invoices serially")
+            if pool is not None:
+                discard_pool(pool)
+            results = None
+            workers = 1
+
+    if results is None:
+        workers = 1
+        # A single invoice spreads its pages over the workers instead
+        page_workers = app.config['UPLOAD_WORKERS'] if len(to_parse) == 1 else 1
+        results = collect(timed_extract_invoice_data(path, page_workers, supplier, mode) for path in to_parse)
+
+    parsed = {}
+    for path, (data, _) in zip(to_parse, results):
+        parsed[path] = data
+        # An empty result may be a parse error, so don't remember it
+        if data['items'] and path in cache_keys:
+            store_parsed_invoice(cache_keys[path], data)
+
+    wall_seconds = time.perf_counter() - started
+    parse_seconds = sum(seconds for _, seconds in results)
+    stats = {
+        'files': len(pdf_paths),
+        'workers': workers,
+        'wall_seconds': round(wall_seconds, 3),
+        'parse_seconds': round(parse_seconds, 3),
+        # how much faster than parsing the same files one after another
+        'speedup': round(parse_seconds / wall_seconds, 2) if parse_seconds > 0 and wall_seconds > 0 else 1.0,
+        'cache_hits': len(cached),
+        'mode': mode
+    }
+    return [cached[path] if path in cached else parsed[path] for path in pdf_paths], stats
+
+def claim_invoice_hash(store, content_hash):
+    """Mark a PDF as added to a store. False if the same PDF was already added there."""
+    if not content_hash:
+        return True
+    with store.invoice_hash_lock:
+        if content_hash in store.invoice_hashes:
+            return False
+        store.invoice_hashes.add(content_hash)
+        return True
+
+def release_invoice_hash(store, content_hash):
+    """Undo claim_invoice_hash for a PDF whose items could not be added."""
+    if not content_hash:
+        return
+    with store.invoice_hash_lock:
+        store.invoice_hashes.discard(content_hash)
+
+@store_route('/upload', methods=['POST'])
 def upload_file():
     print(f"Upload request received. Form data: {request.form}")
     print(f"Files in request: {request.files}")
@@ -288,307 +812,846 @@ def upload_file():
 
     files = request.files.getlist('files[]')
     print(f"Number of files received: {len(files)}")
-    processed = 0
     file_type = request.form.get('file_type', 'invoice')  # 'invoice', 'sales', or 'starting_inventory'
     print(f"File type: {file_type}")
 
-    for file in files:
-        print(f"Processing file: {file.filename}")
-        if file and file.filename.endswith('.pdf'):
-            filename = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
-            file.save(filename)
-
-            if file_type == 'invoice':
-                invoice_data = extract_invoice_data(filename)
-                if invoice_data['items']:
-                    added_items = process_invoice_to_inventory(invoice_data)
-                    invoice_history.append({
-                        'filename': file.filename,
-                        'date': invoice_data.get('date', datetime.now().isoformat()),
-                        'items_added': len(added_items),
-                        'processed_at': datetime.now().isoformat()
-                    })
-                    processed += 1
-                    save_inventory_state()
-
-        elif file and file.filename.endswith('.csv'):
-            csv_path = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
-            file.save(csv_path)
+    # Optional per-upload choice of invoice extraction engine and supplier layout
+    mode = request.form.get('extraction') or app.config['INVOICE_EXTRACTION']
+    supplier = request.form.get('supplier') or None
+    if mode not in EXTRACTION_MODES:
+        return jsonify({'error': f"Unknown extraction mode '{mode}'"}), 400
+    if supplier is not None and supplier not in (TEMPLATES if mode == 'table' else PARSERS):
+        return jsonify({'error': f"No {mode} layout for supplier '{supplier}'"}), 400
+
+    store = current_store()
+
+    # Every upload gets its own folder (named like its job), so files with the same
+    # name in uploads that are queued together don't overwrite each other.
+    # /clear leaves it alone until the upload is queued or processed.
+    upload_id = uuid.uuid4().hex
+    upload_folder = os.path.join(store.upload_folder, upload_id)
+    with store.uploads_lock:
+        store.uploads_in_use.add(upload_id)
+    try:
+        os.makedirs(upload_folder)
+
+        # Save everything first: the files have to outlive the request when the upload is queued
+        saved = []  # (original filename, saved path) in upload order
+        for position, file in enumerate(files):
+            if file and (file.filename.endswith('.pdf') or file.filename.endswith('.csv')):
+                path = os.path.join(upload_folder, f'{position}_{secure_filename(file.filename)}')
+                file.save(path)
+                saved.append((file.filename, path))
+
+        # ?wait=1 processes the upload in the request even in async mode
+        if app.config['UPLOAD_MODE'] == 'async' and not request.args.get('wait'):
+            job_id = job_queue.submit('upload', {
+                'files': saved,
+                'file_type': file_type,
+                'mode': mode,
+                'supplier': supplier
+            }, store.store_id, job_id=upload_id)
+            print(f"Queued upload job {job_id} with {len(saved)} files")
+            return jsonify({
+                'success': True,
+                'job_id': job_id,
+                'status_url': f'{store_prefix()}/jobs/{job_id}',
+                'files': len(saved)
+            }), 202
+
+        return jsonify(process_upload(store, saved, file_type, mode, supplier))
+    finally:
+        with store.uploads_lock:
+            store.uploads_in_use.discard(upload_id)
+
+def process_upload(store, saved, file_type='invoice', mode='text', supplier=None, on_file=None):
+    """Process the files of one upload and return the /upload response.
+
+    saved is a list of (original filename, saved path) in upload order. When
+    given, on_file(position, status, result=None) is told as each file moves
+    along: 'parsed' (invoice PDF read), then 'added', 'duplicate', 'processed',
+    'no_items' or 'skipped'.
+    """
+    def report(position, status, result=None):
+        if on_file:
+            on_file(position, status, result)
+
+    pdf_paths = [path for name, path in saved if name.endswith('.pdf')] if file_type == 'invoice' else []
+    content_hashes = {path: hash_file(path) for path in pdf_paths}
+    extraction = None
+    extracted = {}
+    duplicates = []
+    processed = 0
+    if pdf_paths:
+        positions = {path: position for position, (_, path) in enumerate(saved)}
+        invoices, extraction = extract_invoices(pdf_paths, content_hashes, supplier, mode,
+                                                on_parsed=lambda path: report(positions[path], 'parsed'))
+        extracted = dict(zip(pdf_paths, invoices))
+        print(f"Parsed {len(pdf_paths)} invoices in {extraction['wall_seconds']}s "
+              f"({extraction['workers']} workers, {extraction['speedup']}x)")
 
-            if file_type == 'sales':
-                # Process PAR sales data
-                result = process_sales_data(csv_path)
-                if result['processed'] > 0:
-                    sales_history.append({
-                        'filename': file.filename,
-                        'items_processed': result['processed'],
-                        'processed_at': datetime.now().isoformat()
-                    })
+    try:
+        # Merge results in upload order so the outcome doesn't depend on worker timing
+        for position, (name, path) in enumerate(saved):
+            print(f"Processing file: {name}")
+            if name.endswith('.pdf'):
+                invoice_data = extracted.get(path)
+                if invoice_data and invoice_data['items']:
+                    content_hash = content_hashes.get(path)
+                    # Claimed before the items are added, so two uploads of the same PDF can't both add it
+                    claimed = claim_invoice_hash(store, content_hash)
+                    if not claimed:
+                        duplicates.append(name)
+                        if app.config['DUPLICATE_INVOICES'] == 'skip':
+                            print(f"Skipping duplicate invoice: {name}")
+                            report(position, 'duplicate')
+                            continue
+                        print(f"Warning: {name} was already added")
+                    try:
+                        added = process_invoice_to_inventory(store, invoice_data, filename=name,
+                                                             content_hash=content_hash)
+                    except Exception:
+                        if claimed:
+                            # Nothing was added, so uploading it again isn't a duplicate
+                            release_invoice_hash(store, content_hash)
+                        raise
                     processed += 1
-                    save_inventory_state()
+                    report(position, 'added', {'items_added': len(added)})
+                else:
+                    report(position, 'no_items' if path in extracted else 'skipped')
 
-            elif file_type == 'starting_inventory':
-                # Process starting/current inventory
-                result = process_starting_inventory(csv_path)
+            elif file_type in ('sales', 'starting_inventory'):
+                if file_type == 'sales':
+                    # Process PAR sales data
+                    result = process_sales_data(store, path, filename=name)
+                else:
+                    # Process starting/current inventory
+                    result = process_starting_inventory(store, path)
+                result.pop('type', None)
                 if result['processed'] > 0:
                     processed += 1
-                    save_inventory_state()
+                report(position, 'processed' if result['processed'] > 0 else 'no_items', result)
 
-    print(f"Upload complete. Processed: {processed}, Total items: {len(current_inventory)}")
-    return jsonify({
+            else:
+                report(position, 'skipped')
+    finally:
+        # One save for the whole batch instead of one per file
+        if processed > 0:
+            request_save(store)
+
+    print(f"Upload complete. Processed: {processed}, Total items: {len(store.inventory)}")
+    response = {
         'success': True,
         'processed': processed,
-        'current_items': len(current_inventory)
-    })
-
-@app.route('/upload_sales', methods=['POST'])
+        'current_items': len(store.inventory)
+    }
+    if extraction:
+        response['extraction'] = extraction
+        response['duplicates'] = duplicates
+    return response
+
+def run_upload_job(job):
+    """Process a queued upload (JobQueue handler), reporting per-file progress"""
+    payload = job.payload
+    saved = [tuple(file) for file in payload['files']]
+    progress = {
+        'total': len(saved),
+        'completed': 0,
+        'files': [{'filename': name, 'status': 'queued'} for name, _ in saved]
+    }
+    job.report(progress)
+
+    def on_file(position, status, result=None):
+        entry = progress['files'][position]
+        entry['status'] = status
+        if result is not None:
+            entry['result'] = result
+        progress['completed'] = sum(1 for entry in progress['files'] if entry['status'] not in ('queued', 'parsed'))
+        job.report(progress)
+
+    with stores.checkout(job.store_id) as store:
+        return process_upload(store, saved, payload['file_type'], payload['mode'], payload['supplier'], on_file)
+
+job_queue = JobQueue(app.config['JOB_DB'], run_upload_job, workers=app.config['JOB_WORKERS'],
+                     retention=app.config['JOB_RETENTION_HOURS'] * 3600)
+
+@app.before_request
+def start_job_workers():
+    # Started with the first request rather than on import, so the debug reloader's
+    # watcher process never runs jobs against its own copy of the stores
+    if app.config['UPLOAD_MODE'] == 'async':
+        job_queue.start()
+
+@store_route('/jobs/<job_id>')
+def get_job(job_id):
+    """Status, per-file progress and (once done) result of a queued upload"""
+    job = job_queue.get(job_id)
+    if job is None or job['store'] != g.store_id:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+def open_csv_upload():
+    """Read the uploaded CSV straight from the request instead of saving it first.
+
+    Accepts a multipart 'file' field, or a raw text/csv request body with the
+    name in ?filename=. Returns (filename, DictReader, None) or (None, None, error response).
+    """
+    if request.mimetype == 'text/csv':
+        filename = request.args.get('filename', 'upload.csv')
+        stream = request.stream
+    else:
+        if 'file' not in request.files:
+            return None, None, (jsonify({'error': 'No file uploaded'}), 400)
+        file = request.files['file']
+        if not file.filename.endswith('.csv'):
+            return None, None, (jsonify({'error': 'Only CSV files are supported'}), 400)
+        filename, stream = file.filename, file.stream
+        # The NDJSON response keeps reading after the view returns, when Flask
+        # has already closed request.files, so the reader takes over the stream
+        file.stream = io.BytesIO()
+
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8', newline=''))
+    return filename, reader, None
+
+def wants_detail():
+    """True when the client asked for the per-row NDJSON stream"""
+    return (request.args.get('detail') == 'ndjson' or
+            request.accept_mimetypes.best == 'application/x-ndjson')
+
+def csv_upload_response(store, records):
+    """Answer a CSV upload to a store from its record generator.
+
+    By default only the final summary is returned as JSON. With ?detail=ndjson
+    every record is streamed as one JSON line while the file is being applied.
+    Either way the state is saved once the whole file has been read.
+
+    A file that can't be read (not UTF-8, malformed CSV) ends with an 'error'
+    record instead of the summary, or a 400 without ?detail. Chunks applied
+    before the bad row stay applied.
+    """
+    def run():
+        last = None
+        try:
+            for record in records:
+                last = record
+                yield record
+        except (UnicodeDecodeError, csv.Error) as e:
+            last = {'type': 'error', 'error': f'Could not read the CSV file: {str(e)}'}
+            yield last
+        finally:
+            # A file that failed half way still has its applied chunks saved
+            if last is None or last['type'] != 'summary' or last['processed'] > 0:
+                request_save(store)
+
+    if wants_detail():
+        lines = (json.dumps(record) + '\n' for record in run())
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+    summary = None
+    for record in run():
+        summary = record
+    if summary['type'] == 'error':
+        return jsonify({'error': summary['error']}), 400
+    summary.pop('type')
+    return jsonify({'success': True, **summary})
+
+def iter_chunks(rows, size):
+    """Group an iterable into lists of at most size items"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+@store_route('/upload_sales', methods=['POST'])
 def upload_sales():
     """Upload and process PAR POS sales data (CSV)"""
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file uploaded'}), 400
+    filename, reader, error = open_csv_upload()
+    if error:
+        return error
+    store = current_store()
+    return csv_upload_response(store, stream_sales_data(store, reader, filename=filename, detail=wants_detail()))
+
+def sales_rows(rows, counts, recipe_matrix):
+    """(pos_item, quantity_sold) for each sales row that has a recipe in recipe_matrix.
+
+    counts gets 'rows' and 'skipped' totals and the set of 'unmatched' POS items.
+    """
+    for row in rows:
+        counts['rows'] += 1
+        # Expected columns: item_name, quantity_sold, etc.
+        item_name = (row.get('item_name') or '').strip()
+        qty_sold = (row.get('quantity_sold') or '0').strip()
+
+        if not item_name or not qty_sold:
+            counts['skipped'] += 1
+            continue
 
-    file = request.files['file']
-    if not file.filename.endswith('.csv'):
-        return jsonify({'error': 'Only CSV files are supported'}), 400
-
-    csv_path = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
-    file.save(csv_path)
-
-    result = process_sales_data(csv_path)
+        try:
+            quantity_sold = float(qty_sold)
+        except ValueError:
+            counts['skipped'] += 1
+            continue
+
+        # Look up recipe
+        if item_name in recipe_matrix:
+            yield intern_text(item_name), quantity_sold
+        else:
+            counts['skipped'] += 1
+            if item_name not in counts['unmatched']:
+                counts['unmatched'].add(item_name)
+                print(f"Warning: No recipe found for '{item_name}'")
 
-    if result['processed'] > 0:
-        sales_history.append({
-            'filename': file.filename,
-            'items_processed': result['processed'],
-            'processed_at': datetime.now().isoformat()
-        })
-        save_inventory_state()
+def stream_sales_data(store, rows, filename=None, detail=False):
+    """Deduct PAR POS sales from a store's inventory while the CSV is being read.
 
-    return jsonify({
-        'success': True,
-        'processed': result['processed'],
-        'deductions': result['deductions']
-    })
+    Every CSV_CHUNK_ROWS rows are applied as one atomic batch with one deduction
+    per inventory item. When filename is given the file is added to
+    sales_history after the last chunk.
 
-def process_sales_data(csv_path):
-    """Process PAR POS sales CSV and deduct from inventory using recipes"""
-    global current_inventory
-    deductions = []
+    Yields a 'deduction' record per ingredient of each row when detail is set,
+    then one 'summary' record with the totals per inventory item.
+    """
+    catalog = catalog_manager.current
+    counts = {'rows': 0, 'skipped': 0, 'unmatched': set()}
+    totals = {}  # item_number -> aggregated deduction
+    missing = set()
     processed = 0
 
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            # Expected columns: item_name, quantity_sold, etc.
-            item_name = row.get('item_name', '').strip()
-            qty_sold = row.get('quantity_sold', '0').strip()
-
-            if not item_name or not qty_sold:
-                continue
-
-            try:
-                quantity_sold = float(qty_sold)
-            except:
+    for chunk in iter_chunks(sales_rows(rows, counts, catalog.recipe_matrix), app.config['CSV_CHUNK_ROWS']):
+        processed += len(chunk)
+        sold = defaultdict(float)
+        for item_name, quantity_sold in chunk:
+            sold[item_name] += quantity_sold
+        ops = [deduct_op(item_number, quantity)
+               for item_number, quantity in catalog.recipe_matrix.deductions(sold).items()]
+
+        for result in apply_inventory_batch(store, ops, 'sales_deducted'):
+            item_number = result.op.item_number
+            if not result.applied:
+                if item_number not in missing:
+                    missing.add(item_number)
+                    print(f"Warning: {item_number} not in inventory")
                 continue
+            total = totals.get(item_number)
+            if total is None:
+                total = totals[item_number] = {
+                    'item_number': item_number,
+                    'description': result.new['description'],
+                    'deducted': 0,
+                    'unit': result.new['unit']
+                }
+            total['deducted'] += result.op.quantity
 
-            # Look up recipe
-            if item_name in recipes:
-                for ingredient in recipes[item_name]:
-                    item_number = ingredient['item_number']
-                    qty_per_item = ingredient['quantity_used']
-                    total_deduction = quantity_sold * qty_per_item
-
-                    # Deduct from inventory
-                    if item_number in current_inventory:
-                        current_inventory[item_number]['quantity'] -= total_deduction
-                        deductions.append({
-                            'pos_item': item_name,
-                            'item_number': item_number,
-                            'description': ingredient['description'],
-                            'deducted': total_deduction,
-                            'unit': ingredient['unit']
-                        })
-                    else:
-                        print(f"Warning: {item_number} not in inventory for {item_name}")
-
-                processed += 1
-            else:
-                print(f"Warning: No recipe found for '{item_name}'")
+        if detail:
+            for item_name, quantity_sold in chunk:
+                for ingredient in catalog.recipes[item_name]:
+                    if ingredient.item_number in missing:
+                        continue
+                    yield {
+                        'type': 'deduction',
+                        'pos_item': item_name,
+                        'item_number': ingredient.item_number,
+                        'description': ingredient.description,
+                        'deducted': quantity_sold * ingredient.quantity_used,
+                        'unit': ingredient.unit
+                    }
+
+    if filename is not None and processed > 0:
+        entry = {
+            'filename': filename,
+            'items_processed': processed,
+            'processed_at': datetime.now().isoformat()
+        }
+        apply_inventory_batch(store, [], 'sales_deducted', 'sales_history', lambda results: entry)
 
-    return {
+    yield {
+        'type': 'summary',
         'processed': processed,
-        'deductions': deductions
+        'rows': counts['rows'],
+        'skipped': counts['skipped'],
+        'unmatched': sorted(counts['unmatched']),
+        'missing_items': sorted(missing),
+        'totals': sorted(totals.values(), key=lambda total: total['item_number'])
     }
 
-def process_starting_inventory(csv_path):
-    """Process starting/current inventory CSV and set inventory levels"""
-    global current_inventory
-    items_added = []
-    processed = 0
+def process_sales_data(store, csv_path, filename=None):
+    """Process a saved PAR POS sales CSV (multi-file /upload) and return the summary"""
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        for record in stream_sales_data(store, csv.DictReader(f), filename=filename):
+            summary = record
+    return summary
+
+def starting_inventory_ops(rows, counts, conversions):
+    """set_op for each starting inventory row whose item is in conversions.
+
+    counts gets 'rows' and 'skipped' totals and the set of item numbers 'not_found'.
+    """
+    for row in rows:
+        counts['rows'] += 1
+        # Support multiple column name formats
+        item_number = (row.get('Product Number') or
+                      row.get('product_number') or
+                      row.get('item_number') or
+                      row.get('Item Number', '')).strip()
+
+        current_qty = (row.get('Current Inventory') or
+                      row.get('current_inventory') or
+                      row.get('quantity') or
+                      row.get('Quantity', '')).strip()
+
+        if not item_number or not current_qty:
+            counts['skipped'] += 1
+            continue
 
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            # Support multiple column name formats
-            item_number = (row.get('Product Number') or
-                          row.get('product_number') or
-                          row.get('item_number') or
-                          row.get('Item Number', '')).strip()
-
-            current_qty = (row.get('Current Inventory') or
-                          row.get('current_inventory') or
-                          row.get('quantity') or
-                          row.get('Quantity', '')).strip()
-
-            if not item_number or not current_qty:
-                continue
+        try:
+            quantity = float(current_qty)
+        except ValueError:
+            counts['skipped'] += 1
+            continue
+
+        # Check if this item exists in our conversion table
+        if item_number in conversions:
+            conv = conversions[item_number]
+
+            # If quantity is in cases (< 100 typically), convert to usable units
+            # Otherwise assume it's already in usable units
+            if quantity < 100:
+                # Likely cases, convert to usable units
+                try:
+                    usable_quantity = quantity * conv.case_multiplier()
+                except ValueError:
+                    # Can't convert, use as-is
+                    usable_quantity = quantity
+            else:
+                # Already in usable units
+                usable_quantity = quantity
 
-            try:
-                quantity = float(current_qty)
-            except:
-                continue
+            # Set (or update) inventory
+            yield set_op(item_number, usable_quantity, conv.usable_unit, conv.description)
+        else:
+            counts['skipped'] += 1
+            counts['not_found'].add(item_number)
+            print(f"Warning: Item {item_number} not found in conversion table")
 
-            # Check if this item exists in our conversion table
-            if item_number in conversions:
-                conv = conversions[item_number]
+def stream_starting_inventory(store, rows, detail=False):
+    """Set a store's inventory levels from a starting inventory CSV while it is being read.
 
-                # If quantity is in cases (< 100 typically), convert to usable units
-                # Otherwise assume it's already in usable units
-                if quantity < 100:
-                    # Likely cases, convert to usable units
-                    try:
-                        items_per_case = float(conv['items_per_case']) if conv['items_per_case'] not in ['?', '', 'diffreent depending on size'] else 1
-                        usable_quantity = quantity * items_per_case
-                    except:
-                        # Can't convert, use as-is
-                        usable_quantity = quantity
-                else:
-                    # Already in usable units
-                    usable_quantity = quantity
+    Every CSV_CHUNK_ROWS rows are applied as one atomic batch. Yields an 'item'
+    record per item set when detail is set, then one 'summary' record.
+    """
+    counts = {'rows': 0, 'skipped': 0, 'not_found': set()}
+    processed = 0
 
-                # Set (or update) inventory
-                current_inventory[item_number] = {
-                    'quantity': usable_quantity,
-                    'unit': conv['usable_unit'],
-                    'description': conv['description']
+    for ops in iter_chunks(starting_inventory_ops(rows, counts, catalog_manager.current.conversions),
+                           app.config['CSV_CHUNK_ROWS']):
+        results = apply_inventory_batch(store, ops, 'starting_inventory_set')
+        processed += len(results)
+        if detail:
+            for result in results:
+                yield {
+                    'type': 'item',
+                    'item_number': result.op.item_number,
+                    'description': result.op.description,
+                    'quantity': result.op.quantity,
+                    'unit': result.op.unit
                 }
 
-                items_added.append({
-                    'item_number': item_number,
-                    'description': conv['description'],
-                    'quantity': usable_quantity,
-                    'unit': conv['usable_unit']
-                })
-                processed += 1
-            else:
-                print(f"Warning: Item {item_number} not found in conversion table")
-
-    return {
+    yield {
+        'type': 'summary',
         'processed': processed,
-        'items_added': items_added
+        'rows': counts['rows'],
+        'skipped': counts['skipped'],
+        'not_found': sorted(counts['not_found'])
     }
 
-@app.route('/upload_starting_inventory', methods=['POST'])
+def process_starting_inventory(store, csv_path):
+    """Process a saved starting inventory CSV (multi-file /upload) and return the summary"""
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        for record in stream_starting_inventory(store, csv.DictReader(f)):
+            summary = record
+    return summary
+
+@store_route('/upload_starting_inventory', methods=['POST'])
 def upload_starting_inventory():
     """Upload and process starting/current inventory CSV"""
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file uploaded'}), 400
-
-    file = request.files['file']
-    if not file.filename.endswith('.csv'):
-        return jsonify({'error': 'Only CSV files are supported'}), 400
-
-    csv_path = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
-    file.save(csv_path)
-
-    result = process_starting_inventory(csv_path)
-
-    if result['processed'] > 0:
-        save_inventory_state()
-
-    return jsonify({
-        'success': True,
-        'processed': result['processed'],
-        'items_added': result['items_added']
-    })
-
-@app.route('/inventory')
+    _, reader, error = open_csv_upload()
+    if error:
+        return error
+    store = current_store()
+    return csv_upload_response(store, stream_starting_inventory(store, reader, detail=wants_detail()))
+
+# Query parameters that make /inventory return a page instead of the whole (cached) list
+INVENTORY_QUERY_ARGS = ('limit', 'cursor', 'prefix', 'unit', 'low_stock', 'fields')
+INVENTORY_FIELDS = ('item_number', 'description', 'quantity', 'unit')
+MAX_INVENTORY_PAGE = 1000
+
+@store_route('/inventory')
 def get_inventory():
-    """Get current inventory state"""
-    inventory_list = [
-        {
-            'item_number': item_number,
-            'description': data['description'],
-            'quantity': round(data['quantity'], 2),
-            'unit': data['unit']
-        }
-        for item_number, data in sorted(current_inventory.items(), key=lambda x: x[1]['description'])
-    ]
+    """Get current inventory state.
+
+    The response is serialized once per change to the store and carries an
+    ETag, so a poll with a matching If-None-Match gets 304 Not Modified.
+    With any of INVENTORY_QUERY_ARGS only the requested page is returned
+    (see inventory_page).
+    """
+    store = current_store()
+    view = store.inventory_view
+    if request.if_none_match.contains(view.etag):
+        return not_modified(view.etag)
+    if any(arg in request.args for arg in INVENTORY_QUERY_ARGS):
+        return inventory_page(store)
+
+    def build(inventory_list):
+        return app.json.dumps({
+            'inventory': inventory_list,
+            'total_items': len(inventory_list),
+            'invoice_count': store.invoice_history.count,
+            'sales_count': store.sales_history.count
+        })
 
+    body, etag = view.cached(build)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Let browsers keep the body but always check it is still current
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def inventory_page(store):
+    """One page of /inventory in description order.
+
+    Query: limit (page size, up to MAX_INVENTORY_PAGE), cursor (next_cursor of
+    the previous page), prefix (item number starts with), unit, low_stock
+    (quantity below this) and fields (comma-separated subset of INVENTORY_FIELDS).
+    """
+    view = store.inventory_view
+    try:
+        limit = request.args.get('limit', type=int)
+        if 'limit' in request.args and limit is None:
+            raise ValueError('limit must be a whole number')
+        if limit is not None:
+            limit = max(1, min(limit, MAX_INVENTORY_PAGE))
+        cursor = request.args.get('cursor')
+        after = decode_cursor(cursor) if cursor else None
+        low_stock = request.args.get('low_stock')
+        low_stock = float(low_stock) if low_stock else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+    unknown = [field for field in fields if field not in INVENTORY_FIELDS]
+    if unknown:
+        return jsonify({'error': f"Unknown fields: {', '.join(unknown)}"}), 400
+
+    prefix = request.args.get('prefix', '').upper()
+    unit = request.args.get('unit', '').lower()
+
+    def match(row):
+        return ((not prefix or row['item_number'].upper().startswith(prefix)) and
+                (not unit or (row['unit'] or '').lower() == unit) and
+                (low_stock is None or row['quantity'] < low_stock))
+
+    etag = view.etag
+    rows, last = view.page(after, limit, match if prefix or unit or low_stock is not None else None)
+    if fields:
+        rows = [{field: row[field] for field in fields} for row in rows]
+
+    response = jsonify({
+        'inventory': rows,
+        'total_items': len(view),
+        'invoice_count': store.invoice_history.count,
+        'sales_count': store.sales_history.count,
+        'next_cursor': encode_cursor(last) if last is not None else None
+    })
+    # Same version, same URL, same page
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def not_modified(etag):
+    """304 response for a client that already has the current version"""
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@store_route('/history/<kind>')
+def get_history(kind):
+    """One page of invoice or sales history, newest first.
+
+    Query: before (only entries with a smaller index) and limit (page size).
+    """
+    store = current_store()
+    history = {'invoices': store.invoice_history, 'sales': store.sales_history}.get(kind)
+    if history is None:
+        return jsonify({'error': f"Unknown history '{kind}'"}), 404
+
+    before = request.args.get('before', type=int)
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    page = history.page(before, limit)
+    oldest = page[-1][0] if page else 0
     return jsonify({
-        'inventory': inventory_list,
-        'total_items': len(inventory_list),
-        'invoice_count': len(invoice_history),
-        'sales_count': len(sales_history)
+        'entries': [dict(entry, index=index) for index, entry in page if entry],
+        'total': history.count,
+        'next_before': oldest if oldest > 0 else None
     })
 
-@app.route('/update_inventory', methods=['POST'])
-def update_inventory():
-    """Manually update inventory quantity"""
-    data = request.get_json()
+def read_count(data):
+    """(item_number, quantity, None) for one manual count, or (None, None, error message)"""
+    if not isinstance(data, dict):
+        data = {}
     item_number = data.get('item_number')
     new_quantity = data.get('quantity')
 
     if not item_number or new_quantity is None:
-        return jsonify({'error': 'Missing item_number or quantity'}), 400
+        return None, None, 'Missing item_number or quantity'
 
     try:
-        new_quantity = float(new_quantity)
-    except:
-        return jsonify({'error': 'Invalid quantity format'}), 400
+        return item_number, float(new_quantity), None
+    except (TypeError, ValueError):
+        return None, None, 'Invalid quantity format'
 
-    if item_number in current_inventory:
-        old_quantity = current_inventory[item_number]['quantity']
-        current_inventory[item_number]['quantity'] = new_quantity
-        save_inventory_state()
+@store_route('/update_inventory', methods=['POST'])
+def update_inventory():
+    """Manually update inventory quantity"""
+    item_number, new_quantity, error = read_count(request.get_json(silent=True))
+    if error:
+        return jsonify({'error': error}), 400
+
+    store = current_store()
+    result = apply_inventory_batch(store, [set_quantity_op(item_number, new_quantity)], 'manual_update')[0]
+    if result.applied:
+        request_save(store)
 
         return jsonify({
             'success': True,
             'item_number': item_number,
-            'description': current_inventory[item_number]['description'],
-            'old_quantity': old_quantity,
+            'description': result.new['description'],
+            'old_quantity': result.old['quantity'],
             'new_quantity': new_quantity
         })
     else:
         return jsonify({'error': 'Item not found in inventory'}), 404
 
-@app.route('/clear', methods=['POST'])
+@store_route('/update_inventory/batch', methods=['POST'])
+def update_inventory_batch():
+    """Manually update the quantities of many items at once (e.g. a full physical count).
+
+    Body: {"updates": [{"item_number", "quantity"}, ...]}. Nothing is applied if
+    any entry is invalid. Otherwise all counts are applied as one atomic batch
+    and saved with a single write; items not in inventory are left out and
+    listed in not_found.
+    """
+    data = request.get_json(silent=True)
+    updates = data.get('updates') if isinstance(data, dict) else data
+    if not isinstance(updates, list) or not updates:
+        return jsonify({'error': 'Missing updates'}), 400
+
+    ops = []
+    for position, entry in enumerate(updates):
+        item_number, new_quantity, error = read_count(entry)
+        if error:
+            return jsonify({'error': f'{error} (update {position})'}), 400
+        ops.append(set_quantity_op(item_number, new_quantity))
+
+    store = current_store()
+    results = apply_inventory_batch(store, ops, 'manual_update')
+    items = [
+        {
+            'item_number': result.op.item_number,
+            'description': result.new['description'],
+            'old_quantity': result.old['quantity'],
+            'new_quantity': result.new['quantity']
+        }
+        for result in results if result.applied
+    ]
+    if items:
+        request_save(store)
+
+    return jsonify({
+        'success': True,
+        'updated': len(items),
+        'items': items,
+        'not_found': [result.op.item_number for result in results if not result.applied]
+    })
+
+@store_route('/reorder')
+def get_reorder():
+    """Items to order: usage rate, days of cover and suggested cases.
+
+    Lists the items that are out or below their reorder point, fewest days of
+    cover first; ?all=1 also lists items with usage that don't need ordering yet.
+    """
+    store = current_store()
+    include_ok = request.args.get('all', '').lower() in ('1', 'true', 'yes')
+    rows = store.reorder.report(store.inventory.items(), catalog_manager.current.conversions,
+                                include_ok=include_ok)
+    return jsonify({
+        'items': rows,
+        'total_items': len(rows),
+        'reorder': store.reorder.stats()
+    })
+
+@store_route('/reorder/alerts')
+def get_reorder_alerts():
+    """Reorder alert changes after ?since=<seq> (the seq of the previous response)"""
+    since = request.args.get('since', 0, type=int)
+    return jsonify(current_store().reorder.changes(since))
+
+def read_time(value):
+    """Epoch seconds from a query value in epoch seconds or ISO 8601 (naive times are local)"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid time '{value}' (use epoch seconds or ISO 8601)")
+
+@store_route('/timeseries')
+def timeseries_info():
+    """Number of items and points in the quantity history, and how long each resolution is kept"""
+    return jsonify(current_store().timeseries.stats())
+
+@store_route('/timeseries/<item_number>')
+def get_timeseries(item_number):
+    """Quantity history of one item.
+
+    Query: days (range ending now, default 30) or start/end (epoch seconds or
+    ISO 8601), and resolution (raw, hourly or daily; by default the finest
+    one still kept for the whole range).
+    """
+    store = current_store()
+    try:
+        end = read_time(request.args['end']) if request.args.get('end') else time.time()
+        if request.args.get('start'):
+            start = read_time(request.args['start'])
+        else:
+            start = end - float(request.args.get('days', 30)) * 86400
+        resolution = request.args.get('resolution') or None
+        if resolution == 'auto':
+            resolution = None
+        if start > end:
+            raise ValueError('start is after end')
+        series = store.timeseries.query(item_number, start, end, resolution)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    item = store.inventory.get(item_number)
+    series['description'] = item['description'] if item else None
+    series['unit'] = item['unit'] if item else None
+    return jsonify(series)
+
+@store_route('/flush', methods=['POST'])
+def flush_inventory():
+    """Write any buffered inventory changes to storage now"""
+    store = current_store()
+    success = store.save_scheduler.flush()
+    return jsonify({
+        'success': success,
+        'store': store.store_id,
+        'durability_mode': app.config['DURABILITY_MODE'],
+        'scheduler': store.save_scheduler.stats()
+    }), (200 if success else 500)
+
+@app.route('/stores')
+def list_stores():
+    """Stores with saved state, plus the ones currently held in memory"""
+    if firebase_db.is_firebase_configured():
+        saved = firebase_db.list_stores() or []
+    elif os.path.isdir(app.config['STORES_FOLDER']):
+        saved = sorted(os.listdir(app.config['STORES_FOLDER']))
+    else:
+        saved = []
+    return jsonify({
+        'default_store': app.config['DEFAULT_STORE'],
+        'stores': saved,
+        'memory': stores.stats()
+    })
+
+@app.route('/catalog')
+def catalog_info():
+    """Version and source of the conversion/recipe catalog in use"""
+    stats = catalog_manager.stats()
+    if app.config['CATALOG_SOURCE'] == 'firebase':
+        stats['cache'] = catalog_cache.stats()
+    return jsonify(stats)
+
+@app.route('/catalog/reload', methods=['POST'])
+def reload_catalog():
+    """Reload conversions and recipes in the background; poll GET /catalog for the new version"""
+    catalog_manager.request_reload()
+    return jsonify(catalog_manager.stats()), 202
+
+@app.route('/catalog/publish', methods=['POST'])
+def publish_catalog():
+    """Upload the local conversion and recipe CSVs to Firebase as a new catalog version"""
+    if not firebase_db.is_firebase_configured():
+        return jsonify({'error': 'Firebase is not configured'}), 400
+
+    try:
+        conversion_table, recipe_table = catalog_publish_tables()
+    except (OSError, ValueError) as e:
+        return jsonify({'error': f'Could not read the catalog CSVs: {e}'}), 500
+
+    version = firebase_db.publish_catalog(conversion_table, recipe_table)
+    if version is None:
+        return jsonify({'error': 'Failed to publish catalog to Firebase'}), 500
+    if app.config['CATALOG_SOURCE'] == 'firebase':
+        catalog_manager.request_reload()
+
+    return jsonify({
+        'success': True,
+        'version': version,
+        'conversions': len(conversion_table),
+        'recipes': len(recipe_table)
+    })
+
+@store_route('/clear', methods=['POST'])
 def clear_inventory():
-    """Clear all inventory data and history"""
-    global current_inventory, invoice_history, sales_history
-    current_inventory = {}
-    invoice_history = []
-    sales_history = []
-
-    # Save empty state
-    save_inventory_state()
-
-    # Clean up uploaded files
-    for filename in os.listdir(app.config['UPLOAD_FOLDER']):
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    """Clear all inventory data and history of one store"""
+    store = current_store()
+    store.reorder.clear()
+    store.timeseries.clear()
+    install_inventory_state(store, {}, [], [])
+
+    # Save empty state - everything changed, so rewrite it in full
+    store.save_scheduler.flush(full=True)
+
+    # Clean up uploaded files, except those of uploads still being processed or queued
+    with store.uploads_lock:
+        in_use = set(store.uploads_in_use)
+    in_use |= job_queue.active(store.store_id)
+    for filename in os.listdir(store.upload_folder):
+        if filename in in_use:
+            continue
+        file_path = os.path.join(store.upload_folder, filename)
         try:
-            if os.path.isfile(file_path):
+            if os.path.isdir(file_path):
+                shutil.rmtree(file_path)
+            elif os.path.isfile(file_path):
                 os.unlink(file_path)
         except Exception as e:
             print(f"Error deleting file: {e}")
 
     return jsonify({'success': True})
 
-# Load conversion and recipe data on startup
-print("Loading conversion and recipe data...")
-load_conversions()
-load_recipes()
-load_inventory_state()
+# Invoice parsing workers import this module again, as __mp_main__, when the app is run
+# as a script (see invoice_extraction.process_pool); they only need the parser, not the app
+if __name__ != '__mp_main__':
+    # Load conversion and recipe data on startup
+    print("Loading conversion and recipe data...")
+    catalog_manager.reload()
+    catalog_manager.start()
+    if app.config['CATALOG_SOURCE'] == 'firebase' and firebase_db.is_firebase_configured():
+        firebase_db.listen_catalog_version(lambda version: catalog_manager.request_reload())
+    # Other stores are loaded by the first request for them
+    with stores.checkout(app.config['DEFAULT_STORE']):
+        pass
 
 if __name__ == '__main__':
     # Local development server
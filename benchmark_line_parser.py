@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for invoice line parsing.
+
+Reads the text lines of samples/invoice_2026_*.pdf, repeats them up to the
+requested line count and times the precompiled LineParser against the old
+per-line re.search code.
+
+Usage:
+    python benchmark_line_parser.py [--lines 5000] [--repeat 5]
+"""
+
+import re
+import sys
+import glob
+import time
+import argparse
+
+import pdfplumber
+from line_parsers import get_parser
+
+
+def legacy_parse(line):
+    """The per-line parsing extract_invoice_data used before LineParser"""
+    perf_match = re.search(r'^\s*(\d+)\s+(?:CS|EA|LB|BG|GL|CT|BX)\s+[\d/\.]+\s*\w*\s+(\w+)\s+(\w+)\s+(.+?)\s+([\d,]+\.?\d+)\s+([\d,]+\.?\d+)\s*$', line)
+    if not perf_match:
+        return None
+    quantity = int(perf_match.group(1))
+    description = perf_match.group(4).strip()
+    try:
+        extension = float(perf_match.group(6).replace(',', ''))
+    except Exception:
+        return None
+    clean_parts = []
+    for i, part in enumerate(description.split()):
+        if not re.match(r'^\d+$', part) or i > 2:
+            clean_parts.append(part)
+    description = ' '.join(clean_parts) if clean_parts else description
+    if (len(description) > 3 and quantity > 0 and extension > 0 and
+            not re.match(r'^(item|description|qty|quantity|price|total|fuel|delivery|perishable|continued)', description, re.IGNORECASE)):
+        return {'name': description[:60], 'quantity': quantity, 'price': extension}
+    return None
+
+
+def sample_lines(pattern):
+    lines = []
+    for path in sorted(glob.glob(pattern)):
+        with pdfplumber.open(path) as pdf:
+            for page in pdf.pages:
+                lines.extend((page.extract_text() or '').split('\n'))
+    return lines
+
+
+def best_time(fn, lines, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = [item for item in map(fn, lines) if item is not None]
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lines', type=int, default=5000, help='lines to parse per run')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per parser (best is reported)')
+    parser.add_argument('--samples', default='samples/invoice_2026_*.pdf', help='PDFs to take lines from')
+    args = parser.parse_args()
+
+    base = sample_lines(args.samples)
+    if not base:
+        print(f"No sample invoices match {args.samples}")
+        sys.exit(1)
+    lines = (base * (args.lines // len(base) + 1))[:args.lines]
+    item_lines = sum(1 for line in lines if get_parser().parse(line) is not None)
+
+    print("=" * 60)
+    print("Invoice Line Parser Benchmark")
+    print("=" * 60)
+    print(f"{len(lines)} lines ({item_lines} line items) from {len(base)} sample lines, best of {args.repeat}")
+    print()
+
+    legacy_seconds, legacy_items = best_time(legacy_parse, lines, args.repeat)
+    parser_seconds, parser_items = best_time(get_parser().parse, lines, args.repeat)
+
+    for label, seconds in (('re.search per line', legacy_seconds), ('LineParser', parser_seconds)):
+        print(f"  {label:<20} {seconds * 1000:8.2f} ms  {len(lines) / seconds:12,.0f} lines/s")
+    print()
+    print(f"  Speedup: {legacy_seconds / parser_seconds:.2f}x")
+    print(f"  Same items: {'yes' if legacy_items == parser_items else 'NO'}")
+
+
+if __name__ == '__main__':
+    main()
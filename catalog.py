@@ -0,0 +1,171 @@
+"""
+Conversion/Recipe Catalog
+Versioned snapshots of the conversion and recipe tables that are replaced while the app runs.
+
+A Catalog is built once and never modified: the two tables plus the matching
+index and recipe matrix built from them. CatalogManager holds the current one.
+A request reads ``manager.current`` once and uses that snapshot throughout, so
+a reload in the middle of an upload can't mix two versions of the tables.
+
+Reloads run on a background thread, triggered by a change to the watched
+files or by request_reload() (e.g. from a Firebase listener). The new catalog
+is built completely before it is swapped in with a single reference
+assignment, so request threads never wait for a reload.
+"""
+
+import os
+import time
+import threading
+import logging
+from typing import Dict, Any, Callable, List, Optional, Sequence, Tuple
+
+from conversion_index import ConversionIndex
+from recipe_matrix import RecipeMatrix
+from records import Conversion, RecipeIngredient
+
+logger = logging.getLogger(__name__)
+
+# loader() -> (conversions, recipes, checksum, source); raises if the tables can't be read
+CatalogLoader = Callable[[], Tuple[Dict[str, Conversion], Dict[str, List[RecipeIngredient]], str, str]]
+
+
+class Catalog:
+    """
+    One version of the conversion and recipe tables with their lookup structures.
+
+    Args:
+        conversions: item_number -> Conversion, in table order
+        recipes: pos_item_name -> list of RecipeIngredient
+        checksum: Hash of the source data (equal checksums mean equal tables)
+        source: Where the tables came from, for logs and /catalog
+        version: Increases by one with every swap
+    """
+
+    __slots__ = ('conversions', 'recipes', 'conversion_index', 'recipe_matrix',
+                 'checksum', 'source', 'version', 'loaded_at')
+
+    def __init__(self, conversions: Dict[str, Conversion], recipes: Dict[str, List[RecipeIngredient]],
+                 checksum: str = '', source: str = '', version: int = 0):
+        self.conversions = conversions
+        self.recipes = recipes
+        self.conversion_index = ConversionIndex(conversions)
+        self.recipe_matrix = RecipeMatrix(recipes)
+        self.checksum = checksum
+        self.source = source
+        self.version = version
+        self.loaded_at = time.time()
+
+    def stats(self) -> Dict[str, Any]:
+        """Summary for the /catalog endpoint."""
+        return {
+            'version': self.version,
+            'source': self.source,
+            'checksum': self.checksum,
+            'conversions': len(self.conversions),
+            'recipes': len(self.recipes),
+            'loaded_at': self.loaded_at
+        }
+
+
+class CatalogManager:
+    """
+    Holds the current Catalog and replaces it when the tables change.
+
+    Watched files are polled every interval seconds. A change is picked up once
+    the files have stopped changing for one interval, so a CSV that is still
+    being saved isn't loaded half-written.
+
+    Args:
+        loader: Reads the tables (see CatalogLoader)
+        watch_paths: Files whose modification means the tables may have changed
+        interval: Seconds between polls (0 = don't poll; reload only on request)
+    """
+
+    def __init__(self, loader: CatalogLoader, watch_paths: Sequence[str] = (), interval: float = 5.0):
+        self._loader = loader
+        self._watch_paths = list(watch_paths)
+        self.interval = interval
+
+        self._current = Catalog({}, {})
+        self._reload_lock = threading.Lock()  # one reload at a time; request threads never take it
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loaded_stamps = None  # file stamps the current catalog was loaded from
+        self._seen_stamps = None  # file stamps at the last poll
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def current(self) -> Catalog:
+        """The catalog to use for one request (read it once and keep the reference)."""
+        return self._current
+
+    def _stamps(self) -> Tuple:
+        stamps = []
+        for path in self._watch_paths:
+            try:
+                stat = os.stat(path)
+                stamps.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stamps.append(None)
+        return tuple(stamps)
+
+    def reload(self) -> bool:
+        """
+        Load the tables now and swap them in if they changed. Runs on the caller's thread.
+
+        Returns:
+            bool: True if a new catalog version was installed
+        """
+        with self._reload_lock:
+            # Recorded even if loading fails, so a bad file is retried only once it changes again
+            self._loaded_stamps = self._seen_stamps = self._stamps()
+            try:
+                conversions, recipes, checksum, source = self._loader()
+            except Exception as e:
+                # Keep serving the catalog we have
+                self.last_error = str(e)
+                logger.error(f"Failed to reload catalog: {str(e)}")
+                return False
+            self.last_error = None
+
+            current = self._current
+            if checksum and checksum == current.checksum:
+                return False
+            self._current = Catalog(conversions, recipes, checksum, source, current.version + 1)
+            self.reloads += 1
+            logger.info(f"Catalog version {current.version + 1} installed from {source}")
+            return True
+
+    def request_reload(self):
+        """Ask the background thread to reload soon. Never blocks; safe from any thread."""
+        self._wake.set()
+
+    def start(self):
+        """Start the background reload thread (no-op if it is running)."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='catalog-reload', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            requested = self._wake.wait(self.interval if self.interval > 0 else None)
+            self._wake.clear()
+            if requested:
+                self.reload()
+                continue
+
+            stamps = self._stamps()
+            if stamps != self._loaded_stamps:
+                if stamps == self._seen_stamps:
+                    self.reload()
+                else:
+                    self._seen_stamps = stamps
+
+    def stats(self) -> Dict[str, Any]:
+        """Current version plus reload counters."""
+        stats = self._current.stats()
+        stats['reloads'] = self.reloads
+        stats['last_error'] = self.last_error
+        return stats
@@ -0,0 +1,127 @@
+"""
+Catalog Cache
+Local on-disk copy of the conversion and recipe tables kept in Firebase.
+
+Workers that take their catalog from Firebase keep the last download in one
+JSON file, together with the catalog version it was downloaded at. Before
+downloading again they read only the small catalog_version node. When it
+matches the cached version the tables come from disk; only a new version
+downloads the full tables. When Firebase can't be reached the cached tables
+are used as they are, so a worker can start and reload while offline.
+"""
+
+import os
+import json
+import time
+import threading
+import logging
+from typing import Dict, Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# get_version() -> current version, '' if the tables aren't versioned, None if Firebase is unreachable
+GetVersion = Callable[[], Optional[str]]
+# download() -> (conversion_table, recipe_table), or None if they can't be downloaded
+Download = Callable[[], Optional[Tuple[Dict[str, Any], Dict[str, Any]]]]
+
+
+class CatalogCache:
+    """
+    Firebase catalog tables cached in a JSON file and revalidated by version.
+
+    Args:
+        path: Cache file (its folder is created if missing)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entry: Optional[Dict[str, Any]] = None  # last entry read or written
+        self._read_file = False
+        self.downloads = 0
+        self.revalidations = 0
+        self.offline_loads = 0
+
+    def _cached(self) -> Optional[Dict[str, Any]]:
+        if not self._read_file:
+            self._read_file = True
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+                if isinstance(entry, dict) and entry.get('conversion_table') and entry.get('recipe_table'):
+                    self._entry = entry
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable catalog cache {self.path}: {str(e)}")
+        return self._entry
+
+    def _store(self, entry: Dict[str, Any]):
+        self._entry = entry
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            # Still usable from memory until the process ends
+            logger.error(f"Failed to write catalog cache: {str(e)}")
+
+    def get_tables(self, get_version: GetVersion, download: Download) -> Optional[Dict[str, Any]]:
+        """
+        Current tables, downloading them only when the version in Firebase differs from the cached one.
+
+        Args:
+            get_version: Reads the version node (see GetVersion)
+            download: Reads both tables (see Download)
+
+        Returns:
+            dict: {'conversion_table', 'recipe_table', 'version', 'fetched_at', 'status'} where status is
+                  'cached' (version unchanged), 'downloaded' or 'offline' (Firebase unreachable, cached
+                  copy used); None if Firebase has no tables and nothing is cached
+        """
+        with self._lock:
+            cached = self._cached()
+            version = get_version()
+
+            if version is None:
+                if cached is None:
+                    return None
+                self.offline_loads += 1
+                return dict(cached, status='offline')
+
+            # Unversioned tables (written directly, not through firebase_db) are always downloaded
+            if cached is not None and version and cached.get('version') == version:
+                self.revalidations += 1
+                return dict(cached, status='cached')
+
+            tables = download()
+            if tables is None:
+                if cached is None:
+                    return None
+                self.offline_loads += 1
+                return dict(cached, status='offline')
+
+            conversion_table, recipe_table = tables
+            entry = {
+                'version': version,
+                'fetched_at': time.time(),
+                'conversion_table': conversion_table,
+                'recipe_table': recipe_table
+            }
+            self._store(entry)
+            self.downloads += 1
+            return dict(entry, status='downloaded')
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for GET /catalog."""
+        entry = self._entry
+        return {
+            'path': self.path,
+            'version': entry.get('version') if entry else None,
+            'fetched_at': entry.get('fetched_at') if entry else None,
+            'downloads': self.downloads,
+            'revalidations': self.revalidations,
+            'offline_loads': self.offline_loads
+        }
@@ -0,0 +1,184 @@
+"""
+Invoice Column Templates
+Table-aware line item extraction from pdfplumber word positions.
+
+Suppliers print their invoices with fixed column positions. A ColumnTemplate
+names those columns and their left edges; words are grouped into rows by their
+vertical position and into columns by their x position, so no regex has to
+recover the columns from flattened text. When a page's header row is found the
+template is re-anchored to the actual header positions and cached per supplier.
+"""
+
+import bisect
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+from line_parsers import build_item
+
+# (x0, top, text) for one word on a page
+Word = Tuple[float, float, str]
+
+
+class ColumnTemplate:
+    """
+    Column layout of one supplier's line item table.
+
+    Args:
+        name: Registry key, e.g. 'performance'
+        columns: (column name, header label, left x) in left-to-right order.
+                 Must include 'quantity', 'description' and 'extension'.
+        units: Unit codes a line item must have in its 'unit' column (empty = any)
+        row_tolerance: Words whose tops differ by at most this much share a row
+        slack: Words may start this far left of their column's edge
+        max_name_length: Item names are cut to this many characters
+    """
+
+    def __init__(self, name: str, columns: Sequence[Tuple[str, str, float]], units: Sequence[str] = (),
+                 row_tolerance: float = 3.0, slack: float = 2.0, max_name_length: int = 60):
+        self.name = name
+        self.columns = list(columns)
+        self.units = frozenset(units)
+        self.row_tolerance = row_tolerance
+        self.slack = slack
+        self.max_name_length = max_name_length
+
+        self.names = [column for column, _, _ in self.columns]
+        self.edges = [x - slack for _, _, x in self.columns]
+        self.labels = [label.upper() for _, label, _ in self.columns]
+
+    def rows(self, words: List[Word]) -> List[List[Word]]:
+        """
+        Group words into rows, top to bottom, each row left to right.
+
+        Args:
+            words: Words of one page
+
+        Returns:
+            list: Rows of words
+        """
+        rows: List[List[Word]] = []
+        row_top = None
+        for word in sorted(words, key=lambda word: (word[1], word[0])):
+            if row_top is None or word[1] - row_top > self.row_tolerance:
+                rows.append([])
+                row_top = word[1]
+            rows[-1].append(word)
+        for row in rows:
+            row.sort()
+        return rows
+
+    def split(self, row: List[Word]) -> Dict[str, str]:
+        """
+        Join the words of a row per column.
+
+        Args:
+            row: Words of one row, left to right
+
+        Returns:
+            dict: Column name -> text (columns without words are missing)
+        """
+        cells: Dict[str, List[str]] = {}
+        for x0, _, text in row:
+            index = bisect.bisect_right(self.edges, x0) - 1
+            if index >= 0:
+                cells.setdefault(self.names[index], []).append(text)
+        return {column: ' '.join(texts) for column, texts in cells.items()}
+
+    def anchored(self, rows: List[List[Word]]) -> Optional['ColumnTemplate']:
+        """
+        Re-anchor the columns to a header row found on the page.
+
+        Args:
+            rows: Rows of the page
+
+        Returns:
+            ColumnTemplate: Copy with the header's x positions, or None if no row
+                            starts every column with its label
+        """
+        for row in rows:
+            positions = {text.upper(): x0 for x0, _, text in row}
+            if all(label in positions for label in self.labels):
+                columns = [(column, label, positions[label.upper()]) for column, label, _ in self.columns]
+                if columns == self.columns:
+                    return self
+                return ColumnTemplate(self.name, columns, self.units, self.row_tolerance,
+                                      self.slack, self.max_name_length)
+        return None
+
+    def parse_row(self, cells: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """
+        Turn the cells of one row into an item.
+
+        Args:
+            cells: Column name -> text, as returned by split()
+
+        Returns:
+            dict: {'name', 'quantity', 'price'}, or None if the row isn't an item
+        """
+        quantity = cells.get('quantity', '')
+        if not quantity.isdecimal() or 'description' not in cells or 'extension' not in cells:
+            return None
+        if self.units and cells.get('unit') not in self.units:
+            return None
+        return build_item(quantity, cells['description'], cells['extension'], self.max_name_length)
+
+
+TEMPLATES: Dict[str, ColumnTemplate] = {}
+# Templates re-anchored to the header positions seen on real invoices, per supplier
+_anchored: Dict[str, ColumnTemplate] = {}
+
+
+def register_template(template: ColumnTemplate):
+    """
+    Add (or replace) a supplier column template.
+
+    Args:
+        template: ColumnTemplate to register under template.name
+    """
+    TEMPLATES[template.name] = template
+    _anchored.pop(template.name, None)
+
+
+def get_template(name: str) -> ColumnTemplate:
+    """
+    Look up a column template by key.
+
+    Raises:
+        KeyError: No template is registered under that key
+    """
+    return TEMPLATES[name]
+
+
+def template_for_rows(name: str, rows: List[List[Word]]) -> ColumnTemplate:
+    """
+    Template to parse a page with, anchored to the page's header row when it has one.
+
+    The anchored template is cached per supplier, so continuation pages without
+    a header row use the positions learned from the first page.
+
+    Args:
+        name: Template key
+        rows: Rows of the page
+    """
+    anchored = get_template(name).anchored(rows)
+    if anchored is not None:
+        _anchored[name] = anchored
+        return anchored
+    return _anchored.get(name) or get_template(name)
+
+
+def page_text(rows: List[List[Word]]) -> str:
+    """Plain text of a page rebuilt from its rows (for the header and total fields)."""
+    return '\n'.join(' '.join(text for _, _, text in row) for row in rows)
+
+
+# Performance Foodservice, as laid out by samples/generate_samples.py
+register_template(ColumnTemplate('performance', [
+    ('quantity', 'QTY', 50),
+    ('unit', 'UNIT', 100),
+    ('pack', 'PACK', 150),
+    ('item_number', 'ITEM', 220),
+    ('code', 'CODE', 280),
+    ('description', 'DESCRIPTION', 340),
+    ('price', 'PRICE', 480),
+    ('extension', 'EXT', 540)
+], units=('CS', 'EA', 'LB', 'BG', 'GL', 'CT', 'BX')))
@@ -0,0 +1,123 @@
+"""
+Conversion Matching Index
+Prebuilt lookup structures for matching invoice line names against the conversion table.
+"""
+
+from collections import deque
+from typing import Dict, Any, Iterable, List, Tuple
+
+
+class PatternAutomaton:
+    """
+    Aho-Corasick multi-pattern matcher.
+
+    Every pattern carries a value; ``search`` returns the values of all patterns
+    that occur anywhere in the text in a single left-to-right pass.
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Any]] = [[]]
+
+        for pattern, value in patterns:
+            if pattern:
+                self._add(pattern, value)
+        self._build_failure_links()
+
+    def _add(self, pattern: str, value: Any):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append(value)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                # Fold the outputs of the failure state in so search never walks the chain
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def search(self, text: str) -> set:
+        """
+        Find every pattern occurring in ``text``.
+
+        Args:
+            text: Text to scan
+
+        Returns:
+            Set of values for the matched patterns
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+class ConversionIndex:
+    """
+    Matching index over the conversion table.
+
+    Reproduces the original linear scan in ``process_invoice_to_inventory``: a
+    conversion matches an invoice line when its item number is a substring of the
+    line name, or its uppercased description is a substring of the uppercased line
+    name. Candidates are returned in conversion-table order so the first match wins
+    exactly as before.
+    """
+
+    def __init__(self, conversions: Dict[str, Any]):
+        self.item_numbers: List[str] = list(conversions.keys())
+        # item-number hash: item_number -> position in the conversion table
+        self.positions: Dict[str, int] = {
+            item_number: position for position, item_number in enumerate(self.item_numbers)
+        }
+
+        descriptions = [
+            (conv.description.upper(), position)
+            for position, conv in enumerate(conversions.values())
+        ]
+        # An empty description is a substring of every name, so it always matches
+        self._always = {position for description, position in descriptions if not description}
+
+        self._item_number_automaton = PatternAutomaton(
+            (item_number, position) for item_number, position in self.positions.items()
+        )
+        self._description_automaton = PatternAutomaton(descriptions)
+
+    def __len__(self):
+        return len(self.item_numbers)
+
+    def candidates(self, item_name: str) -> List[str]:
+        """
+        Find every conversion entry matching an invoice line name.
+
+        Args:
+            item_name: Line item name from the invoice
+
+        Returns:
+            Matching item numbers in conversion-table order
+        """
+        matched = self._item_number_automaton.search(item_name)
+        matched |= self._description_automaton.search(item_name.upper())
+        matched |= self._always
+        return [self.item_numbers[position] for position in sorted(matched)]
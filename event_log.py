@@ -0,0 +1,156 @@
+"""
+Inventory Event Log Module
+Append-only event log with periodic binary snapshots for the local inventory store.
+
+Every mutation (invoice add, sales deduction, starting inventory, manual update)
+is appended as one JSON line carrying a sequence number, the resulting values of
+the items it touched and any history entries it added. A snapshot stores the
+complete state together with the last sequence number it includes, so loading
+only has to replay the events written after it.
+"""
+
+import os
+import json
+import pickle
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+
+
+class EventLog:
+    """
+    Local event log plus snapshot file.
+
+    Args:
+        log_path: Path of the append-only JSON-lines event log
+        snapshot_path: Path of the binary snapshot
+    """
+
+    def __init__(self, log_path: str, snapshot_path: str):
+        self.log_path = log_path
+        self.snapshot_path = snapshot_path
+        self.events_since_snapshot = 0
+
+    def append(self, events: List[Dict[str, Any]]):
+        """
+        Append events to the log in one write.
+
+        Args:
+            events: Event records, each with a 'seq' number
+        """
+        if not events:
+            return
+        with open(self.log_path, 'a') as f:
+            f.write(''.join(json.dumps(event) + '\n' for event in events))
+        self.events_since_snapshot += len(events)
+
+    def read_events(self, after_seq: int = 0) -> List[Dict[str, Any]]:
+        """
+        Read events newer than a sequence number. A partial record left at the
+        end by an interrupted write is cut off the file.
+
+        Args:
+            after_seq: Only events with a larger 'seq' are returned
+
+        Returns:
+            List of event records in log order
+        """
+        if not os.path.exists(self.log_path):
+            return []
+
+        events = []
+        good = 0  # end of the last complete record
+        with open(self.log_path, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError('no newline')
+                    event = json.loads(line)
+                except ValueError:
+                    # Torn write at the end of the log - everything before it is good
+                    logger.warning("Ignoring incomplete event log record")
+                    break
+                good += len(line)
+                if event.get('seq', 0) > after_seq:
+                    events.append(event)
+            torn = f.seek(0, os.SEEK_END) > good
+        if torn:
+            # Cut the partial record off, or the next append would be glued onto it
+            with open(self.log_path, 'r+b') as f:
+                f.truncate(good)
+        return events
+
+    def write_snapshot(self, state: Dict[str, Any], seq: int):
+        """
+        Write a snapshot of the full state and drop the events it covers.
+
+        Args:
+            state: Complete inventory state
+            seq: Sequence number of the last event included in the state
+        """
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'format': SNAPSHOT_FORMAT, 'seq': seq, 'state': state}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.snapshot_path)
+
+        # Events up to seq are in the snapshot now. If we crash before this the
+        # loader skips them anyway because it only replays seq > snapshot seq.
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+        self.events_since_snapshot = 0
+
+    def load_snapshot(self) -> Optional[Tuple[Dict[str, Any], int]]:
+        """
+        Load the latest snapshot.
+
+        Returns:
+            (state, seq) tuple, or None if there is no usable snapshot
+        """
+        if not os.path.exists(self.snapshot_path):
+            return None
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except Exception as e:
+            logger.error(f"Failed to read inventory snapshot: {str(e)}")
+            return None
+        if snapshot.get('format') != SNAPSHOT_FORMAT:
+            logger.error(f"Unsupported inventory snapshot format: {snapshot.get('format')}")
+            return None
+        return snapshot['state'], snapshot['seq']
+
+    def clear(self):
+        """Remove the snapshot and the log (the state now lives somewhere else)."""
+        for path in (self.snapshot_path, self.log_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.events_since_snapshot = 0
+
+
+def apply_event(state: Dict[str, Any], event: Dict[str, Any]):
+    """
+    Apply one event to a state dictionary in place.
+
+    Args:
+        state: Dictionary with 'inventory', 'invoice_history' and 'sales_history'
+        event: Event record
+    """
+    inventory = state['inventory']
+    for item_number, item in event.get('inventory', {}).items():
+        if item is None:
+            inventory.pop(item_number, None)
+        else:
+            inventory[item_number] = item
+
+    for history_key in ('invoice_history', 'sales_history'):
+        history = state[history_key]
+        for index, entry in sorted(event.get(history_key, {}).items(), key=lambda x: int(x[0])):
+            index = int(index)
+            if index < len(history):
+                history[index] = entry
+            else:
+                history.append(entry)
@@ -5,9 +5,9 @@ Handles all Firebase database operations for the DQ Inventory system.
 
 import os
 import json
-import firebase_admin
-from firebase_admin import credentials, db
-from typing import Dict, Any, Optional
+import uuid
+from datetime import datetime
+from typing import Dict, Any, Callable, List, Optional
 import logging
 from dotenv import load_dotenv
 
@@ -37,6 +37,10 @@ def initialize_firebase():
         return True
 
     try:
+        # Imported on first use: firebase_admin adds a noticeable share to a serverless cold start
+        import firebase_admin
+        from firebase_admin import credentials, db
+
         # Get database URL from environment
         database_url = os.environ.get('FIREBASE_DATABASE_URL')
         if not database_url:
@@ -93,6 +97,7 @@ def get_database_ref(path: str = '/'):
         if not initialize_firebase():
             return None
 
+    from firebase_admin import db
     return db.reference(path)
 
 
@@ -100,18 +105,43 @@ def get_database_ref(path: str = '/'):
 # INVENTORY STATE OPERATIONS
 # ============================================================================
 
-def save_inventory_state(inventory_data: Dict[str, Any]) -> bool:
+def _state_path(store_id: Optional[str] = None) -> str:
+    """Database path of one store's state; without a store, the single-store inventory_state node."""
+    return f'stores/{store_id}' if store_id else 'inventory_state'
+
+
+def list_stores() -> Optional[List[str]]:
+    """
+    Get the ids of the stores that have state in Firebase.
+
+    Returns:
+        List of store ids, or None if error
+    """
+    try:
+        ref = get_database_ref('stores')
+        if ref is None:
+            return None
+
+        return sorted((ref.get(shallow=True) or {}).keys())
+
+    except Exception as e:
+        logger.error(f"Failed to list stores: {str(e)}")
+        return None
+
+
+def save_inventory_state(inventory_data: Dict[str, Any], store_id: Optional[str] = None) -> bool:
     """
     Save the complete inventory state to Firebase.
 
     Args:
         inventory_data: Dictionary containing inventory state
+        store_id: Store whose state to use (None = the single-store inventory_state node)
 
     Returns:
         bool: True if successful, False otherwise
     """
     try:
-        ref = get_database_ref('inventory_state')
+        ref = get_database_ref(_state_path(store_id))
         if ref is None:
             return False
 
@@ -124,15 +154,18 @@ def save_inventory_state(inventory_data: Dict[str, Any]) -> bool:
         return False
 
 
-def load_inventory_state() -> Optional[Dict[str, Any]]:
+def load_inventory_state(store_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
     """
     Load the complete inventory state from Firebase.
 
+    Args:
+        store_id: Store whose state to use (None = the single-store inventory_state node)
+
     Returns:
         Dictionary containing inventory state, or None if not found/error
     """
     try:
-        ref = get_database_ref('inventory_state')
+        ref = get_database_ref(_state_path(store_id))
         if ref is None:
             return None
 
@@ -145,19 +178,97 @@ def load_inventory_state() -> Optional[Dict[str, Any]]:
         return None
 
 
-def update_inventory_item(item_name: str, updates: Dict[str, Any]) -> bool:
+def load_inventory_summary(store_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Load the inventory, the history counters and the invoice hashes,
+    without reading any history entries.
+
+    Args:
+        store_id: Store whose state to use (None = the single-store inventory_state node)
+
+    Returns:
+        Dictionary with 'inventory', 'counters' ('invoice_count', 'sales_count'),
+        'invoice_hashes' and 'last_updated', or None if not found/error
+    """
+    try:
+        ref = get_database_ref(_state_path(store_id))
+        if ref is None:
+            return None
+
+        inventory = ref.child('inventory').get()
+        counters = ref.child('counters').get()
+        last_updated = ref.child('last_updated').get()
+        if inventory is None and counters is None and last_updated is None:
+            return None
+
+        if counters is None:
+            # Written before counters were kept: count the history keys without their values
+            counters = {
+                'invoice_count': len(ref.child('invoice_history').get(shallow=True) or {}),
+                'sales_count': len(ref.child('sales_history').get(shallow=True) or {})
+            }
+
+        logger.info("Inventory summary loaded from Firebase")
+        return {
+            'inventory': inventory or {},
+            'counters': counters,
+            'invoice_hashes': ref.child('invoice_hashes').get() or {},
+            'last_updated': last_updated
+        }
+
+    except Exception as e:
+        logger.error(f"Failed to load inventory summary: {str(e)}")
+        return None
+
+
+def get_history_page(history_key: str, before: Optional[int] = None, limit: int = 50,
+                     store_id: Optional[str] = None) -> Optional[Dict[int, Any]]:
+    """
+    Get one page of invoice or sales history, newest entries first in the page.
+
+    Args:
+        history_key: 'invoice_history' or 'sales_history'
+        before: Only entries with a smaller index (None = the newest entries)
+        limit: Maximum number of entries to return
+        store_id: Store whose state to use (None = the single-store inventory_state node)
+
+    Returns:
+        Dictionary of index -> entry, or None if error
+    """
+    try:
+        if before is not None and before <= 0:
+            return {}
+
+        ref = get_database_ref(f'{_state_path(store_id)}/{history_key}')
+        if ref is None:
+            return None
+
+        query = ref.order_by_key()
+        if before is not None:
+            query = query.end_at(str(before - 1))
+        data = query.limit_to_last(limit).get() or {}
+        logger.info(f"Retrieved {len(data)} {history_key} entries")
+        return {int(index): entry for index, entry in data.items()}
+
+    except Exception as e:
+        logger.error(f"Failed to get history page: {str(e)}")
+        return None
+
+
+def update_inventory_item(item_name: str, updates: Dict[str, Any], store_id: Optional[str] = None) -> bool:
     """
     Update a specific inventory item.
 
     Args:
         item_name: Name of the inventory item
         updates: Dictionary of fields to update
+        store_id: Store whose state to use (None = the single-store inventory_state node)
 
     Returns:
         bool: True if successful, False otherwise
     """
     try:
-        ref = get_database_ref(f'inventory_state/items/{item_name}')
+        ref = get_database_ref(f'{_state_path(store_id)}/inventory/{item_name}')
         if ref is None:
             return False
 
@@ -170,6 +281,50 @@ def update_inventory_item(item_name: str, updates: Dict[str, Any]) -> bool:
         return False
 
 
+def save_inventory_delta(delta: Dict[str, Any], store_id: Optional[str] = None) -> bool:
+    """
+    Write only the changed parts of the inventory state in one multi-path update.
+    Same paths update_inventory_item writes to, batched so a whole upload is one round trip.
+
+    Args:
+        delta: Dictionary with 'inventory' (item_number -> item dict, or None to delete),
+               'invoice_history' / 'sales_history' (list index -> new entry), 'counters'
+               (counter name -> value), 'invoice_hashes' (content hashes to add),
+               'replace' (child name -> complete new value) and 'last_updated'
+        store_id: Store whose state to use (None = the single-store inventory_state node)
+
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    try:
+        ref = get_database_ref(_state_path(store_id))
+        if ref is None:
+            return False
+
+        updates = {}
+        for item_number, item in delta.get('inventory', {}).items():
+            updates[f'inventory/{item_number}'] = item
+        for history_key in ('invoice_history', 'sales_history'):
+            for index, entry in delta.get(history_key, {}).items():
+                updates[f'{history_key}/{index}'] = entry
+        for name, value in delta.get('counters', {}).items():
+            updates[f'counters/{name}'] = value
+        for content_hash in delta.get('invoice_hashes', ()):
+            updates[f'invoice_hashes/{content_hash}'] = True
+        for child, value in delta.get('replace', {}).items():
+            updates[child] = value
+        if 'last_updated' in delta:
+            updates['last_updated'] = delta['last_updated']
+
+        ref.update(updates)
+        logger.info(f"Inventory delta saved to Firebase ({len(updates)} paths)")
+        return True
+
+    except Exception as e:
+        logger.error(f"Failed to save inventory delta: {str(e)}")
+        return False
+
+
 # ============================================================================
 # FILE METADATA OPERATIONS
 # ============================================================================
@@ -200,6 +355,53 @@ def save_file_metadata(file_type: str, filename: str, metadata: Dict[str, Any])
         return False
 
 
+def get_parsed_invoice(content_hash: str) -> Optional[Dict[str, Any]]:
+    """
+    Get the cached extraction of an invoice PDF.
+
+    Args:
+        content_hash: SHA-256 of the PDF bytes
+
+    Returns:
+        Dictionary with 'parser_version' and 'data', or None if not cached or error
+    """
+    try:
+        ref = get_database_ref(f'files/parsed/{content_hash}')
+        if ref is None:
+            return None
+
+        return ref.get()
+
+    except Exception as e:
+        logger.error(f"Failed to get parsed invoice: {str(e)}")
+        return None
+
+
+def save_parsed_invoice(content_hash: str, entry: Dict[str, Any]) -> bool:
+    """
+    Cache the extraction of an invoice PDF next to the file metadata.
+
+    Args:
+        content_hash: SHA-256 of the PDF bytes
+        entry: Dictionary with 'parser_version' and 'data'
+
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    try:
+        ref = get_database_ref(f'files/parsed/{content_hash}')
+        if ref is None:
+            return False
+
+        ref.set(entry)
+        logger.info(f"Saved parsed invoice {content_hash[:12]}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Failed to save parsed invoice: {str(e)}")
+        return False
+
+
 def get_file_history(file_type: str, limit: int = 50) -> Optional[Dict[str, Any]]:
     """
     Get upload history for a specific file type.
@@ -231,7 +433,7 @@ def get_file_history(file_type: str, limit: int = 50) -> Optional[Dict[str, Any]
 
 def save_conversion_table(conversion_data: Dict[str, Any]) -> bool:
     """
-    Save the conversion table to Firebase.
+    Save the conversion table to Firebase and bump the catalog version.
 
     Args:
         conversion_data: Dictionary mapping item numbers to conversion data
@@ -240,11 +442,11 @@ def save_conversion_table(conversion_data: Dict[str, Any]) -> bool:
         bool: True if successful, False otherwise
     """
     try:
-        ref = get_database_ref('conversion_table')
+        ref = get_database_ref('/')
         if ref is None:
             return False
 
-        ref.set(conversion_data)
+        ref.update({'conversion_table': conversion_data, 'catalog_version': _new_catalog_version()})
         logger.info("Conversion table saved to Firebase")
         return True
 
@@ -280,7 +482,7 @@ def load_conversion_table() -> Optional[Dict[str, Any]]:
 
 def save_recipe_table(recipe_data: Dict[str, Any]) -> bool:
     """
-    Save the recipe table to Firebase.
+    Save the recipe table to Firebase and bump the catalog version.
 
     Args:
         recipe_data: Dictionary mapping POS items to recipes
@@ -289,11 +491,11 @@ def save_recipe_table(recipe_data: Dict[str, Any]) -> bool:
         bool: True if successful, False otherwise
     """
     try:
-        ref = get_database_ref('recipe_table')
+        ref = get_database_ref('/')
         if ref is None:
             return False
 
-        ref.set(recipe_data)
+        ref.update({'recipe_table': recipe_data, 'catalog_version': _new_catalog_version()})
         logger.info("Recipe table saved to Firebase")
         return True
 
@@ -323,6 +525,94 @@ def load_recipe_table() -> Optional[Dict[str, Any]]:
         return None
 
 
+# ============================================================================
+# CATALOG VERSION OPERATIONS
+# ============================================================================
+
+def _new_catalog_version() -> Dict[str, Any]:
+    """Value for the catalog_version node after either table changed."""
+    return {'version': uuid.uuid4().hex, 'updated_at': datetime.now().isoformat()}
+
+
+def publish_catalog(conversion_data: Dict[str, Any], recipe_data: Dict[str, Any]) -> Optional[str]:
+    """
+    Replace both catalog tables and bump the catalog version in one multi-path update.
+
+    Args:
+        conversion_data: Dictionary mapping item numbers to conversion data
+        recipe_data: Dictionary mapping POS items to recipes
+
+    Returns:
+        str: The new catalog version, or None on error
+    """
+    try:
+        ref = get_database_ref('/')
+        if ref is None:
+            return None
+
+        version = _new_catalog_version()
+        ref.update({'conversion_table': conversion_data, 'recipe_table': recipe_data, 'catalog_version': version})
+        logger.info(f"Catalog published to Firebase (version {version['version']})")
+        return version['version']
+
+    except Exception as e:
+        logger.error(f"Failed to publish catalog: {str(e)}")
+        return None
+
+
+def get_catalog_version() -> Optional[str]:
+    """
+    Read only the catalog version, to check a local copy of the tables.
+
+    Returns:
+        str: Current version, '' if the tables were never versioned, or None on error
+    """
+    try:
+        ref = get_database_ref('catalog_version/version')
+        if ref is None:
+            return None
+
+        return ref.get() or ''
+
+    except Exception as e:
+        logger.error(f"Failed to get catalog version: {str(e)}")
+        return None
+
+
+def listen_catalog_version(callback: Callable[[Optional[str]], None]) -> Optional[Any]:
+    """
+    Call back whenever the catalog version changes in Firebase.
+
+    Only the small catalog_version node is streamed, not the tables. The
+    callback runs on the SDK's listener thread, so it should only hand the work
+    off. It is also called once right away with the current version.
+
+    Args:
+        callback: Called with the new version (None if the node was removed)
+
+    Returns:
+        Listener registration (call .close() to stop), or None on error
+    """
+    try:
+        ref = get_database_ref('catalog_version')
+        if ref is None:
+            return None
+
+        def on_event(event):
+            if event.path == '/':
+                callback(event.data.get('version') if isinstance(event.data, dict) else None)
+            elif event.path == '/version':
+                callback(event.data)
+
+        registration = ref.listen(on_event)
+        logger.info("Listening for catalog version changes in Firebase")
+        return registration
+
+    except Exception as e:
+        logger.error(f"Failed to listen for catalog version changes: {str(e)}")
+        return None
+
+
 # ============================================================================
 # UTILITY FUNCTIONS
 # ============================================================================
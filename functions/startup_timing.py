@@ -0,0 +1,59 @@
+"""
+Startup Timing
+Wall-clock durations of the phases of a cold start.
+
+The serverless entry points wrap their imports, app setup and first data load
+in phase() blocks. The durations are printed once the first request has loaded
+its data and are served by GET /startup, so slow cold starts can be broken
+down without a profiler.
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Tuple
+
+# When this module was first imported; entry points import it before anything else
+PROCESS_START = time.perf_counter()
+
+_lock = threading.Lock()
+_phases: List[Tuple[str, float]] = []
+
+
+@contextmanager
+def phase(name: str):
+    """
+    Time a block and record it under name.
+
+    Args:
+        name: Phase label, e.g. 'imports'
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        with _lock:
+            _phases.append((name, elapsed))
+
+
+def report() -> Dict[str, Any]:
+    """
+    Recorded phases in the order they finished.
+
+    Returns:
+        dict: {'phases': [{'phase', 'ms'}], 'total_ms', 'uptime_ms'}
+    """
+    with _lock:
+        phases = list(_phases)
+    return {
+        'phases': [{'phase': name, 'ms': round(ms, 1)} for name, ms in phases],
+        'total_ms': round(sum(ms for _, ms in phases), 1),
+        'uptime_ms': round((time.perf_counter() - PROCESS_START) * 1000, 1)
+    }
+
+
+def summary() -> str:
+    """One line for the logs, e.g. 'imports 180.2 ms, tables 0.4 ms'."""
+    with _lock:
+        return ', '.join(f"{name} {ms:.1f} ms" for name, ms in _phases)
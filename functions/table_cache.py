@@ -0,0 +1,296 @@
+"""
+Conversion/Recipe Table Cache
+Compiles the conversion and recipe CSVs into a versioned JSON file that workers load instead.
+
+Every process used to parse both CSVs with csv.DictReader, stripping every
+field and converting every quantity_used again. The compiled file holds the
+already-cleaned tables as plain JSON arrays with the format version and a
+SHA-256 of the source CSVs, so loading it is a single json.load with no
+per-field work left to do.
+
+The checksum is over the CSV contents, not their file times, so a compiled
+file stays valid after a git checkout or a deploy. When a CSV changes, the
+next open_tables() sees the mismatch and compiles the file again.
+
+Build it ahead of time (e.g. before deploying) with:
+    python table_cache.py [inventory folder] [--output PATH] [--check]
+"""
+
+import os
+import csv
+import sys
+import json
+import hashlib
+import logging
+import argparse
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Bump when the file layout changes; older files are rebuilt
+FORMAT_VERSION = 3
+
+CONVERSION_CSV = 'DQ inventory - Conversion.csv'
+RECIPE_CSV = 'DQ inventory - Recipe.csv'
+TABLES_FILE = 'tables.json'
+
+# item_number -> (description, order_unit, items_per_case, usable_unit, notes)
+ConversionRow = Tuple[str, str, str, str, str]
+# (item_number, description, quantity_used, unit)
+IngredientRow = Tuple[str, str, float, str]
+
+
+def table_files(inventory_folder: str) -> List[str]:
+    """Paths of the conversion and recipe CSVs in an inventory folder."""
+    return [os.path.join(inventory_folder, CONVERSION_CSV), os.path.join(inventory_folder, RECIPE_CSV)]
+
+
+def cache_locations(inventory_folder: str, tmp_folder: Optional[str] = None) -> List[str]:
+    """
+    Where to look for the compiled file: next to the CSVs (can ship with a deploy), then a scratch folder.
+
+    Args:
+        inventory_folder: Folder holding the CSVs
+        tmp_folder: Writable fallback on read-only deployments (None = no fallback)
+    """
+    paths = [os.path.join(inventory_folder, TABLES_FILE)]
+    if tmp_folder:
+        paths.append(os.path.join(tmp_folder, TABLES_FILE))
+    return paths
+
+
+def tables_checksum(csv_paths: Sequence[str]) -> bytes:
+    """
+    SHA-256 over the contents of the table CSVs, in order.
+
+    Args:
+        csv_paths: Paths of the CSV files
+
+    Returns:
+        bytes: Digest (missing files count as empty)
+    """
+    digest = hashlib.sha256()
+    for path in csv_paths:
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            data = b''
+        digest.update(len(data).to_bytes(8, 'little'))
+        digest.update(data)
+    return digest.digest()
+
+
+def read_csv_tables(conversion_csv: str, recipe_csv: str) -> Tuple[Dict[str, ConversionRow], Dict[str, List[IngredientRow]]]:
+    """
+    Parse and clean both CSVs the way the loaders always have.
+
+    Args:
+        conversion_csv: Path of the conversion table
+        recipe_csv: Path of the recipe table
+
+    Returns:
+        tuple: (conversions by item number, ingredient lists by POS item name)
+
+    Raises:
+        OSError: A CSV can't be read
+        ValueError: A quantity_used isn't a number
+    """
+    conversions: Dict[str, ConversionRow] = {}
+    with open(conversion_csv, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            item_number = row['item_number'].strip()
+            if item_number:
+                conversions[item_number] = (
+                    row['description'].strip(),
+                    row['order_unit'].strip(),
+                    row['items_per_case'].strip(),
+                    row['usable_unit'].strip(),
+                    (row.get('notes') or '').strip()
+                )
+
+    recipes: Dict[str, List[IngredientRow]] = {}
+    with open(recipe_csv, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            pos_item = row['pos_item_name'].strip()
+            item_number = row['inventory_item_number'].strip()
+            if pos_item and item_number:
+                recipes.setdefault(pos_item, []).append((
+                    item_number,
+                    row['inventory_description'].strip(),
+                    float(row['quantity_used']) if row['quantity_used'] else 0,
+                    row['unit'].strip()
+                ))
+    return conversions, recipes
+
+
+def compile_tables(csv_paths: Sequence[str], output_path: str) -> bytes:
+    """
+    Compile the CSVs into a tables file, replacing any existing one atomically.
+
+    Args:
+        csv_paths: Conversion and recipe CSV paths (as returned by table_files)
+        output_path: File to write
+
+    Returns:
+        bytes: Checksum of the CSVs the file was built from
+
+    Raises:
+        OSError: A CSV can't be read or the output can't be written
+        ValueError: A CSV has bad values
+    """
+    checksum = tables_checksum(csv_paths)
+    conversions, recipes = read_csv_tables(*csv_paths)
+
+    data = {
+        'format': FORMAT_VERSION,
+        'checksum': checksum.hex(),
+        'conversions': [[item_number, *fields] for item_number, fields in conversions.items()],
+        'recipes': [[pos_item, [list(ingredient) for ingredient in ingredients]]
+                    for pos_item, ingredients in recipes.items()]
+    }
+
+    # Unique temp name: several workers may notice a stale file at the same time
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, output_path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return checksum
+
+
+class CompiledTables:
+    """
+    Tables read from a compiled tables file.
+
+    The whole file is loaded on open; close() drops the loaded rows.
+
+    Args:
+        path: Tables file to open
+
+    Raises:
+        OSError: The file can't be read
+        ValueError: The file isn't a tables file of this format version
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'r', encoding='utf-8') as f:
+            try:
+                data = json.load(f)
+            except ValueError as e:
+                raise ValueError(f"{path} is not a tables file ({str(e)})")
+        if not isinstance(data, dict) or 'format' not in data:
+            raise ValueError(f"{path} is not a tables file")
+        if data['format'] != FORMAT_VERSION:
+            raise ValueError(f"{path} has format {data['format']}, expected {FORMAT_VERSION}")
+        try:
+            self.checksum = bytes.fromhex(data['checksum'])
+            self._conversions = data['conversions']
+            self._recipes = data['recipes']
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"{path} is incomplete ({str(e)})")
+        self.conversion_count = len(self._conversions)
+        self.recipe_count = len(self._recipes)
+        self.ingredient_count = sum(len(ingredients) for _, ingredients in self._recipes)
+
+    def conversions(self) -> Iterator[Tuple[str, ConversionRow]]:
+        """(item_number, (description, order_unit, items_per_case, usable_unit, notes)) in CSV order."""
+        for item_number, *fields in self._conversions:
+            yield item_number, tuple(fields)
+
+    def recipes(self) -> Iterator[Tuple[str, List[IngredientRow]]]:
+        """(pos_item_name, [(item_number, description, quantity_used, unit)]) in CSV order."""
+        for pos_item, ingredients in self._recipes:
+            yield pos_item, [tuple(ingredient) for ingredient in ingredients]
+
+    def close(self):
+        """Drop the loaded rows."""
+        self._conversions = self._recipes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_tables(cache_paths: Sequence[str], csv_paths: Sequence[str]) -> CompiledTables:
+    """
+    Map the compiled tables, compiling them first if no file matches the CSVs.
+
+    Args:
+        cache_paths: Tables files to try, in order (see cache_locations); a rebuild
+                     goes to the first writable one
+        csv_paths: Conversion and recipe CSV paths
+
+    Returns:
+        CompiledTables: Open tables matching the current CSVs
+
+    Raises:
+        OSError: The CSVs can't be read or no location is writable
+        ValueError: A CSV has bad values
+    """
+    checksum = tables_checksum(csv_paths)
+    for cache_path in cache_paths:
+        try:
+            tables = CompiledTables(cache_path)
+        except FileNotFoundError:
+            continue
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring tables file {cache_path}: {str(e)}")
+            continue
+        if tables.checksum == checksum:
+            return tables
+        tables.close()
+        logger.info(f"{cache_path} is out of date with the CSVs")
+
+    error = None
+    for cache_path in cache_paths:
+        try:
+            compile_tables(csv_paths, cache_path)
+        except OSError as e:
+            logger.info(f"Could not compile tables to {cache_path}: {str(e)}")
+            error = e
+            continue
+        logger.info(f"Compiled {cache_path}")
+        return CompiledTables(cache_path)
+    raise error or OSError("No tables file location given")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile the conversion and recipe CSVs into a tables file.')
+    parser.add_argument('inventory', nargs='?', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'inventory'),
+                        help='folder holding the CSVs (default: inventory/ next to this script)')
+    parser.add_argument('--output', help=f'file to write (default: {TABLES_FILE} in the inventory folder)')
+    parser.add_argument('--check', action='store_true', help='only report whether the file matches the CSVs (exit 1 if not)')
+    args = parser.parse_args()
+
+    csv_paths = table_files(args.inventory)
+    output = args.output or cache_locations(args.inventory)[0]
+
+    if args.check:
+        try:
+            with CompiledTables(output) as tables:
+                current = tables.checksum == tables_checksum(csv_paths)
+        except (OSError, ValueError) as e:
+            print(f"{output}: {str(e)}")
+            sys.exit(1)
+        print(f"{output}: {'up to date' if current else 'out of date'}")
+        sys.exit(0 if current else 1)
+
+    checksum = compile_tables(csv_paths, output)
+    with CompiledTables(output) as tables:
+        print(f"Wrote {output} ({os.path.getsize(output)} bytes, format {FORMAT_VERSION}): "
+              f"{tables.conversion_count} conversions, {tables.recipe_count} POS items, "
+              f"{tables.ingredient_count} ingredients, sha256 {checksum.hex()[:12]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Paged History Module
+Append-only upload history whose older entries can stay in storage until asked for.
+
+The invoice and sales histories only grow. Loading them in full on every cold
+start costs time and memory proportional to their length, yet the app only
+needs the number of entries and whatever page someone is looking at. A
+PagedHistory keeps a running count, the entries appended by this process and
+the pages fetched so far.
+"""
+
+import threading
+import logging
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# fetch_page(before, limit) -> {index: entry} for the newest `limit` entries with index < before
+# (before=None means from the end)
+FetchPage = Callable[[Optional[int], int], Optional[Dict[int, Any]]]
+
+
+class PagedHistory:
+    """
+    List-like history with a maintained count and lazily fetched pages.
+
+    Args:
+        entries: All entries, when the whole history is already in memory
+        count: Number of entries in storage, when it isn't
+        fetch_page: Reads a page from storage (required when entries is None)
+    """
+
+    def __init__(self, entries: Optional[List[Any]] = None, count: int = 0,
+                 fetch_page: Optional[FetchPage] = None):
+        self._lock = threading.Lock()
+        if entries is not None:
+            self._entries: Dict[int, Any] = dict(enumerate(entries))
+            self._count = len(entries)
+            self._complete = True
+        else:
+            self._entries = {}
+            self._count = count
+            self._complete = count == 0
+        self._fetch_page = fetch_page
+
+    @property
+    def count(self) -> int:
+        """Number of entries, loaded or not."""
+        return self._count
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def complete(self) -> bool:
+        """True when every entry is in memory."""
+        return self._complete
+
+    def append(self, entry: Any) -> int:
+        """
+        Add an entry at the end.
+
+        Returns:
+            int: Index of the new entry
+        """
+        with self._lock:
+            index = self._count
+            self._entries[index] = entry
+            self._count += 1
+            return index
+
+    def set(self, index: int, entry: Any):
+        """Store an entry read or replayed from elsewhere."""
+        with self._lock:
+            self._entries[index] = entry
+            self._count = max(self._count, index + 1)
+
+    def known(self) -> Dict[int, Any]:
+        """Copy of the entries that are in memory, by index."""
+        with self._lock:
+            return dict(self._entries)
+
+    def _load(self, before: int, limit: int):
+        # Fetch outside the lock; storage reads can be slow
+        missing = [index for index in range(max(0, before - limit), before) if index not in self._entries]
+        if not missing or self._fetch_page is None:
+            return
+        page = self._fetch_page(before, limit)
+        if page is None:
+            logger.error("Failed to fetch history page")
+            return
+        with self._lock:
+            for index, entry in page.items():
+                self._entries.setdefault(index, entry)
+            if len(self._entries) >= self._count:
+                self._complete = True
+
+    def page(self, before: Optional[int] = None, limit: int = 50) -> List[Tuple[int, Any]]:
+        """
+        Newest-first page of entries.
+
+        Args:
+            before: Only entries with a smaller index (None = from the newest)
+            limit: Page size
+
+        Returns:
+            list: (index, entry) pairs, newest first
+        """
+        before = self._count if before is None else min(before, self._count)
+        self._load(before, limit)
+        with self._lock:
+            return [(index, self._entries[index])
+                    for index in range(before - 1, max(0, before - limit) - 1, -1)
+                    if index in self._entries]
+
+    def to_list(self) -> List[Any]:
+        """
+        Every entry, fetching whatever isn't loaded yet.
+        Entries that can't be fetched are None so later indexes keep their place.
+        """
+        if not self._complete:
+            self._load(self._count, self._count)
+        with self._lock:
+            return [self._entries.get(index) for index in range(self._count)]
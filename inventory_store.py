@@ -0,0 +1,197 @@
+"""
+Inventory Store Module
+Thread-safe in-memory inventory with per-item lock striping.
+"""
+
+import threading
+from array import array
+from collections import namedtuple
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterable, List, Optional
+from records import ItemInfo, item_info
+
+# One change to apply to the store.
+#   kind: 'add' (create if missing, then add quantity), 'deduct' (subtract, only if present),
+#         'set' (replace the whole item), 'set_quantity' (only if present)
+InventoryOp = namedtuple('InventoryOp', ['kind', 'item_number', 'quantity', 'unit', 'description'])
+InventoryOp.__new__.__defaults__ = (None, None)
+
+# Outcome of one op. old/new are item dicts (copies), or None when the item didn't exist.
+OpResult = namedtuple('OpResult', ['op', 'applied', 'old', 'new'])
+
+
+def add_op(item_number: str, quantity: float, unit: str, description: str) -> InventoryOp:
+    """Add stock, creating the item if needed."""
+    return InventoryOp('add', item_number, quantity, unit, description)
+
+
+def deduct_op(item_number: str, quantity: float) -> InventoryOp:
+    """Remove stock from an item that is already in inventory."""
+    return InventoryOp('deduct', item_number, quantity)
+
+
+def set_op(item_number: str, quantity: float, unit: str, description: str) -> InventoryOp:
+    """Replace an item outright."""
+    return InventoryOp('set', item_number, quantity, unit, description)
+
+
+def set_quantity_op(item_number: str, quantity: float) -> InventoryOp:
+    """Overwrite the quantity of an item that is already in inventory."""
+    return InventoryOp('set_quantity', item_number, quantity)
+
+
+class InventoryStore:
+    """
+    Item number -> {quantity, unit, description} map that is safe to share
+    between request threads.
+
+    Each item hashes to one of ``stripes`` locks. ``apply_batch`` takes the locks
+    for every item in the batch (in a fixed order, so batches can't deadlock) and
+    applies all ops before releasing any of them, so concurrent uploads and
+    manual edits never lose an update and never see a half-applied batch.
+
+    Items are stored compactly: each item number gets a dense index, quantities
+    live in one array of doubles and unit/description pairs are shared ItemInfo
+    records. Item dicts are only built when something reads them.
+
+    Args:
+        items: Initial inventory
+        stripes: Number of item locks
+    """
+
+    def __init__(self, items: Optional[Dict[str, Dict[str, Any]]] = None, stripes: int = 32):
+        # Re-entrant so callers can hold lock_all() around replace_all()/to_dict()
+        self._locks = [threading.RLock() for _ in range(stripes)]
+        # Handing out a new dense index must not race between stripes
+        self._grow_lock = threading.Lock()
+        self._index: Dict[str, int] = {}
+        self._quantities = array('d')
+        self._info: List[ItemInfo] = []
+        if items:
+            self.replace_all(items)
+
+    def _stripe(self, item_number: str) -> int:
+        return hash(item_number) % len(self._locks)
+
+    @contextmanager
+    def _locked(self, stripe_ids: Iterable[int]):
+        acquired = []
+        try:
+            for stripe_id in sorted(set(stripe_ids)):
+                self._locks[stripe_id].acquire()
+                acquired.append(stripe_id)
+            yield
+        finally:
+            for stripe_id in reversed(acquired):
+                self._locks[stripe_id].release()
+
+    @contextmanager
+    def lock_all(self):
+        """Hold every stripe, e.g. to take a consistent snapshot alongside other state."""
+        with self._locked(range(len(self._locks))):
+            yield
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def _item(self, index: int) -> Dict[str, Any]:
+        info = self._info[index]
+        return {'quantity': self._quantities[index], 'unit': info.unit, 'description': info.description}
+
+    def __contains__(self, item_number: str) -> bool:
+        return item_number in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get(self, item_number: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of one item, or None."""
+        with self._locked([self._stripe(item_number)]):
+            index = self._index.get(item_number)
+            return self._item(index) if index is not None else None
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Copy of the whole inventory.
+        Call inside ``lock_all()`` when it has to line up with other state.
+        """
+        return {item_number: self._item(index) for item_number, index in list(self._index.items())}
+
+    def items(self):
+        """(item_number, item copy) pairs."""
+        return self.to_dict().items()
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def apply_batch(self, ops: List[InventoryOp],
+                    on_applied: Optional[Callable[[List[OpResult]], Any]] = None) -> List[OpResult]:
+        """
+        Apply a list of ops atomically.
+
+        Args:
+            ops: Changes to apply, in order
+            on_applied: Called with the results while the item locks are still held,
+                        so anything it records is ordered consistently with the change
+
+        Returns:
+            List of OpResult, one per op
+        """
+        results = []
+        with self._locked(self._stripe(op.item_number) for op in ops):
+            for op in ops:
+                index = self._index.get(op.item_number)
+                old = self._item(index) if index is not None else None
+
+                if op.kind == 'add':
+                    if index is None:
+                        index = self._allocate(op.item_number, item_info(op.unit, op.description))
+                    self._quantities[index] += op.quantity
+                elif op.kind == 'set':
+                    if index is None:
+                        index = self._allocate(op.item_number, item_info(op.unit, op.description))
+                    else:
+                        self._info[index] = item_info(op.unit, op.description)
+                    self._quantities[index] = op.quantity
+                elif index is None:
+                    # deduct / set_quantity only touch items that already exist
+                    results.append(OpResult(op, False, None, None))
+                    continue
+                elif op.kind == 'deduct':
+                    self._quantities[index] -= op.quantity
+                elif op.kind == 'set_quantity':
+                    self._quantities[index] = op.quantity
+                else:
+                    raise ValueError(f"Unknown inventory op: {op.kind}")
+
+                results.append(OpResult(op, True, old, self._item(index)))
+
+            if on_applied is not None:
+                on_applied(results)
+        return results
+
+    def _allocate(self, item_number: str, info: ItemInfo) -> int:
+        # Caller holds the item's stripe, so nobody else is adding this item number
+        with self._grow_lock:
+            index = len(self._info)
+            self._quantities.append(0.0)
+            self._info.append(info)
+            self._index[item_number] = index
+        return index
+
+    def replace_all(self, items: Dict[str, Dict[str, Any]]):
+        """
+        Swap in a whole new inventory (load, clear).
+
+        Args:
+            items: Item number -> item dict
+        """
+        with self.lock_all():
+            self._index = {}
+            self._quantities = array('d')
+            self._info = []
+            for item_number, item in items.items():
+                index = self._allocate(item_number, item_info(item.get('unit'), item.get('description')))
+                self._quantities[index] = item.get('quantity') or 0
@@ -0,0 +1,208 @@
+"""
+Inventory View Module
+Description-sorted copy of a store's inventory, kept up to date as changes are applied.
+
+GET /inventory lists every item sorted by description with quantities rounded
+for display. Instead of sorting and rounding the whole inventory on every call,
+the view keeps the rows in that order and moves only the items a batch touched.
+Every change bumps a version number, so a response serialized once can be
+served again (or answered with 304 Not Modified) until the next change.
+"""
+
+import json
+import uuid
+import base64
+import binascii
+import threading
+from bisect import bisect_left, bisect_right
+from typing import Dict, Any, Callable, List, Optional, Tuple, TypeVar
+
+from inventory_store import OpResult
+
+T = TypeVar('T')
+
+# Sort key of one row: description, then the order items were first added
+# (the order a stable sort of the inventory by description gives)
+RowKey = Tuple[str, int]
+
+
+def encode_cursor(key: RowKey) -> str:
+    """Opaque page cursor for the row with this key (URL-safe)."""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> RowKey:
+    """
+    Row key from a cursor made by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        description, order = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    if not isinstance(description, str) or not isinstance(order, int):
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    return description, order
+
+
+def display_row(item_number: str, item: Dict[str, Any]) -> Dict[str, Any]:
+    """One /inventory row for an item dict."""
+    return {
+        'item_number': item_number,
+        'description': item['description'],
+        'quantity': round(item['quantity'], 2),
+        'unit': item['unit']
+    }
+
+
+class InventoryView:
+    """
+    Inventory rows sorted by description, updated incrementally.
+
+    Rows are never modified once built (a change replaces the row), so a list
+    returned by rows() stays valid after the view moves on.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: List[RowKey] = []  # sorted
+        self._item_numbers: List[str] = []  # item number of each key, same positions
+        self._entries: Dict[str, Tuple[RowKey, Dict[str, Any]]] = {}  # item_number -> (key, row)
+        self._next_order = 0
+        self._version = 0
+        # Distinguishes this view's versions from those of an earlier process or a reloaded store
+        self._token = uuid.uuid4().hex[:12]
+        self._cached_version = -1
+        self._cached: Any = None
+
+    @property
+    def version(self) -> int:
+        """Increases with every change."""
+        return self._version
+
+    @property
+    def etag(self) -> str:
+        """Entity tag for the current version."""
+        return f'{self._token}-{self._version}'
+
+    def _remove(self, item_number: str):
+        key, _ = self._entries.pop(item_number)
+        position = bisect_left(self._keys, key)
+        del self._keys[position]
+        del self._item_numbers[position]
+
+    def _place(self, item_number: str, item: Dict[str, Any]):
+        row = display_row(item_number, item)
+        description = row['description'] or ''
+        entry = self._entries.get(item_number)
+        if entry is not None and entry[0][0] == description:
+            # Same place in the order, new values
+            self._entries[item_number] = (entry[0], row)
+            return
+
+        if entry is not None:
+            order = entry[0][1]
+            self._remove(item_number)
+        else:
+            order = self._next_order
+            self._next_order += 1
+        key = (description, order)
+        position = bisect_left(self._keys, key)
+        self._keys.insert(position, key)
+        self._item_numbers.insert(position, item_number)
+        self._entries[item_number] = (key, row)
+
+    def reset(self, inventory: Dict[str, Dict[str, Any]]):
+        """
+        Rebuild from a whole inventory (load, clear).
+
+        Args:
+            inventory: Item number -> item dict, in the order the items were added
+        """
+        with self._lock:
+            self._keys = []
+            self._item_numbers = []
+            self._entries = {}
+            self._next_order = 0
+            for item_number, item in inventory.items():
+                self._place(item_number, item)
+            self._version += 1
+
+    def apply(self, results: List[OpResult]):
+        """
+        Apply the outcome of one batch. Bumps the version even when no item
+        changed, since the batch may have added history.
+
+        Args:
+            results: OpResults from InventoryStore.apply_batch
+        """
+        with self._lock:
+            for result in results:
+                if not result.applied:
+                    continue
+                item_number = result.op.item_number
+                if result.new is None:
+                    if item_number in self._entries:
+                        self._remove(item_number)
+                else:
+                    self._place(item_number, result.new)
+            self._version += 1
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """All rows in description order."""
+        with self._lock:
+            return [self._entries[item_number][1] for item_number in self._item_numbers]
+
+    def page(self, after: Optional[RowKey] = None, limit: Optional[int] = None,
+             match: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Tuple[List[Dict[str, Any]], Optional[RowKey]]:
+        """
+        Rows in description order starting after a given row.
+
+        Keys only ever move when an item's description changes, so paging with
+        the returned key neither repeats nor skips the other items while the
+        inventory changes in between.
+
+        Args:
+            after: Key of the last row already seen (None = from the start)
+            limit: Maximum number of rows (None = all the rest)
+            match: Only rows for which this returns True
+
+        Returns:
+            (rows, key of the last row returned if more matching rows follow, else None)
+        """
+        with self._lock:
+            position = bisect_right(self._keys, after) if after is not None else 0
+            rows = []
+            keys = []
+            for item_number in self._item_numbers[position:]:
+                key, row = self._entries[item_number]
+                if match is not None and not match(row):
+                    continue
+                if limit is not None and len(rows) == limit:
+                    # One more match exists, so there is a next page
+                    return rows, keys[-1]
+                rows.append(row)
+                keys.append(key)
+            return rows, None
+
+    def cached(self, build: Callable[[List[Dict[str, Any]]], T]) -> Tuple[T, str]:
+        """
+        build(rows) for the current version, computed once per version.
+
+        Args:
+            build: Turns the sorted rows into the value to cache (e.g. a response body)
+
+        Returns:
+            (value, etag) for the version the value was built from
+        """
+        with self._lock:
+            if self._cached_version != self._version:
+                rows = [self._entries[item_number][1] for item_number in self._item_numbers]
+                self._cached = build(rows)
+                self._cached_version = self._version
+            return self._cached, self.etag
+
+    def __len__(self) -> int:
+        return len(self._entries)
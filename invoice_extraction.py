@@ -0,0 +1,300 @@
+"""
+Invoice Extraction Module
+Parses supplier PDF invoices into line items (line grammars live in line_parsers.py).
+Kept free of Flask/app state so it can run inside worker processes.
+"""
+
+import re
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import pdfplumber
+from line_parsers import DEFAULT_PARSER, detect_parser, get_parser
+from column_templates import TEMPLATES, get_template, page_text, template_for_rows
+
+# suppress noisy pdfminer/pdfplumber warnings about invalid color tokens
+logging.getLogger('pdfminer').setLevel(logging.ERROR)
+logging.getLogger('pdfplumber').setLevel(logging.ERROR)
+
+logger = logging.getLogger(__name__)
+
+INVOICE_NUMBER_RE = re.compile(r'invoice\s*#?\s*:?\s*(\w+)', re.IGNORECASE)
+DATE_RES = [
+    re.compile(r'date\s*:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})', re.IGNORECASE),
+    re.compile(r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})', re.IGNORECASE)
+]
+SUPPLIER_RE = re.compile(r'(?:from|vendor|supplier)\s*:?\s*([A-Za-z\s]+)', re.IGNORECASE)
+TOTAL_RE = re.compile(r'total\s*:?\s*[\$€£]?([\d,]+\.?\d*)', re.IGNORECASE)
+# Only a line that starts with the invoice total ends the line items (not SUBTOTAL or PAGE TOTAL)
+GRAND_TOTAL_RE = re.compile(r'^\s*(?:invoice\s+|grand\s+)?total\b\s*:?\s*[\$€£]?([\d,]+\.?\d*)',
+                            re.IGNORECASE | re.MULTILINE)
+
+# Bump when a change alters what gets extracted, so cached parse results are redone
+PARSER_VERSION = 2
+
+# 'text' parses regex lines from page text, 'table' uses word positions and column templates
+EXTRACTION_MODES = ('text', 'table')
+
+# Pages handed to one worker at a time; shorter PDFs are read serially
+PAGES_PER_TASK = 8
+
+# Worker processes shared by every upload (see process_pool)
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def process_pool(workers):
+    """
+    The process pool that invoices and pages are parsed in, created on first use.
+
+    Workers are started by a fork server (spawn where there is none) rather
+    than forked from the app: the app has job, save and listener threads
+    running, and a forked child could inherit a lock one of them held.
+    Starting workers that way is slow, so the pool is kept for the life of
+    the process instead of being made per upload.
+
+    Args:
+        workers: Number of worker processes (used when the pool is created)
+
+    Returns:
+        ProcessPoolExecutor
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            try:
+                context = multiprocessing.get_context('forkserver')
+                # The fork server itself only needs the parser, not the app that started it
+                context.set_forkserver_preload([__name__])
+            except ValueError:
+                context = multiprocessing.get_context('spawn')
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        return _pool
+
+
+def discard_pool(pool):
+    """
+    Drop a pool that can't run tasks (a worker died or couldn't start), so the
+    next process_pool() call makes a new one.
+
+    Args:
+        pool: Pool returned by process_pool
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _page_content(page, mode):
+    if mode == 'table':
+        # Plain tuples pickle much smaller than pdfplumber's word dicts
+        return [(word['x0'], word['top'], word['text']) for word in page.extract_words()]
+    return page.extract_text() or ''
+
+
+def extract_page_contents(pdf_path, page_numbers, mode='text'):
+    """
+    Extract some pages of a PDF.
+    Top-level so it can be pickled and sent to a process pool.
+
+    Args:
+        pdf_path: Path to the PDF
+        page_numbers: Zero-based page numbers
+        mode: 'text' for page text, 'table' for (x0, top, text) words
+
+    Returns:
+        list: Page contents in the order requested
+    """
+    # pdfplumber numbers pages from 1
+    with pdfplumber.open(pdf_path, pages=[number + 1 for number in page_numbers]) as pdf:
+        return [_page_content(page, mode) for page in pdf.pages]
+
+
+def iter_page_contents(pdf_path, page_workers=1, mode='text'):
+    """
+    Yield each page's content in order, one page at a time.
+
+    With page_workers > 1 and a long enough PDF, pages are extracted in the
+    shared process pool (PAGES_PER_TASK pages per task) and still yielded in
+    order. Closing the generator early cancels pages that haven't started.
+    Inside a pool worker pages are always read serially; pools aren't nested.
+
+    Args:
+        pdf_path: Path to the PDF
+        page_workers: Worker processes to spread the pages over
+        mode: 'text' for page text, 'table' for (x0, top, text) words
+    """
+    if multiprocessing.parent_process() is not None:
+        page_workers = 1
+    with pdfplumber.open(pdf_path) as pdf:
+        page_count = len(pdf.pages)
+        if page_workers <= 1 or page_count <= PAGES_PER_TASK:
+            for page in pdf.pages:
+                yield _page_content(page, mode)
+                # Drop the parsed layout of pages we are done with
+                page.close()
+            return
+
+    tasks = [range(first, min(first + PAGES_PER_TASK, page_count))
+             for first in range(0, page_count, PAGES_PER_TASK)]
+    pool = None
+    try:
+        pool = process_pool(page_workers)
+        futures = [pool.submit(extract_page_contents, pdf_path, list(pages), mode) for pages in tasks]
+    except (OSError, NotImplementedError, BrokenProcessPool) as e:
+        # Some serverless sandboxes can't create worker processes
+        logger.warning(f"Process pool unavailable ({e}), reading pages serially")
+        if pool is not None:
+            discard_pool(pool)
+        for pages in tasks:
+            yield from extract_page_contents(pdf_path, list(pages), mode)
+        return
+
+    done = 0
+    try:
+        for future in futures:
+            try:
+                contents = future.result()
+            except BrokenProcessPool as e:
+                # A worker died; read the rest here and let the next PDF start a new pool
+                logger.warning(f"Process pool failed ({e}), reading the remaining pages serially")
+                discard_pool(pool)
+                for pages in tasks[done:]:
+                    yield from extract_page_contents(pdf_path, list(pages), mode)
+                return
+            done += 1
+            yield from contents
+    finally:
+        # The pool is shared, so only this PDF's pages that haven't started are dropped
+        for future in futures:
+            future.cancel()
+
+
+def _parse_header(text, header):
+    """Fill in header fields that are still missing from one page of text"""
+    if header['invoice_number'] is None:
+        invoice_match = INVOICE_NUMBER_RE.search(text)
+        if invoice_match:
+            header['invoice_number'] = invoice_match.group(1)
+
+    if header['date'] is None:
+        for pattern in DATE_RES:
+            date_match = pattern.search(text)
+            if date_match:
+                header['date'] = date_match.group(1)
+                break
+
+    if header['supplier'] is None:
+        supplier_match = SUPPLIER_RE.search(text)
+        if supplier_match:
+            header['supplier'] = supplier_match.group(1).strip()
+
+
+def iter_invoice_items(pdf_path, header, page_workers=1, supplier=None, mode='text'):
+    """
+    Yield line items page by page.
+
+    Header fields (invoice number, date, supplier) are read from the first
+    page; later pages are only searched for fields the first page didn't have.
+    Reading stops after the page that holds the invoice total (a line starting
+    with TOTAL; subtotals and page totals don't count).
+
+    In 'text' mode each line of page text goes through the supplier's
+    LineParser. In 'table' mode the page's words are split into rows and
+    columns with the supplier's ColumnTemplate instead; suppliers without a
+    ColumnTemplate fall back to their LineParser on the rebuilt page text.
+
+    Args:
+        pdf_path: Path to the PDF
+        header: Dict with 'invoice_number', 'date', 'supplier' and 'total' keys,
+                filled in as pages are read
+        page_workers: Worker processes for page extraction
+        supplier: Parser/template key; detected from the first page when None
+        mode: 'text' or 'table'
+
+    Yields:
+        dict: One line item ({'name', 'quantity', 'price'})
+    """
+    if mode not in EXTRACTION_MODES:
+        raise ValueError(f"Unknown extraction mode: {mode}")
+    parser = None
+    pages = iter_page_contents(pdf_path, page_workers, mode)
+    try:
+        for content in pages:
+            if mode == 'table':
+                rows = get_template(supplier if supplier in TEMPLATES else DEFAULT_PARSER).rows(content)
+                text = page_text(rows)
+            else:
+                text = content
+
+            if None in (header['invoice_number'], header['date'], header['supplier']):
+                _parse_header(text, header)
+            if supplier is None:
+                supplier = detect_parser(text).name
+
+            if mode == 'table' and supplier in TEMPLATES:
+                template = template_for_rows(supplier, rows)
+                for row in rows:
+                    item = template.parse_row(template.split(row))
+                    if item is not None:
+                        yield item
+            else:
+                parser = parser or get_parser(supplier)
+                yield from parser.parse_lines(text.split('\n'))
+
+            grand_total = GRAND_TOTAL_RE.search(text)
+            # Any total line is kept until the grand total turns up
+            total_match = grand_total or (TOTAL_RE.search(text) if header['total'] is None else None)
+            if total_match:
+                try:
+                    header['total'] = float(total_match.group(1).replace(',', ''))
+                except Exception:
+                    header['total'] = None
+            if grand_total:
+                # Nothing after the totals block is a line item
+                break
+    finally:
+        pages.close()
+
+
+def extract_invoice_data(pdf_path, page_workers=1, supplier=None, mode='text'):
+    """Extract data from PDF invoice"""
+    data = {
+        'items': [],
+        'invoice_number': None,
+        'date': None,
+        'supplier': None,
+        'total': None
+    }
+
+    try:
+        for item in iter_invoice_items(pdf_path, data, page_workers, supplier, mode):
+            data['items'].append(item)
+    except Exception as e:
+        print(f"Error processing PDF: {e}")
+
+    return data
+
+
+def timed_extract_invoice_data(pdf_path, page_workers=1, supplier=None, mode='text'):
+    """
+    Extract an invoice and report how long it took.
+    Top-level so it can be pickled and sent to a process pool.
+
+    Args:
+        pdf_path: Path to the saved PDF
+        page_workers: Worker processes for page extraction
+        supplier: Parser/template key; detected from the first page when None
+        mode: 'text' or 'table'
+
+    Returns:
+        tuple: (invoice data dict, seconds spent extracting)
+    """
+    started = time.perf_counter()
+    data = extract_invoice_data(pdf_path, page_workers, supplier, mode)
+    return data, time.perf_counter() - started
@@ -0,0 +1,354 @@
+"""
+Background Job Queue
+Uploads processed by worker threads, with the queue and progress kept in SQLite.
+
+POST /upload saves the files, records a job and returns its id straight away.
+Worker threads take queued jobs in order and run the handler, which reports
+progress as it goes; GET /jobs/<id> reads the job row. Because the queue is a
+SQLite file, jobs submitted before a restart are still run afterwards. Jobs
+that were running in a process that has since died are marked failed rather
+than run again: an upload may already have changed the inventory before it
+was interrupted.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import logging
+from typing import Dict, Any, Callable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Made once per process start. A restarted container can get the same pid as the
+# process it replaced, so the pid alone can't tell whether a running job is ours
+_BOOT_TOKEN = uuid.uuid4().hex
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    store_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    owner TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+"""
+
+
+class Job:
+    """
+    One job as seen by the handler.
+
+    Args:
+        queue: Queue the job came from
+        row: Its database row
+    """
+
+    def __init__(self, queue: 'JobQueue', row: sqlite3.Row):
+        self._queue = queue
+        self.id = row['id']
+        self.kind = row['kind']
+        self.store_id = row['store_id']
+        self.payload = json.loads(row['payload'])
+
+    def report(self, progress: Dict[str, Any]):
+        """
+        Record the job's progress so far (replaces the previous report).
+
+        Args:
+            progress: JSON-serializable progress document
+        """
+        self._queue._execute("UPDATE jobs SET progress = ? WHERE id = ?", (json.dumps(progress), self.id))
+
+
+def _owner() -> str:
+    """Owner recorded on the jobs this process claims: '<pid>:<boot token>'."""
+    return f'{os.getpid()}:{_BOOT_TOKEN}'
+
+
+def _orphaned(owner: Optional[str]) -> bool:
+    """True if the process that claimed a job (its owner column) is gone."""
+    if owner == _owner():
+        return False
+    pid = str(owner or '').partition(':')[0]
+    if not pid.isdigit() or int(pid) == os.getpid():
+        # Our pid with another token: the process we replaced
+        return True
+    return not _process_alive(int(pid))
+
+
+def _process_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Exists but belongs to someone else
+        return True
+    return True
+
+
+class JobQueue:
+    """
+    SQLite-backed job queue with a pool of worker threads.
+
+    Workers poll every poll_interval seconds, and are woken straight away by
+    submit(), so jobs queued by another process sharing the file are picked up
+    too. Finished jobs are deleted retention seconds after they finish.
+
+    Args:
+        path: SQLite database file (its folder is created if missing)
+        handler: Runs a job; returns its JSON-serializable result or raises
+        workers: Number of worker threads
+        poll_interval: Seconds between checks for queued jobs
+        retention: Seconds finished jobs are kept for GET /jobs/<id>
+    """
+
+    def __init__(self, path: str, handler: Callable[[Job], Any], workers: int = 2,
+                 poll_interval: float = 1.0, retention: float = 7 * 24 * 3600):
+        self.path = path
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.retention = retention
+
+        self._wake = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._start_lock = threading.Lock()
+        self._stopped = False
+        self.completed = 0
+        self.failed = 0
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = self._connect()
+        try:
+            # Readers (GET /jobs/<id>) don't wait for workers writing progress
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per call: sqlite3 connections shouldn't be shared between threads
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _execute(self, sql: str, params=()):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(sql, params)
+        finally:
+            conn.close()
+
+    def submit(self, kind: str, payload: Dict[str, Any], store_id: str = '',
+               job_id: Optional[str] = None) -> str:
+        """
+        Queue a job.
+
+        Args:
+            kind: Job type, for the handler and GET /jobs/<id>
+            payload: JSON-serializable job arguments
+            store_id: Store the job works on
+            job_id: Id to use (default a new random one); must be unique
+
+        Returns:
+            str: Job id
+        """
+        job_id = job_id or uuid.uuid4().hex
+        self._execute(
+            "INSERT INTO jobs (id, kind, store_id, status, payload, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, kind, store_id, QUEUED, json.dumps(payload), time.time())
+        )
+        with self._wake:
+            self._wake.notify()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Current state of a job.
+
+        Args:
+            job_id: Id returned by submit()
+
+        Returns:
+            dict: {'id', 'kind', 'store', 'status', 'position', 'progress', 'result', 'error',
+                   'created_at', 'started_at', 'finished_at'}, or None if there is no such job
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            position = None
+            if row['status'] == QUEUED:
+                # Jobs that will run before this one
+                position = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?", (QUEUED, row['created_at'])
+                ).fetchone()[0]
+        finally:
+            conn.close()
+
+        return {
+            'id': row['id'],
+            'kind': row['kind'],
+            'store': row['store_id'],
+            'status': row['status'],
+            'position': position,
+            'progress': json.loads(row['progress']) if row['progress'] else None,
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at']
+        }
+
+    def _claim(self) -> Optional[Job]:
+        conn = self._connect()
+        try:
+            # IMMEDIATE takes the write lock up front, so two workers can't claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET status = ?, owner = ?, started_at = ? WHERE id = ?",
+                             (RUNNING, _owner(), time.time(), row['id']))
+            conn.execute("COMMIT")
+            return Job(self, row) if row is not None else None
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _finish(self, job: Job, status: str, result: Any = None, error: Optional[str] = None):
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job.id)
+        )
+
+    def recover(self) -> int:
+        """
+        Mark failed the jobs left running by processes that no longer exist.
+
+        They aren't queued again: an upload isn't idempotent, and the files it
+        had already applied would be counted twice.
+
+        Returns:
+            int: Number of jobs marked failed
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                rows = conn.execute("SELECT id, owner FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+                orphans = [row['id'] for row in rows if _orphaned(row['owner'])]
+                conn.executemany(
+                    "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ? AND status = ?",
+                    [(FAILED, 'Interrupted by a restart; check the inventory before uploading again',
+                      time.time(), job_id, RUNNING) for job_id in orphans]
+                )
+        finally:
+            conn.close()
+        if orphans:
+            logger.warning(f"Marked {len(orphans)} interrupted jobs failed")
+        return len(orphans)
+
+    def active(self, store_id: str) -> Set[str]:
+        """
+        Ids of a store's jobs that are queued or running.
+
+        Args:
+            store_id: Store to look at
+
+        Returns:
+            set: Job ids
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT id FROM jobs WHERE store_id = ? AND status IN (?, ?)",
+                                (store_id, QUEUED, RUNNING)).fetchall()
+        finally:
+            conn.close()
+        return {row['id'] for row in rows}
+
+    def prune(self):
+        """Delete jobs that finished more than retention seconds ago."""
+        self._execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                      (DONE, FAILED, time.time() - self.retention))
+
+    def start(self):
+        """Recover interrupted jobs and start the workers (no-op if they are running)."""
+        with self._start_lock:
+            if self._threads:
+                return
+            self.recover()
+            self.prune()
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'job-worker-{number}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        """Stop taking new jobs; jobs already running finish on their threads."""
+        self._stopped = True
+        with self._wake:
+            self._wake.notify_all()
+
+    def _run(self):
+        while not self._stopped:
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to read the job queue: {str(e)}")
+                job = None
+
+            if job is None:
+                with self._wake:
+                    self._wake.wait(self.poll_interval)
+                continue
+
+            try:
+                result = self.handler(job)
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {str(e)}")
+                self.failed += 1
+                self._finish(job, FAILED, error=str(e))
+            else:
+                self.completed += 1
+                self._finish(job, DONE, result=result)
+            self.prune()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue length and counters."""
+        conn = self._connect()
+        try:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        finally:
+            conn.close()
+        return {
+            'workers': len(self._threads),
+            'queued': counts.get(QUEUED, 0),
+            'running': counts.get(RUNNING, 0),
+            'completed': self.completed,
+            'failed': self.failed
+        }
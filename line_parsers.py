@@ -0,0 +1,168 @@
+"""
+Invoice Line Parsers
+Precompiled, per-supplier grammars for turning invoice text lines into items.
+
+Each supplier format is a LineParser registered under a short key. Invoices
+pick their parser from the first page's text (or an explicit key), and every
+line goes through a cheap prefix check before the full pattern is tried.
+"""
+
+import re
+from typing import Dict, Any, List, Optional, Pattern
+
+# Descriptions starting with these are column headers or charges, not stock
+NOT_AN_ITEM_PREFIXES = ('item', 'description', 'qty', 'quantity', 'price', 'total',
+                        'fuel', 'delivery', 'perishable', 'continued')
+
+
+def clean_description(description: str) -> str:
+    """Drop bare numbers among the first three words (leftover pack/item codes)."""
+    parts = description.split()
+    # isdecimal() is the same test as the old r'^\d+$'
+    clean_parts = [part for i, part in enumerate(parts) if i > 2 or not part.isdecimal()]
+    return ' '.join(clean_parts) if clean_parts else description
+
+
+def build_item(quantity: str, description: str, extension: str,
+               max_name_length: int = 60) -> Optional[Dict[str, Any]]:
+    """
+    Turn the raw fields of one invoice line into an item.
+
+    Args:
+        quantity: Cases ordered (digits)
+        description: Item description text
+        extension: Line total, may contain thousands separators
+        max_name_length: Item names are cut to this many characters
+
+    Returns:
+        dict: {'name', 'quantity', 'price'}, or None for headers, charges and bad values
+    """
+    quantity = int(quantity)
+    # Use the extension (total) price - last number on the line
+    try:
+        extension = float(extension.replace(',', ''))
+    except ValueError:
+        # skip line if price can't be parsed
+        return None
+
+    description = clean_description(description.strip())
+
+    # Filter out header rows, misc charges, and empty items
+    if (len(description) > 3 and
+            quantity > 0 and
+            extension > 0 and
+            not description.lower().startswith(NOT_AN_ITEM_PREFIXES)):
+        return {
+            'name': description[:max_name_length],
+            'quantity': quantity,
+            'price': extension  # Total price for that line item
+        }
+    return None
+
+
+class LineParser:
+    """
+    Grammar for one supplier's line items.
+
+    The pattern must define the named groups ``quantity``, ``description`` and
+    ``extension`` (the line total). Lines whose first non-blank character is
+    not a digit are rejected before the pattern runs.
+
+    Args:
+        name: Registry key, e.g. 'performance'
+        pattern: Line item regex (string or compiled)
+        supplier_pattern: Regex that recognises this supplier on the first page
+        max_name_length: Item names are cut to this many characters
+    """
+
+    def __init__(self, name: str, pattern, supplier_pattern=None, max_name_length: int = 60):
+        self.name = name
+        self.pattern: Pattern = re.compile(pattern) if isinstance(pattern, str) else pattern
+        self.supplier_pattern: Optional[Pattern] = (
+            re.compile(supplier_pattern, re.IGNORECASE) if isinstance(supplier_pattern, str)
+            else supplier_pattern
+        )
+        self.max_name_length = max_name_length
+
+    def matches_supplier(self, text: str) -> bool:
+        """True if the page text looks like this supplier's invoice."""
+        return self.supplier_pattern is not None and self.supplier_pattern.search(text) is not None
+
+    def parse(self, line: str) -> Optional[Dict[str, Any]]:
+        """
+        Parse one text line.
+
+        Args:
+            line: Line of invoice text
+
+        Returns:
+            dict: {'name', 'quantity', 'price'}, or None if the line isn't an item
+        """
+        # Prefix check: every item line starts with its quantity
+        stripped = line.lstrip()
+        if not stripped or not stripped[0].isdigit():
+            return None
+
+        match = self.pattern.match(line)
+        if match is None:
+            return None
+
+        return build_item(match.group('quantity'), match.group('description'),
+                          match.group('extension'), self.max_name_length)
+
+    def parse_lines(self, lines) -> List[Dict[str, Any]]:
+        """Parse many lines, keeping only the items."""
+        parse = self.parse
+        return [item for item in map(parse, lines) if item is not None]
+
+
+PARSERS: Dict[str, LineParser] = {}
+DEFAULT_PARSER = 'performance'
+
+
+def register_parser(parser: LineParser):
+    """
+    Add (or replace) a supplier grammar.
+
+    Args:
+        parser: LineParser to register under parser.name
+    """
+    PARSERS[parser.name] = parser
+
+
+def get_parser(name: Optional[str] = None) -> LineParser:
+    """
+    Look up a parser by key.
+
+    Args:
+        name: Registry key, or None for the default
+
+    Raises:
+        KeyError: No parser is registered under that key
+    """
+    return PARSERS[name or DEFAULT_PARSER]
+
+
+def detect_parser(text: str) -> LineParser:
+    """
+    Pick the parser whose supplier appears in the text (usually the first page).
+
+    Args:
+        text: Page text
+
+    Returns:
+        LineParser: The first matching supplier, or the default parser
+    """
+    for parser in PARSERS.values():
+        if parser.matches_supplier(text):
+            return parser
+    return get_parser()
+
+
+# Performance Foodservice: QTY UNIT SIZE [BRAND] ITEM# CODE DESCRIPTION ... PRICE EXTENSION
+register_parser(LineParser(
+    'performance',
+    r'^\s*(?P<quantity>\d+)\s+(?:CS|EA|LB|BG|GL|CT|BX)\s+[\d/\.]+\s*\w*\s+(\w+)\s+(\w+)\s+'
+    r'(?P<description>.+?)\s+(?P<price>[\d,]+\.?\d+)\s+(?P<extension>[\d,]+\.?\d+)\s*$',
+    supplier_pattern=r'performance\s+food'
+))
@@ -0,0 +1,168 @@
+"""
+Invoice Parse Cache
+Extraction results keyed by the SHA-256 of the uploaded PDF bytes.
+
+Entries are small JSON files in one directory. The directory is bounded by
+entry count and total size, and the least recently used entries are removed
+first, so it is safe to keep under /tmp on Vercel and Cloud Functions.
+"""
+
+import os
+import json
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: str) -> str:
+    """
+    SHA-256 of a file's contents.
+
+    Args:
+        path: Path to the file
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """
+    Size-bounded LRU cache of parsed invoices on disk.
+
+    Each entry records the parser version that produced it; entries from an
+    older parser are treated as misses.
+
+    Args:
+        cache_dir: Directory holding the entries (created if missing)
+        parser_version: Version of the extraction code the results come from
+        max_entries: Most entries to keep
+        max_bytes: Most bytes to keep across all entries
+    """
+
+    def __init__(self, cache_dir: str, parser_version: int, max_entries: int = 500,
+                 max_bytes: int = 16 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.parser_version = parser_version
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._sizes: 'OrderedDict[str, int]' = OrderedDict()  # content hash -> bytes, oldest first
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._scanned = False
+
+    def _path(self, content_hash: str) -> str:
+        return os.path.join(self.cache_dir, content_hash + '.json')
+
+    def _scan(self):
+        # Rebuild the LRU order from file times the first time the cache is used
+        if self._scanned:
+            return
+        self._scanned = True
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name[:-len('.json')], stat.st_size))
+        for _, content_hash, size in sorted(entries):
+            self._sizes[content_hash] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self._sizes and (len(self._sizes) > self.max_entries or self._total_bytes > self.max_bytes):
+            content_hash, size = self._sizes.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(content_hash))
+            except OSError:
+                pass
+
+    def get(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a parsed invoice.
+
+        Args:
+            content_hash: SHA-256 of the PDF
+
+        Returns:
+            dict: Invoice data, or None on a miss
+        """
+        with self._lock:
+            self._scan()
+            if content_hash not in self._sizes:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(content_hash), 'r') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                entry = None
+
+            if entry is None or entry.get('parser_version') != self.parser_version:
+                self._total_bytes -= self._sizes.pop(content_hash)
+                self.misses += 1
+                return None
+
+            self._sizes.move_to_end(content_hash)
+            try:
+                # Keeps the LRU order across restarts
+                os.utime(self._path(content_hash))
+            except OSError:
+                pass
+            self.hits += 1
+            return entry['data']
+
+    def put(self, content_hash: str, data: Dict[str, Any]):
+        """
+        Store a parsed invoice, evicting the least recently used entries if needed.
+
+        Args:
+            content_hash: SHA-256 of the PDF
+            data: Invoice data as returned by extract_invoice_data
+        """
+        payload = json.dumps({'parser_version': self.parser_version, 'data': data})
+        with self._lock:
+            self._scan()
+            path = self._path(content_hash)
+            tmp_path = path + '.tmp'
+            try:
+                with open(tmp_path, 'w') as f:
+                    f.write(payload)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.error(f"Failed to write parse cache entry: {str(e)}")
+                return
+
+            self._total_bytes -= self._sizes.pop(content_hash, 0)
+            self._sizes[content_hash] = len(payload)
+            self._total_bytes += len(payload)
+            self._evict()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for the upload response and debugging."""
+        return {
+            'entries': len(self._sizes),
+            'bytes': self._total_bytes,
+            'hits': self.hits,
+            'misses': self.misses
+        }
@@ -0,0 +1,109 @@
+"""
+Recipe Deduction Matrix
+The recipe table compiled into a sparse POS-item x inventory-item matrix.
+
+A sales file reduces to one quantity per POS item; the inventory to deduct is
+then a single sparse matrix-vector product. SciPy is used when it is installed,
+otherwise a pure-Python CSR walk gives the same result.
+"""
+
+from array import array
+from typing import Dict, Iterable, List, Tuple
+
+try:
+    import numpy as np
+    from scipy.sparse import csr_matrix
+    HAS_SCIPY = True
+except ImportError:  # optional dependency
+    np = None
+    csr_matrix = None
+    HAS_SCIPY = False
+
+
+class RecipeMatrix:
+    """
+    CSR matrix of recipe quantities.
+
+    Row r is a POS item, column c an inventory item number, and entry (r, c)
+    the quantity of c used by one r.
+
+    Args:
+        recipes: POS item name -> list of RecipeIngredient
+    """
+
+    def __init__(self, recipes: Dict[str, Iterable]):
+        self.pos_items: List[str] = []
+        self.pos_index: Dict[str, int] = {}
+        self.item_numbers: List[str] = []
+        self.item_index: Dict[str, int] = {}
+
+        self.indptr = array('l', [0])
+        self.indices = array('l')
+        self.data = array('d')
+
+        for pos_item, ingredients in recipes.items():
+            self.pos_index[pos_item] = len(self.pos_items)
+            self.pos_items.append(pos_item)
+            for ingredient in ingredients:
+                column = self.item_index.get(ingredient.item_number)
+                if column is None:
+                    column = self.item_index[ingredient.item_number] = len(self.item_numbers)
+                    self.item_numbers.append(ingredient.item_number)
+                # Duplicate rows for the same ingredient stay separate entries;
+                # both the CSR walk and SciPy sum them, like the old per-row loop
+                self.indices.append(column)
+                self.data.append(ingredient.quantity_used)
+            self.indptr.append(len(self.indices))
+
+        self._csr = None
+        if HAS_SCIPY and self.pos_items:
+            self._csr = csr_matrix(
+                (np.array(self.data, dtype=np.float64),
+                 np.array(self.indices, dtype=np.int64),
+                 np.array(self.indptr, dtype=np.int64)),
+                shape=(len(self.pos_items), len(self.item_numbers))
+            )
+
+    def __contains__(self, pos_item: str) -> bool:
+        return pos_item in self.pos_index
+
+    def __len__(self) -> int:
+        return len(self.pos_items)
+
+    def row(self, pos_item: str) -> List[Tuple[str, float]]:
+        """(item_number, quantity_used) pairs for one POS item."""
+        r = self.pos_index[pos_item]
+        return [(self.item_numbers[self.indices[k]], self.data[k])
+                for k in range(self.indptr[r], self.indptr[r + 1])]
+
+    def deductions(self, sold: Dict[str, float]) -> Dict[str, float]:
+        """
+        Total inventory used by a set of sales.
+
+        Args:
+            sold: POS item name -> quantity sold (POS items without a recipe are ignored)
+
+        Returns:
+            Inventory item number -> quantity to deduct, for every ingredient of a sold POS item
+        """
+        rows = [(self.pos_index[pos_item], quantity) for pos_item, quantity in sold.items()
+                if pos_item in self.pos_index]
+        indptr, indices, data, item_numbers = self.indptr, self.indices, self.data, self.item_numbers
+
+        if self._csr is not None:
+            if not rows:
+                return {}
+            row_ids = np.fromiter((r for r, _ in rows), dtype=np.int64, count=len(rows))
+            vector = np.zeros(len(self.pos_items))
+            vector[row_ids] = np.fromiter((quantity for _, quantity in rows), dtype=np.float64, count=len(rows))
+            totals = self._csr.T.dot(vector)
+            # Report every ingredient of a sold item, even when the product is zero
+            columns = np.unique(self._csr[row_ids].indices)
+            return dict(zip([item_numbers[c] for c in columns.tolist()], totals[columns].tolist()))
+
+        totals: Dict[str, float] = {}
+        for r, quantity in rows:
+            for k in range(indptr[r], indptr[r + 1]):
+                item_number = item_numbers[indices[k]]
+                totals[item_number] = totals.get(item_number, 0) + quantity * data[k]
+        return totals
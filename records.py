@@ -0,0 +1,98 @@
+"""
+Compact Record Types
+Slotted records for the conversion table, recipes and inventory items.
+
+The CSVs repeat the same units and descriptions across hundreds of rows, so all
+text fields are interned and every record uses __slots__ instead of a dict.
+"""
+
+import sys
+from typing import Dict, Any, Optional
+
+# Values of items_per_case that mean "unknown, treat one case as one unit"
+UNKNOWN_CASE_SIZES = ('?', '', 'diffreent depending on size')
+
+
+def intern_text(value: Optional[str]) -> str:
+    """Strip and intern a CSV text field."""
+    return sys.intern((value or '').strip())
+
+
+class Conversion:
+    """One row of the conversion table."""
+
+    __slots__ = ('description', 'order_unit', 'items_per_case', 'usable_unit', 'notes')
+
+    def __init__(self, description: str, order_unit: str, items_per_case: str, usable_unit: str, notes: str = ''):
+        self.description = intern_text(description)
+        self.order_unit = intern_text(order_unit)
+        self.items_per_case = intern_text(items_per_case)
+        self.usable_unit = intern_text(usable_unit)
+        self.notes = intern_text(notes)
+
+    def case_multiplier(self) -> float:
+        """
+        Usable units per case.
+
+        Raises:
+            ValueError: items_per_case is free text that can't be converted
+        """
+        if self.items_per_case in UNKNOWN_CASE_SIZES:
+            return 1
+        return float(self.items_per_case)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Same shape as the original conversion dict (and the Firebase table)."""
+        return {
+            'description': self.description,
+            'order_unit': self.order_unit,
+            'items_per_case': self.items_per_case,
+            'usable_unit': self.usable_unit,
+            'notes': self.notes
+        }
+
+
+class RecipeIngredient:
+    """One inventory item used by a POS item."""
+
+    __slots__ = ('item_number', 'description', 'quantity_used', 'unit')
+
+    def __init__(self, item_number: str, description: str, quantity_used: float, unit: str):
+        self.item_number = intern_text(item_number)
+        self.description = intern_text(description)
+        self.quantity_used = quantity_used
+        self.unit = intern_text(unit)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Same shape as the original recipe ingredient dict."""
+        return {
+            'item_number': self.item_number,
+            'description': self.description,
+            'quantity_used': self.quantity_used,
+            'unit': self.unit
+        }
+
+
+class ItemInfo:
+    """Unit and description of an inventory item (quantities live in an array)."""
+
+    __slots__ = ('unit', 'description')
+
+    def __init__(self, unit: str, description: str):
+        self.unit = unit
+        self.description = description
+
+
+_item_infos: Dict[tuple, ItemInfo] = {}
+
+
+def item_info(unit: Optional[str], description: Optional[str]) -> ItemInfo:
+    """Shared ItemInfo for a unit/description pair."""
+    key = (unit, description)
+    info = _item_infos.get(key)
+    if info is None:
+        info = _item_infos.setdefault(key, ItemInfo(
+            sys.intern(unit) if isinstance(unit, str) else unit,
+            sys.intern(description) if isinstance(description, str) else description
+        ))
+    return info
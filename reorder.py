@@ -0,0 +1,314 @@
+"""
+Reorder Engine
+Per-item usage rates from sales deductions, days of cover and reorder alerts.
+
+Every sales batch adds what it deducted to a per-item, per-day usage total.
+Each item keeps only the days inside the rolling window and the running sum of
+them, so its daily usage rate is one division, however long the sales history
+gets. After each change only the items the batch touched are checked against
+their reorder point (usage over the delivery lead time); items that cross it,
+run out or recover are recorded as alert changes that clients can poll for.
+
+The usage totals are kept in a small JSON file next to the store's other
+local state, together with the sequence number of the last alert change, so
+the numbers clients poll with keep growing across restarts.
+"""
+
+import os
+import json
+import math
+import threading
+import logging
+from collections import deque
+from datetime import date
+from typing import Dict, Any, Iterable, List, Mapping, Optional
+
+from inventory_store import OpResult
+from records import Conversion
+
+logger = logging.getLogger(__name__)
+
+OK = 'ok'
+REORDER = 'reorder'
+OUT = 'out'
+
+
+def today() -> int:
+    """Day number used for usage buckets (proleptic Gregorian ordinal)."""
+    return date.today().toordinal()
+
+
+class _Usage:
+    """Rolling usage of one item: deducted quantity per day plus the running sum."""
+
+    __slots__ = ('first_day', 'total', 'days')
+
+    def __init__(self, first_day: int):
+        self.first_day = first_day  # first day usage was seen
+        self.total = 0.0  # sum of the quantities in days
+        self.days = deque()  # [day, quantity], oldest first
+
+    def add(self, day: int, quantity: float):
+        if self.days and self.days[-1][0] == day:
+            self.days[-1][1] += quantity
+        else:
+            self.days.append([day, quantity])
+        self.total += quantity
+
+    def expire(self, before: int):
+        while self.days and self.days[0][0] < before:
+            self.total -= self.days.popleft()[1]
+        if not self.days:
+            # Don't let float error leave a tiny rate behind
+            self.total = 0.0
+
+
+class ReorderEngine:
+    """
+    Usage rates and reorder alerts of one store.
+
+    Args:
+        path: JSON file the usage totals are kept in (its folder must exist)
+        window_days: Days of usage the rate is averaged over
+        lead_days: Days from ordering to delivery; an item needs ordering when it
+                   covers fewer days than this
+        target_days: Days of cover an order should last after it is delivered
+        max_changes: Alert changes kept for polling clients
+    """
+
+    def __init__(self, path: str, window_days: int = 28, lead_days: float = 3,
+                 target_days: float = 7, max_changes: int = 1000):
+        self.path = path
+        self.window_days = max(1, window_days)
+        self.lead_days = lead_days
+        self.target_days = target_days
+
+        self._lock = threading.Lock()
+        self._usage: Dict[str, _Usage] = {}
+        self._alerts: Dict[str, Dict[str, Any]] = {}  # item_number -> row of items not OK
+        self._changes = deque(maxlen=max_changes)
+        self._seq = 0  # sequence number of the last alert change (saved with the usage)
+        self._dirty = False
+
+    def load(self):
+        """Read the usage totals saved by save() (a missing or unreadable file starts empty)."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable usage file {self.path}: {str(e)}")
+            return
+
+        with self._lock:
+            self._seq = max(self._seq, saved.get('seq') or 0)
+            self._usage = {}
+            for item_number, entry in (saved.get('items') or {}).items():
+                usage = _Usage(entry['first_day'])
+                for day, quantity in entry['days']:
+                    usage.add(day, quantity)
+                self._usage[item_number] = usage
+
+    def save(self):
+        """Write the usage totals and alert seq if they changed since the last save."""
+        with self._lock:
+            if not self._dirty:
+                return
+            saved = {
+                'window_days': self.window_days,
+                'seq': self._seq,
+                'items': {item_number: {'first_day': usage.first_day, 'days': list(usage.days)}
+                          for item_number, usage in self._usage.items() if usage.days}
+            }
+            self._dirty = False
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(saved, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            self._dirty = True
+            logger.error(f"Failed to write usage file {self.path}: {str(e)}")
+
+    def _rate(self, item_number: str, day: int) -> float:
+        usage = self._usage.get(item_number)
+        if usage is None:
+            return 0.0
+        usage.expire(day - self.window_days + 1)
+        if not usage.days:
+            return 0.0
+        # Items first used less than a window ago are averaged over the days since then
+        observed = min(self.window_days, day - usage.first_day + 1)
+        return usage.total / max(observed, 1)
+
+    def _row(self, item_number: str, item: Dict[str, Any], conversion: Optional[Conversion],
+             day: int) -> Dict[str, Any]:
+        quantity = item['quantity']
+        rate = self._rate(item_number, day)
+        reorder_point = rate * self.lead_days
+        if quantity <= 0:
+            status = OUT
+        elif rate > 0 and quantity <= reorder_point:
+            status = REORDER
+        else:
+            status = OK
+
+        try:
+            items_per_case = conversion.case_multiplier() if conversion is not None else None
+        except ValueError:
+            items_per_case = None
+        # Enough for the lead time plus target_days once the order arrives
+        needed = max(0.0, rate * (self.lead_days + self.target_days) - quantity) if status != OK else 0.0
+        suggested_cases = math.ceil(needed / items_per_case - 1e-9) if items_per_case else None
+        if quantity <= 0:
+            days_of_cover = 0
+        else:
+            days_of_cover = round(quantity / rate, 1) if rate > 0 else None
+
+        return {
+            'item_number': item_number,
+            'description': item['description'],
+            'unit': item['unit'],
+            'quantity': round(quantity, 2),
+            'daily_usage': round(rate, 3),
+            'days_of_cover': days_of_cover,
+            'reorder_point': round(reorder_point, 2),
+            'items_per_case': items_per_case,
+            'suggested_units': round(needed, 2),
+            'suggested_cases': suggested_cases,
+            'status': status
+        }
+
+    def _update_alert(self, item_number: str, row: Optional[Dict[str, Any]]):
+        previous = self._alerts.get(item_number)
+        status = row['status'] if row is not None else OK
+        if status == OK:
+            if previous is None:
+                return
+            del self._alerts[item_number]
+        else:
+            self._alerts[item_number] = row
+            if previous is not None and previous['status'] == status:
+                return
+        self._seq += 1
+        self._dirty = True
+        self._changes.append({
+            'seq': self._seq,
+            'item_number': item_number,
+            'status': status,
+            'previous': previous['status'] if previous is not None else OK,
+            'row': row
+        })
+
+    def apply(self, results: List[OpResult], conversions: Mapping[str, Conversion], day: Optional[int] = None):
+        """
+        Record the usage in one batch and re-check the items it touched.
+
+        Args:
+            results: OpResults from InventoryStore.apply_batch
+            conversions: item_number -> Conversion, for the case sizes
+            day: Day the usage belongs to (default today)
+        """
+        day = today() if day is None else day
+        with self._lock:
+            for result in results:
+                if not result.applied:
+                    continue
+                item_number = result.op.item_number
+                if result.op.kind == 'deduct' and result.op.quantity > 0:
+                    usage = self._usage.get(item_number)
+                    if usage is None:
+                        usage = self._usage[item_number] = _Usage(day)
+                    usage.add(day, result.op.quantity)
+                    self._dirty = True
+                row = (self._row(item_number, result.new, conversions.get(item_number), day)
+                       if result.new is not None else None)
+                self._update_alert(item_number, row)
+
+    def reset(self, inventory: Mapping[str, Dict[str, Any]], conversions: Mapping[str, Conversion],
+              day: Optional[int] = None):
+        """
+        Re-check every item after the whole inventory was replaced (load, clear).
+
+        Args:
+            inventory: Item number -> item dict
+            conversions: item_number -> Conversion
+            day: Day to evaluate the rates at (default today)
+        """
+        day = today() if day is None else day
+        with self._lock:
+            for item_number in [item_number for item_number in self._alerts if item_number not in inventory]:
+                self._update_alert(item_number, None)
+            for item_number, item in inventory.items():
+                self._update_alert(item_number, self._row(item_number, item, conversions.get(item_number), day))
+
+    def clear(self):
+        """Forget all usage (the store was cleared)."""
+        with self._lock:
+            self._usage = {}
+            self._dirty = True
+
+    def report(self, inventory: Iterable, conversions: Mapping[str, Conversion], include_ok: bool = False,
+               day: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Rows for items that need ordering, fewest days of cover first.
+
+        Args:
+            inventory: (item_number, item dict) pairs of the items to report on
+            conversions: item_number -> Conversion
+            include_ok: Also list items that have usage but don't need ordering yet
+            day: Day to evaluate the rates at (default today)
+
+        Returns:
+            list: One row per item (see _row)
+        """
+        day = today() if day is None else day
+        with self._lock:
+            if include_ok:
+                candidates = [(item_number, item) for item_number, item in inventory
+                              if item_number in self._usage or item_number in self._alerts]
+            else:
+                # Only items already alerted can need ordering; rates only fall as days pass
+                candidates = [(item_number, item) for item_number, item in inventory
+                              if item_number in self._alerts]
+            rows = [self._row(item_number, item, conversions.get(item_number), day)
+                    for item_number, item in candidates]
+        if not include_ok:
+            rows = [row for row in rows if row['status'] != OK]
+        return sorted(rows, key=lambda row: (row['days_of_cover'] is None,
+                                             row['days_of_cover'] or 0, row['item_number']))
+
+    def changes(self, since: int = 0) -> Dict[str, Any]:
+        """
+        Alert changes after a sequence number, for clients that poll.
+
+        Args:
+            since: seq of the last change already seen (0 = everything kept)
+
+        Returns:
+            dict: {'seq' (latest), 'changes' (oldest first), 'complete' (False if
+                  changes after since were already dropped, or since is ahead of
+                  seq because the saved seq was lost; re-read the full list)}
+        """
+        with self._lock:
+            changes = [change for change in self._changes if change['seq'] > since]
+            oldest = self._changes[0]['seq'] if self._changes else self._seq + 1
+            return {
+                'seq': self._seq,
+                'changes': changes,
+                'complete': oldest - 1 <= since <= self._seq
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for GET /reorder."""
+        with self._lock:
+            return {
+                'items_with_usage': sum(1 for usage in self._usage.values() if usage.days),
+                'alerts': len(self._alerts),
+                'seq': self._seq,
+                'window_days': self.window_days,
+                'lead_days': self.lead_days,
+                'target_days': self.target_days
+            }
@@ -0,0 +1,241 @@
+"""
+Store Registry
+Per-store inventory state, kept in memory only for the stores that are in use.
+
+Every DQ location is a store with its own inventory, history, event log and
+save scheduler, persisted under stores/<store_id>/ in Firebase and on disk.
+StoreRegistry loads a store the first time a request names it and keeps the
+most recently used ones in memory, up to max_stores. When a newly loaded store
+needs room, the least recently used store that no request is using is closed
+(its unsaved changes are written first) and dropped; it is loaded again from
+storage the next time it is asked for.
+"""
+
+import re
+import threading
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, List, Optional
+
+from event_log import EventLog
+from history import PagedHistory
+from inventory_store import InventoryStore
+from inventory_view import InventoryView
+from reorder import ReorderEngine
+from timeseries import TimeSeriesStore
+from write_behind import WriteBehindScheduler
+
+logger = logging.getLogger(__name__)
+
+# Store ids become Firebase keys and folder names
+STORE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def valid_store_id(store_id: Optional[str]) -> bool:
+    """True if store_id can be used as a Firebase key and a folder name."""
+    return bool(store_id) and STORE_ID_PATTERN.match(store_id) is not None
+
+
+class Store:
+    """
+    Everything one store keeps in memory.
+
+    Args:
+        store_id: Store identifier (see valid_store_id)
+        event_log: Local event log and snapshot of this store
+        state_file: Local JSON state file written by PERSISTENCE_MODE=full
+        upload_folder: Where this store's uploaded files are saved
+    """
+
+    def __init__(self, store_id: str, event_log: EventLog, state_file: str, upload_folder: str):
+        self.store_id = store_id
+        self.event_log = event_log
+        self.state_file = state_file
+        self.upload_folder = upload_folder
+
+        self.inventory = InventoryStore()  # item_number -> {quantity, unit, description}, safe across threads
+        self.inventory_view = InventoryView()  # the same items sorted for GET /inventory
+        self.invoice_history = PagedHistory([])  # processed invoices; older pages may still be in Firebase
+        self.sales_history = PagedHistory([])  # processed sales files
+
+        # Event sourcing: every mutation is recorded as an event; saves write them out
+        self.pending_events: List[Dict[str, Any]] = []  # events recorded since the last save
+        self.event_lock = threading.Lock()  # guards pending_events, the history lists and the event sequence
+        self.persisted = {
+            'seq': 0,  # sequence number of the last recorded event
+            'firebase_synced': False  # Firebase holds the full state, so deltas can be applied on top
+        }
+
+        self.invoice_hashes = set()  # content hashes of the PDFs in invoice_history
+        self.invoice_hash_lock = threading.Lock()
+
+        self.uploads_in_use = set()  # upload folders a request is still saving or processing
+        self.uploads_lock = threading.Lock()
+
+        self.reorder: Optional[ReorderEngine] = None  # usage rates and alerts; set by whoever opens the store
+        self.timeseries: Optional[TimeSeriesStore] = None  # quantity history; set by whoever opens the store
+        self.save_scheduler: Optional[WriteBehindScheduler] = None  # set by whoever opens the store
+
+
+class _Slot:
+    """Registry entry: a store that is loaded, being loaded, or failed to load."""
+
+    __slots__ = ('store', 'users', 'ready', 'error')
+
+    def __init__(self):
+        self.store: Optional[Store] = None
+        self.users = 0  # requests currently holding the store
+        self.ready = threading.Event()
+        self.error: Optional[BaseException] = None
+
+
+class StoreRegistry:
+    """
+    Loaded stores in least-recently-used order.
+
+    acquire() pins a store until the matching release(), so a store is never
+    evicted while a request is using it. If every loaded store is pinned the
+    registry goes over max_stores until some are released.
+
+    Args:
+        open_store: Loads a store from storage (may be slow; runs outside the registry lock)
+        close_store: Writes out a store's unsaved changes before it is dropped
+        max_stores: Number of stores to keep in memory
+    """
+
+    def __init__(self, open_store: Callable[[str], Store], close_store: Callable[[Store], None],
+                 max_stores: int = 16):
+        self._open_store = open_store
+        self._close_store = close_store
+        self.max_stores = max(1, max_stores)
+
+        self._slots: 'OrderedDict[str, _Slot]' = OrderedDict()  # least recently used first
+        self._closing: Dict[str, threading.Event] = {}  # stores being written out after eviction
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def acquire(self, store_id: str) -> Store:
+        """
+        Get a store, loading it if it isn't in memory, and pin it.
+
+        Args:
+            store_id: Store to get
+
+        Returns:
+            Store: Pinned until release(store_id)
+
+        Raises:
+            Whatever open_store raised if the store couldn't be loaded
+        """
+        while True:
+            with self._lock:
+                closing = self._closing.get(store_id)
+                if closing is None:
+                    slot = self._slots.get(store_id)
+                    load = slot is None
+                    if load:
+                        slot = self._slots[store_id] = _Slot()
+                    slot.users += 1
+                    self._slots.move_to_end(store_id)
+                    break
+            # Don't read the store back before its last changes are written
+            closing.wait()
+
+        if load:
+            try:
+                slot.store = self._open_store(store_id)
+            except BaseException as e:
+                slot.error = e
+                with self._lock:
+                    if self._slots.get(store_id) is slot:
+                        del self._slots[store_id]
+                raise
+            finally:
+                slot.ready.set()
+            self.loads += 1
+            self._evict()
+        else:
+            slot.ready.wait()
+
+        if slot.error is not None:
+            with self._lock:
+                slot.users -= 1
+            raise slot.error
+        return slot.store
+
+    def release(self, store_id: str):
+        """
+        Unpin a store obtained from acquire().
+
+        Args:
+            store_id: Store to release
+        """
+        with self._lock:
+            slot = self._slots.get(store_id)
+            if slot is not None and slot.users > 0:
+                slot.users -= 1
+        self._evict()
+
+    @contextmanager
+    def checkout(self, store_id: str):
+        """acquire() and release() around a block."""
+        store = self.acquire(store_id)
+        try:
+            yield store
+        finally:
+            self.release(store_id)
+
+    def _evict(self):
+        # Pick the victims under the lock, write them out without it
+        victims = []
+        with self._lock:
+            excess = len(self._slots) - self.max_stores
+            for store_id, slot in list(self._slots.items()):
+                if excess <= 0:
+                    break
+                if slot.users == 0 and slot.ready.is_set() and slot.store is not None:
+                    del self._slots[store_id]
+                    self._closing[store_id] = threading.Event()
+                    victims.append((store_id, slot.store))
+                    excess -= 1
+
+        for store_id, store in victims:
+            try:
+                self._close_store(store)
+                logger.info(f"Evicted store {store_id}")
+            except Exception as e:
+                logger.error(f"Failed to close store {store_id}: {str(e)}")
+            finally:
+                self.evictions += 1
+                with self._lock:
+                    self._closing.pop(store_id).set()
+
+    def loaded(self) -> List[str]:
+        """Ids of the stores in memory, least recently used first."""
+        with self._lock:
+            return [store_id for store_id, slot in self._slots.items() if slot.store is not None]
+
+    def close_all(self):
+        """Write out and drop every loaded store (process shutdown)."""
+        with self._lock:
+            stores = [slot.store for slot in self._slots.values() if slot.store is not None]
+            self._slots.clear()
+        for store in stores:
+            try:
+                self._close_store(store)
+            except Exception as e:
+                logger.error(f"Failed to close store {store.store_id}: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for GET /stores."""
+        with self._lock:
+            in_use = sum(1 for slot in self._slots.values() if slot.users > 0)
+        return {
+            'loaded': self.loaded(),
+            'in_use': in_use,
+            'max_stores': self.max_stores,
+            'loads': self.loads,
+            'evictions': self.evictions
+        }
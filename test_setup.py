@@ -82,8 +82,9 @@ try:
     import app as inventory_app
 
     print(f"  ✓ app.py loads successfully")
-    print(f"  ✓ Conversions loaded: {len(inventory_app.conversions)} items")
-    print(f"  ✓ Recipes loaded: {len(inventory_app.recipes)} POS items")
+    catalog = inventory_app.catalog_manager.current
+    print(f"  ✓ Conversions loaded: {len(catalog.conversions)} items")
+    print(f"  ✓ Recipes loaded: {len(catalog.recipes)} POS items")
 
 except Exception as e:
     print(f"  ✗ Error loading app.py: {e}")
@@ -0,0 +1,234 @@
+import io
+import json
+import os
+import shutil
+import sys
+import time
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def app_module(tmp_path_factory):
+    """app.py imported with all of its files under a temporary folder."""
+    folder = tmp_path_factory.mktemp('app')
+    shutil.copytree(os.path.join(REPO, 'inventory'), folder / 'inventory')
+    environment = {
+        'DURABILITY_MODE': 'sync',
+        'UPLOAD_MODE': 'sync',
+        'UPLOAD_WORKERS': '1',
+        'CATALOG_RELOAD_INTERVAL': '0',
+    }
+    saved = {name: os.environ.get(name) for name in environment}
+    os.environ.update(environment)
+    cwd = os.getcwd()
+    os.chdir(folder)
+    try:
+        sys.modules.pop('app', None)
+        import app
+        yield app
+    finally:
+        app.stores.close_all()
+        os.chdir(cwd)
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+def set_inventory(client, store, csv_text):
+    response = client.post(f'/stores/{store}/upload_starting_inventory', data=csv_text.encode('utf-8'),
+                           content_type='text/csv')
+    assert response.status_code == 200, response.get_json()
+
+
+def quantities(client, store):
+    return {row['item_number']: row['quantity'] for row in client.get(f'/stores/{store}/inventory').get_json()['inventory']}
+
+
+def test_sales_csv_that_is_not_utf8_is_a_400(client):
+    response = client.post('/stores/csv_bytes/upload_sales', data=b'item_name,quantity_sold\n\xff\xfe,1\n',
+                           content_type='text/csv')
+    assert response.status_code == 400
+    assert 'Could not read the CSV file' in response.get_json()['error']
+
+
+def test_sales_csv_that_is_not_utf8_ends_the_ndjson_stream_with_an_error(client):
+    response = client.post('/stores/csv_bytes_ndjson/upload_sales?detail=ndjson',
+                           data=b'item_name,quantity_sold\n\xff\xfe,1\n', content_type='text/csv')
+    assert response.status_code == 200
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert records[-1]['type'] == 'error'
+
+
+def test_multipart_csv_that_is_not_utf8_is_a_400(client):
+    data = 'Product Number,Current Inventory\nAJW24,2\n'.encode('utf-16')
+    response = client.post('/stores/csv_utf16/upload_starting_inventory',
+                           data={'file': (io.BytesIO(data), 'start.csv')}, content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert quantities(client, 'csv_utf16') == {}
+
+
+def test_valid_sales_csv_still_deducts(client):
+    set_inventory(client, 'csv_ok', 'Product Number,Current Inventory\nAJW24,1000\n')
+    response = client.post('/stores/csv_ok/upload_sales', data=b'item_name,quantity_sold\nSM BLIZZARD,3\n',
+                           content_type='text/csv')
+    assert response.status_code == 200 and response.get_json()['success']
+    assert quantities(client, 'csv_ok')['AJW24'] == 997
+
+
+def upload_invoice(client, store):
+    with open(os.path.join(REPO, 'samples', 'invoice_2026_001.pdf'), 'rb') as f:
+        return client.post(f'/stores/{store}/upload', data={'file_type': 'invoice',
+                                                             'files[]': (io.BytesIO(f.read()), 'invoice.pdf')},
+                           content_type='multipart/form-data')
+
+
+def test_failed_invoice_is_not_a_duplicate_next_time(client, app_module, monkeypatch):
+    def broken_store(*args, **kwargs):
+        raise RuntimeError('store unavailable')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(app_module, 'apply_inventory_batch', broken_store)
+        assert upload_invoice(client, 'invoice_retry').status_code == 500
+
+    response = upload_invoice(client, 'invoice_retry').get_json()
+    assert response['processed'] == 1 and response['duplicates'] == []
+    again = upload_invoice(client, 'invoice_retry').get_json()
+    assert again['processed'] == 0 and again['duplicates'] == ['invoice.pdf']
+
+
+def test_invoice_hashes_survive_a_reload(client, app_module):
+    assert upload_invoice(client, 'invoice_reload').get_json()['processed'] == 1
+    # Write the store out and drop it, so the next request loads it from disk
+    app_module.stores.close_all()
+    assert 'invoice_reload' not in app_module.stores.loaded()
+
+    response = upload_invoice(client, 'invoice_reload').get_json()
+    assert response['processed'] == 0 and response['duplicates'] == ['invoice.pdf']
+
+
+def test_legacy_list_history(app_module):
+    # Older states stored each history as a list; Firebase hands back a dict
+    # instead when some indexes are missing
+    assert app_module.history_entries(['a', 'b']) == ['a', 'b']
+    assert app_module.history_entries({'10': 'k', '2': 'c', '0': 'a'}) == ['a', 'c', 'k']
+    assert app_module.history_entries(None) == []
+
+    history = app_module.PagedHistory(app_module.history_entries(['a', 'b', 'c']))
+    assert history.complete
+    assert history.page(before=2, limit=5) == [(1, 'b'), (0, 'a')]
+
+
+def wait_for_catalog_version(client, version, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if client.get('/catalog').get_json()['version'] >= version:
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_swapped_csvs_are_used_after_a_reload(client, app_module):
+    recipe_csv = os.path.join(app_module.app.config['INVENTORY_FOLDER'], 'DQ inventory - Recipe.csv')
+    with open(recipe_csv, 'rb') as f:
+        original = f.read()
+    version = client.get('/catalog').get_json()['version']
+    try:
+        with open(recipe_csv, 'ab') as f:
+            f.write(b'\r\nTEST SUNDAE,AJW24,CUP PAPER 32OZ 600,2,cup\r\n')
+        assert client.post('/catalog/reload').status_code == 202
+        assert wait_for_catalog_version(client, version + 1)
+
+        set_inventory(client, 'catalog_swap', 'Product Number,Current Inventory\nAJW24,1000\n')
+        response = client.post('/stores/catalog_swap/upload_sales', data=b'item_name,quantity_sold\nTEST SUNDAE,3\n',
+                               content_type='text/csv')
+        assert response.get_json()['success']
+        assert quantities(client, 'catalog_swap')['AJW24'] == 994
+    finally:
+        with open(recipe_csv, 'wb') as f:
+            f.write(original)
+        app_module.catalog_manager.reload()
+    assert 'TEST SUNDAE' not in app_module.catalog_manager.current.recipes
+
+
+def test_published_catalog_version_is_loaded_once(client, app_module, monkeypatch):
+    conversion_table, recipe_table = app_module.catalog_publish_tables()
+    recipe_table['TEST SHAKE'] = [{'item_number': 'AJW24', 'description': 'CUP PAPER 32OZ 600',
+                                   'quantity_used': 4, 'unit': 'cup'}]
+    firebase = {'version': 'v1', 'downloads': 0}
+
+    def download():
+        firebase['downloads'] += 1
+        return conversion_table, recipe_table
+
+    monkeypatch.setitem(app_module.app.config, 'CATALOG_SOURCE', 'firebase')
+    monkeypatch.setattr(app_module.firebase_db, 'is_firebase_configured', lambda: True)
+    monkeypatch.setattr(app_module.firebase_db, 'get_catalog_version', lambda: firebase['version'])
+    monkeypatch.setattr(app_module, 'download_catalog_tables', download)
+    try:
+        assert app_module.catalog_manager.reload()
+        catalog = app_module.catalog_manager.current
+        assert catalog.source == 'firebase (downloaded)'
+        # Conversions keep the CSV order they were published in
+        assert list(catalog.conversions) == list(conversion_table)
+        assert catalog.recipe_matrix.deductions({'TEST SHAKE': 1}) == {'AJW24': 4.0}
+
+        # Same version: nothing downloaded and the snapshot in use is kept
+        assert not app_module.catalog_manager.reload()
+        assert app_module.catalog_manager.current is catalog and firebase['downloads'] == 1
+
+        recipe_table['TEST SHAKE'][0]['quantity_used'] = 5
+        firebase['version'] = 'v2'
+        assert app_module.catalog_manager.reload()
+        assert firebase['downloads'] == 2
+        assert app_module.catalog_manager.current.recipe_matrix.deductions({'TEST SHAKE': 1}) == {'AJW24': 5.0}
+        # The snapshot an earlier request took still has its own tables
+        assert catalog.recipe_matrix.deductions({'TEST SHAKE': 1}) == {'AJW24': 4.0}
+    finally:
+        monkeypatch.undo()
+        app_module.catalog_manager.reload()
+    assert 'TEST SHAKE' not in app_module.catalog_manager.current.recipes
+
+
+def test_batch_update_is_all_or_nothing(client, app_module, monkeypatch):
+    store = 'batch_count'
+    set_inventory(client, store, 'Product Number,Current Inventory\nAJW24,1000\nP8440,2000\n')
+    before = quantities(client, store)
+
+    for bad in ({'item_number': 'P8440', 'quantity': 'lots'}, {'item_number': 'P8440'}, 'P8440'):
+        response = client.post(f'/stores/{store}/update_inventory/batch',
+                                json={'updates': [{'item_number': 'AJW24', 'quantity': 5}, bad]})
+        assert response.status_code == 400
+        assert '(update 1)' in response.get_json()['error']
+        assert quantities(client, store) == before
+    assert client.post(f'/stores/{store}/update_inventory/batch', json={'updates': []}).status_code == 400
+
+    saves = []
+    monkeypatch.setattr(app_module, 'request_save', saves.append)
+    response = client.post(f'/stores/{store}/update_inventory/batch', json={'updates': [
+        {'item_number': 'AJW24', 'quantity': 5},
+        {'item_number': 'NOPE1', 'quantity': 3},
+        {'item_number': 'P8440', 'quantity': '7.5'},
+    ]})
+    body = response.get_json()
+    assert response.status_code == 200 and body['success']
+    assert body['updated'] == 2 and body['not_found'] == ['NOPE1']
+    assert [(item['item_number'], item['old_quantity'], item['new_quantity']) for item in body['items']] == \
+        [('AJW24', before['AJW24'], 5), ('P8440', before['P8440'], 7.5)]
+    assert quantities(client, store) == {'AJW24': 5, 'P8440': 7.5}
+    # Applied together and saved with one write
+    assert len(saves) == 1
+
+    response = client.post(f'/stores/{store}/update_inventory/batch',
+                           json={'updates': [{'item_number': 'NOPE1', 'quantity': 3}]})
+    assert response.get_json()['updated'] == 0 and response.get_json()['not_found'] == ['NOPE1']
+    assert len(saves) == 1
@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+
+from catalog import CatalogManager
+from records import Conversion, RecipeIngredient
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.005)
+    return False
+
+
+def tables(tag):
+    """Tables where every field says which version they belong to."""
+    conversions = {'X': Conversion(f'ITEM {tag}', 'case', str(tag), 'each')}
+    recipes = {'SUNDAE': [RecipeIngredient('X', f'ITEM {tag}', float(tag), 'each')]}
+    return conversions, recipes, str(tag), f'test {tag}'
+
+
+class Loader:
+    """Catalog loader returning whatever tag it is set to."""
+
+    def __init__(self, tag=1):
+        self.tag = tag
+        self.calls = 0
+        self.error = None
+
+    def __call__(self):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return tables(self.tag)
+
+
+def test_reload_installs_a_new_version():
+    loader = Loader()
+    manager = CatalogManager(loader, interval=0)
+    assert manager.current.version == 0 and manager.current.conversions == {}
+
+    assert manager.reload() is True
+    first = manager.current
+    assert first.version == 1 and first.source == 'test 1'
+    assert first.recipe_matrix.deductions({'SUNDAE': 2}) == {'X': 2.0}
+    assert first.conversion_index.candidates('ITEM 1') == ['X']
+
+    # Same checksum: the snapshot in use is kept
+    assert manager.reload() is False
+    assert manager.current is first
+
+    loader.tag = 2
+    assert manager.reload() is True
+    assert manager.current.version == 2
+    # A request still holding the old snapshot keeps seeing the old tables
+    assert first.conversions['X'].description == 'ITEM 1'
+    assert manager.stats()['reloads'] == 2
+
+
+def test_failed_reload_keeps_the_current_catalog():
+    loader = Loader()
+    manager = CatalogManager(loader, interval=0)
+    manager.reload()
+    loader.error = ValueError('quantity_used is not a number')
+    assert manager.reload() is False
+    assert manager.current.version == 1
+    assert manager.stats()['last_error'] == 'quantity_used is not a number'
+
+    loader.error = None
+    loader.tag = 2
+    assert manager.reload() is True
+    assert manager.stats()['last_error'] is None
+
+
+def test_request_reload_runs_in_the_background():
+    loader = Loader()
+    manager = CatalogManager(loader, interval=0)
+    manager.start()
+    manager.request_reload()
+    assert wait_until(lambda: manager.current.version == 1)
+    loader.tag = 2
+    manager.request_reload()
+    assert wait_until(lambda: manager.current.version == 2)
+
+
+def test_changed_file_is_reloaded_once_it_stops_changing(tmp_path):
+    watched = tmp_path / 'conversion.csv'
+    watched.write_text('a')
+    loader = Loader()
+    manager = CatalogManager(loader, [str(watched)], interval=0.02)
+    manager.reload()
+    manager.start()
+    time.sleep(0.1)
+    assert loader.calls == 1
+
+    loader.tag = 2
+    watched.write_text('ab')
+    os.utime(watched, ns=(1, 1))
+    assert wait_until(lambda: manager.current.version == 2)
+    time.sleep(0.1)
+    assert loader.calls == 2
+
+
+def test_readers_see_one_consistent_catalog():
+    loader = Loader()
+    manager = CatalogManager(loader, interval=0)
+    manager.reload()
+    done = threading.Event()
+    mismatches = []
+
+    def read():
+        while not done.is_set():
+            catalog = manager.current
+            tag = int(catalog.checksum)
+            # The tables and the structures built from them all come from the same version
+            if (catalog.conversions['X'].description != f'ITEM {tag}' or
+                    catalog.recipes['SUNDAE'][0].quantity_used != tag or
+                    catalog.recipe_matrix.deductions({'SUNDAE': 1}) != {'X': float(tag)} or
+                    catalog.conversion_index.candidates(f'ITEM {tag}') != ['X']):
+                mismatches.append(tag)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for tag in range(2, 60):
+        loader.tag = tag
+        manager.reload()
+    done.set()
+    for reader in readers:
+        reader.join()
+    assert mismatches == []
+    assert manager.current.version == 59
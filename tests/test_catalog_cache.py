@@ -0,0 +1,101 @@
+import json
+
+from catalog_cache import CatalogCache
+
+CONVERSIONS = {'X': {'description': 'ITEM', 'position': 0}}
+RECIPES = {'SUNDAE': [{'item_number': 'X', 'quantity_used': 1}]}
+
+
+class Firebase:
+    """Version node and tables of a stubbed Firebase catalog."""
+
+    def __init__(self, version='v1'):
+        self.version = version
+        self.tables = (CONVERSIONS, RECIPES)
+        self.online = True
+        self.downloads = 0
+
+    def get_version(self):
+        return self.version if self.online else None
+
+    def download(self):
+        self.downloads += 1
+        return self.tables if self.online else None
+
+    def publish(self, version, conversions):
+        self.version = version
+        self.tables = (conversions, RECIPES)
+
+
+def get(cache, firebase):
+    return cache.get_tables(firebase.get_version, firebase.download)
+
+
+def test_downloads_only_new_versions(tmp_path):
+    firebase = Firebase()
+    cache = CatalogCache(str(tmp_path / 'cache' / 'catalog.json'))
+    first = get(cache, firebase)
+    assert first['status'] == 'downloaded' and first['version'] == 'v1'
+    assert first['conversion_table'] == CONVERSIONS
+
+    assert get(cache, firebase)['status'] == 'cached'
+    assert firebase.downloads == 1
+
+    firebase.publish('v2', {'Y': {'description': 'NEW'}})
+    second = get(cache, firebase)
+    assert second['status'] == 'downloaded' and second['conversion_table'] == {'Y': {'description': 'NEW'}}
+    # Version and tables are written together, never one without the other
+    on_disk = json.loads((tmp_path / 'cache' / 'catalog.json').read_text())
+    assert on_disk['version'] == 'v2' and on_disk['conversion_table'] == {'Y': {'description': 'NEW'}}
+    assert cache.stats()['downloads'] == 2 and cache.stats()['revalidations'] == 1
+
+
+def test_restarted_worker_revalidates_from_disk(tmp_path):
+    firebase = Firebase()
+    get(CatalogCache(str(tmp_path / 'catalog.json')), firebase)
+    restarted = CatalogCache(str(tmp_path / 'catalog.json'))
+    assert get(restarted, firebase)['status'] == 'cached'
+    assert firebase.downloads == 1
+
+
+def test_offline_uses_the_cached_tables(tmp_path):
+    firebase = Firebase()
+    get(CatalogCache(str(tmp_path / 'catalog.json')), firebase)
+    firebase.online = False
+    cache = CatalogCache(str(tmp_path / 'catalog.json'))
+    offline = get(cache, firebase)
+    assert offline['status'] == 'offline' and offline['conversion_table'] == CONVERSIONS
+    assert cache.stats()['offline_loads'] == 1
+
+    assert get(CatalogCache(str(tmp_path / 'empty.json')), firebase) is None
+
+
+def test_failed_download_keeps_the_cached_version(tmp_path):
+    firebase = Firebase()
+    cache = CatalogCache(str(tmp_path / 'catalog.json'))
+    get(cache, firebase)
+    firebase.version = 'v2'
+    firebase.tables = None
+    firebase.download = lambda: None
+    result = get(cache, firebase)
+    assert result['status'] == 'offline' and result['version'] == 'v1'
+    # Still v1 on disk, so the next check downloads v2 again
+    assert json.loads((tmp_path / 'catalog.json').read_text())['version'] == 'v1'
+
+
+def test_unversioned_tables_are_always_downloaded(tmp_path):
+    firebase = Firebase(version='')
+    cache = CatalogCache(str(tmp_path / 'catalog.json'))
+    get(cache, firebase)
+    assert get(cache, firebase)['status'] == 'downloaded'
+    assert firebase.downloads == 2
+
+
+def test_unreadable_cache_file_is_ignored(tmp_path):
+    path = tmp_path / 'catalog.json'
+    path.write_text('{torn')
+    firebase = Firebase()
+    assert get(CatalogCache(str(path)), firebase)['status'] == 'downloaded'
+    path.write_text(json.dumps({'version': 'v1', 'conversion_table': {}, 'recipe_table': RECIPES}))
+    # An entry without both tables doesn't count as cached
+    assert get(CatalogCache(str(path)), firebase)['status'] == 'downloaded'
@@ -0,0 +1,102 @@
+import pytest
+
+import column_templates
+from column_templates import ColumnTemplate, TEMPLATES, get_template, page_text, register_template, template_for_rows
+
+HEADER = ['QTY', 'UNIT', 'PACK', 'ITEM', 'CODE', 'DESCRIPTION', 'PRICE', 'EXT']
+ROW = ['2', 'CS', '1/5GAL', 'GF662', 'SOFT', 'ICE CREAM MIX', '42.50', '85.00']
+ITEM = {'name': 'ICE CREAM MIX', 'quantity': 2, 'price': 85.0}
+# Left edges of the performance columns
+EDGES = [50, 100, 150, 220, 280, 340, 480, 540]
+
+
+def words(top, texts, edges, shift=0):
+    """Words of one row, each cell's words starting at its column edge."""
+    row = []
+    for text, x in zip(texts, edges):
+        for i, word in enumerate(text.split()):
+            row.append((x + shift + i * 30, top, word))
+    return row
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """TEMPLATES and the anchor cache restored after the test."""
+    monkeypatch.setattr(column_templates, 'TEMPLATES', dict(TEMPLATES))
+    monkeypatch.setattr(column_templates, '_anchored', {})
+    return column_templates.TEMPLATES
+
+
+def test_rows_and_split():
+    template = get_template('performance')
+    page = words(112.4, ROW, EDGES) + words(99, HEADER, EDGES) + [(50, 130, 'TOTAL:'), (100, 131.5, '$85.00')]
+    rows = template.rows(page)
+    assert [[text for _, _, text in row] for row in rows] == [HEADER, ROW[:5] + ['ICE', 'CREAM', 'MIX'] + ROW[6:],
+                                                              ['TOTAL:', '$85.00']]
+    assert template.split(rows[1])['description'] == 'ICE CREAM MIX'
+    assert page_text(rows).splitlines()[2] == 'TOTAL: $85.00'
+
+
+def test_parse_row():
+    template = get_template('performance')
+    assert template.parse_row(template.split(words(0, ROW, EDGES))) == ITEM
+    assert template.parse_row(template.split(words(0, HEADER, EDGES))) is None
+    # Unit codes outside the template's list mean the row isn't a line item
+    assert template.parse_row(template.split(words(0, ['2', 'PK'] + ROW[2:], EDGES))) is None
+    # No extension column
+    assert template.parse_row(template.split(words(0, ROW[:-1], EDGES))) is None
+
+
+def test_words_left_of_the_first_column_are_ignored():
+    template = get_template('performance')
+    assert template.split([(10, 0, 'PAGE'), (50, 0, '2')]) == {'quantity': '2'}
+
+
+def test_anchored_follows_the_header():
+    template = get_template('performance')
+    assert template.anchored(template.rows(words(0, HEADER, EDGES))) is template
+    shifted = template.anchored(template.rows(words(0, HEADER, EDGES, shift=25)))
+    assert shifted is not template and shifted.name == 'performance'
+    assert [x for _, _, x in shifted.columns] == [x + 25 for x in EDGES]
+    assert shifted.parse_row(shifted.split(words(0, ROW, EDGES, shift=25))) == ITEM
+    # The registered template keeps its own positions
+    assert [x for _, _, x in template.columns] == EDGES
+    # A row missing one of the labels isn't the header
+    assert template.anchored(template.rows(words(0, HEADER[:-1], EDGES))) is None
+
+
+def test_continuation_pages_use_the_anchored_positions(registry):
+    template = get_template('performance')
+    first = template.rows(words(0, HEADER, EDGES, shift=25) + words(20, ROW, EDGES, shift=25))
+    assert template_for_rows('performance', first).edges[0] == 73
+    # No header on the next page: the first page's positions still apply
+    second = template.rows(words(0, ROW, EDGES, shift=25))
+    continued = template_for_rows('performance', second)
+    assert continued.parse_row(continued.split(second[0])) == ITEM
+
+    register_template(ColumnTemplate('performance', template.columns, template.units))
+    assert template_for_rows('performance', second).edges[0] == 48
+
+
+def test_anchors_do_not_leak_between_suppliers(registry):
+    other_edges = [30, 200, 400]
+    register_template(ColumnTemplate('other', [('quantity', 'QTY', 30), ('description', 'DESCRIPTION', 200),
+                                               ('extension', 'EXT', 400)]))
+    performance = get_template('performance')
+    template_for_rows('performance', performance.rows(words(0, HEADER, EDGES, shift=25)))
+
+    # A headerless page of the other supplier's invoice keeps its own columns
+    other_page = performance.rows(words(0, ['2', 'ICE CREAM MIX', '85.00'], other_edges))
+    other = template_for_rows('other', other_page)
+    assert other is get_template('other')
+    assert other.parse_row(other.split(other_page[0])) == ITEM
+
+    # and anchoring the other supplier leaves the performance positions alone
+    template_for_rows('other', performance.rows(words(0, ['QTY', 'DESCRIPTION', 'EXT'], other_edges, shift=-10)))
+    assert template_for_rows('performance', []).edges[0] == 73
+    assert template_for_rows('other', []).edges[0] == 18
+
+
+def test_get_template_unknown():
+    with pytest.raises(KeyError):
+        get_template('nobody')
@@ -0,0 +1,53 @@
+from conversion_index import ConversionIndex, PatternAutomaton
+from records import Conversion
+
+
+def linear_candidates(conversions, item_name):
+    """The scan ConversionIndex replaces."""
+    return [item_number for item_number, conv in conversions.items()
+            if item_number in item_name or conv.description.upper() in item_name.upper()]
+
+
+def make_conversions(rows):
+    return {item_number: Conversion(description, 'CS', '1', 'each') for item_number, description in rows}
+
+
+def test_automaton_finds_overlapping_patterns():
+    automaton = PatternAutomaton([('he', 1), ('she', 2), ('his', 3), ('hers', 4)])
+    assert automaton.search('ushers') == {1, 2, 4}
+    assert automaton.search('xyz') == set()
+
+
+def test_automaton_ignores_empty_patterns():
+    assert PatternAutomaton([('', 1), ('a', 2)]).search('bab') == {2}
+
+
+def test_candidates_in_table_order():
+    conversions = make_conversions([
+        ('GF662', 'ICE CREAM MIX SFTSRV VAN'),
+        ('AJW24', 'CUP PAPER 32OZ 600'),
+        ('GF66', 'MIX'),
+    ])
+    index = ConversionIndex(conversions)
+    assert index.candidates('GF662 ice cream mix sftsrv van') == ['GF662', 'GF66']
+    assert index.candidates('cup paper 32oz 600 case') == ['AJW24']
+    assert index.candidates('nothing here') == []
+
+
+def test_empty_description_matches_everything():
+    conversions = make_conversions([('A1', 'SPOON'), ('B2', '')])
+    assert ConversionIndex(conversions).candidates('anything') == ['B2']
+
+
+def test_matches_linear_scan():
+    conversions = make_conversions([
+        ('GF662', 'ICE CREAM MIX SFTSRV VAN'),
+        ('AJW24', 'CUP PAPER 32OZ 600'),
+        ('AJW2', 'CUP PAPER'),
+        ('ZZ1', 'LID DOME'),
+        ('Q', 'CREAM'),
+    ])
+    index = ConversionIndex(conversions)
+    for name in ('GF662 ICE CREAM MIX SFTSRV VAN 6/0.5GAL', 'lid dome cup paper 32oz 600',
+                 'AJW24', 'Q-tip', 'whipped cream', ''):
+        assert index.candidates(name) == linear_candidates(conversions, name)
@@ -0,0 +1,68 @@
+from event_log import EventLog, apply_event
+
+
+def make_log(tmp_path):
+    return EventLog(str(tmp_path / 'events.log'), str(tmp_path / 'state.snapshot'))
+
+
+def event(seq, item_number, quantity, **history):
+    return dict({'seq': seq, 'type': 'manual_update',
+                 'inventory': {item_number: {'quantity': quantity, 'unit': 'each', 'description': item_number}}},
+                **history)
+
+
+def replay(log):
+    state, seq = log.load_snapshot() or ({'inventory': {}, 'invoice_history': [], 'sales_history': []}, 0)
+    for logged in log.read_events(after_seq=seq):
+        apply_event(state, logged)
+    return state
+
+
+def test_snapshot_plus_replay(tmp_path):
+    log = make_log(tmp_path)
+    log.append([event(1, 'A', 1), event(2, 'B', 2, invoice_history={'0': {'filename': 'a.pdf'}})])
+    log.write_snapshot(replay(log), 2)
+    log.append([event(3, 'A', 5), event(4, 'C', 7, invoice_history={'1': {'filename': 'b.pdf'}})])
+
+    state = replay(make_log(tmp_path))
+    assert {k: v['quantity'] for k, v in state['inventory'].items()} == {'A': 5, 'B': 2, 'C': 7}
+    assert [entry['filename'] for entry in state['invoice_history']] == ['a.pdf', 'b.pdf']
+
+
+def test_replay_skips_events_already_in_snapshot(tmp_path):
+    log = make_log(tmp_path)
+    log.append([event(1, 'A', 1), event(2, 'A', 2)])
+    log.write_snapshot(replay(log), 2)
+    # A crash between the snapshot and removing the log leaves old events behind
+    log.append([event(1, 'A', 1), event(2, 'A', 2), event(3, 'A', 3)])
+    assert [logged['seq'] for logged in log.read_events(after_seq=2)] == [3]
+
+
+def test_torn_tail_is_cut_before_next_append(tmp_path):
+    log = make_log(tmp_path)
+    log.append([event(1, 'AJW24', 3446)])
+    with open(log.log_path, 'a') as f:
+        f.write('{"seq": 2, "type": "manual_upd')
+
+    assert [logged['seq'] for logged in log.read_events()] == [1]
+    log.append([event(3, 'AJW24', 777)])
+
+    state = replay(make_log(tmp_path))
+    assert state['inventory']['AJW24']['quantity'] == 777
+
+
+def test_complete_record_without_newline_is_torn(tmp_path):
+    log = make_log(tmp_path)
+    log.append([event(1, 'A', 1)])
+    with open(log.log_path, 'a') as f:
+        f.write('{"seq": 2}')
+    assert [logged['seq'] for logged in log.read_events()] == [1]
+    log.append([event(3, 'A', 3)])
+    assert [logged['seq'] for logged in log.read_events()] == [1, 3]
+
+
+def test_unreadable_snapshot_is_ignored(tmp_path):
+    log = make_log(tmp_path)
+    with open(log.snapshot_path, 'wb') as f:
+        f.write(b'not a pickle')
+    assert log.load_snapshot() is None
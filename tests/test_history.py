@@ -0,0 +1,105 @@
+from history import PagedHistory
+
+
+class Storage:
+    """fetch_page over a stored list that records what was asked for."""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.calls = []
+        self.fail = False
+
+    def __call__(self, before, limit):
+        self.calls.append((before, limit))
+        if self.fail:
+            return None
+        before = len(self.entries) if before is None else before
+        return {index: self.entries[index] for index in range(max(0, before - limit), before)
+                if index < len(self.entries)}
+
+
+def stored(count):
+    storage = Storage([f'entry {i}' for i in range(count)])
+    return storage, PagedHistory(count=count, fetch_page=storage)
+
+
+def indexes(page):
+    return [index for index, _ in page]
+
+
+def test_in_memory_history():
+    history = PagedHistory(['a', 'b', 'c'])
+    assert history.complete and len(history) == 3
+    assert history.page() == [(2, 'c'), (1, 'b'), (0, 'a')]
+    assert history.append('d') == 3
+    assert history.to_list() == ['a', 'b', 'c', 'd']
+
+
+def test_empty_history_is_complete():
+    history = PagedHistory(count=0)
+    assert history.complete and history.page() == [] and history.to_list() == []
+
+
+def test_page_boundaries():
+    storage, history = stored(10)
+    # before past the end is the same as from the newest entry
+    assert indexes(history.page(before=25, limit=3)) == [9, 8, 7]
+    # limit larger than what is left before the cursor
+    assert indexes(history.page(before=2, limit=50)) == [1, 0]
+    assert history.page(before=0, limit=5) == []
+    assert history.page(before=-3, limit=5) == []
+    assert history.page(limit=0) == []
+    assert indexes(history.page(before=10, limit=10)) == list(range(9, -1, -1))
+
+
+def test_pages_are_fetched_once():
+    storage, history = stored(10)
+    assert history.page(limit=4) == [(9, 'entry 9'), (8, 'entry 8'), (7, 'entry 7'), (6, 'entry 6')]
+    assert storage.calls == [(10, 4)]
+    assert not history.complete
+
+    history.page(limit=4)
+    history.page(before=8, limit=2)
+    assert storage.calls == [(10, 4)]
+
+    assert indexes(history.page(before=6, limit=10)) == [5, 4, 3, 2, 1, 0]
+    assert storage.calls == [(10, 4), (6, 10)]
+    assert history.complete
+    history.to_list()
+    assert len(storage.calls) == 2
+
+
+def test_appends_are_kept_alongside_stored_pages():
+    storage, history = stored(3)
+    assert history.append('new') == 3
+    assert history.page(limit=2) == [(3, 'new'), (2, 'entry 2')]
+    assert history.known() == {2: 'entry 2', 3: 'new'}
+    assert history.to_list() == ['entry 0', 'entry 1', 'entry 2', 'new']
+    assert history.complete
+
+
+def test_fetched_entries_do_not_replace_newer_ones():
+    storage, history = stored(3)
+    history.set(1, 'replayed')
+    assert history.to_list() == ['entry 0', 'replayed', 'entry 2']
+
+
+def test_failed_fetch_returns_what_is_known_and_retries():
+    storage, history = stored(5)
+    history.append('new')
+    storage.fail = True
+    assert history.page(limit=3) == [(5, 'new')]
+    assert history.to_list() == [None] * 5 + ['new']
+    assert not history.complete
+
+    storage.fail = False
+    assert indexes(history.page(limit=3)) == [5, 4, 3]
+    assert history.to_list()[0] == 'entry 0'
+
+
+def test_set_beyond_the_count_grows_it():
+    history = PagedHistory([])
+    history.set(2, 'c')
+    assert len(history) == 3
+    assert history.to_list() == [None, None, 'c']
+
@@ -0,0 +1,68 @@
+import threading
+
+from inventory_store import InventoryStore, add_op, deduct_op, set_op, set_quantity_op
+
+
+def test_op_kinds():
+    store = InventoryStore({'A': {'quantity': 10, 'unit': 'each', 'description': 'Apple'}})
+    results = store.apply_batch([
+        add_op('A', 5, 'each', 'Apple'),
+        add_op('B', 2, 'cup', 'Banana'),
+        deduct_op('A', 3),
+        deduct_op('MISSING', 1),
+        set_quantity_op('MISSING', 1),
+        set_op('C', 4, 'oz', 'Cherry'),
+    ])
+    assert [result.applied for result in results] == [True, True, True, False, False, True]
+    assert results[0].old['quantity'] == 10 and results[0].new['quantity'] == 15
+    assert results[1].old is None
+    assert store.get('A')['quantity'] == 12
+    assert store.get('B') == {'quantity': 2, 'unit': 'cup', 'description': 'Banana'}
+    assert 'MISSING' not in store
+    assert len(store) == 3
+
+
+def test_set_replaces_unit_and_description():
+    store = InventoryStore({'A': {'quantity': 1, 'unit': 'each', 'description': 'Apple'}})
+    store.apply_batch([set_op('A', 9, 'case', 'Apples')])
+    assert store.get('A') == {'quantity': 9, 'unit': 'case', 'description': 'Apples'}
+
+
+def test_unknown_op_raises():
+    store = InventoryStore({'A': {'quantity': 1, 'unit': 'each', 'description': 'Apple'}})
+    try:
+        store.apply_batch([deduct_op('A', 1)._replace(kind='bogus')])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('expected ValueError')
+
+
+def test_concurrent_batches_lose_no_updates():
+    store = InventoryStore()
+    item_numbers = [f'I{n}' for n in range(20)]
+
+    def worker():
+        for _ in range(200):
+            store.apply_batch([add_op(item_number, 1, 'each', item_number) for item_number in item_numbers])
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(store.get(item_number)['quantity'] == 1600 for item_number in item_numbers)
+
+
+def test_on_applied_sees_whole_batch_in_order():
+    store = InventoryStore()
+    seen = []
+    store.apply_batch([add_op('A', 1, 'each', 'A'), add_op('A', 2, 'each', 'A')],
+                      on_applied=lambda results: seen.extend(result.new['quantity'] for result in results))
+    assert seen == [1, 3]
+
+
+def test_replace_all_and_to_dict():
+    store = InventoryStore({'A': {'quantity': 1, 'unit': 'each', 'description': 'Apple'}})
+    store.replace_all({'B': {'quantity': 2, 'unit': 'cup', 'description': 'Banana'}})
+    assert store.to_dict() == {'B': {'quantity': 2, 'unit': 'cup', 'description': 'Banana'}}
@@ -0,0 +1,121 @@
+from inventory_store import InventoryStore, add_op, set_op, set_quantity_op
+from inventory_view import InventoryView, decode_cursor, encode_cursor
+
+
+def item(quantity, description, unit='each'):
+    return {'quantity': quantity, 'unit': unit, 'description': description}
+
+
+def make_view():
+    inventory = {
+        'C': item(3, 'Cherry'),
+        'A': item(1.005, 'Apple'),
+        'B': item(2, 'Banana'),
+        'A2': item(4, 'Apple'),
+    }
+    store = InventoryStore(dict(inventory))
+    view = InventoryView()
+    view.reset(inventory)
+    return store, view
+
+
+def apply(store, view, ops):
+    results = store.apply_batch(ops)
+    view.apply(results)
+    return results
+
+
+def item_numbers(rows):
+    return [row['item_number'] for row in rows]
+
+
+def test_rows_sorted_like_a_stable_sort():
+    store, view = make_view()
+    expected = sorted(store.items(), key=lambda entry: entry[1]['description'])
+    assert item_numbers(view.rows()) == [item_number for item_number, _ in expected]
+    assert view.rows()[0] == {'item_number': 'A', 'description': 'Apple', 'quantity': 1.0, 'unit': 'each'}
+    assert len(view) == 4
+
+
+def test_changes_move_only_touched_items():
+    store, view = make_view()
+    apply(store, view, [set_op('B', 2, 'each', 'Avocado'), add_op('D', 1, 'each', 'Date'),
+                        set_quantity_op('C', 9)])
+    assert item_numbers(view.rows()) == ['A', 'A2', 'B', 'C', 'D']
+    assert view.rows()[3]['quantity'] == 9
+
+
+def test_version_and_etag_change_with_every_batch():
+    store, view = make_view()
+    etag = view.etag
+    version = view.version
+    apply(store, view, [set_quantity_op('MISSING', 1)])
+    # Nothing applied, but the batch may still have added history
+    assert view.version == version + 1
+    assert view.etag != etag
+    assert view.etag.endswith(f'-{view.version}')
+    # Another view (e.g. after a restart) never repeats an etag
+    assert InventoryView().etag.split('-')[0] != view.etag.split('-')[0]
+
+
+def test_cached_builds_once_per_version():
+    store, view = make_view()
+    builds = []
+
+    def build(rows):
+        builds.append(len(rows))
+        return item_numbers(rows)
+
+    first, etag = view.cached(build)
+    again, same_etag = view.cached(build)
+    assert again is first and same_etag == etag
+    assert builds == [4]
+
+    apply(store, view, [add_op('E', 1, 'each', 'Elderberry')])
+    value, new_etag = view.cached(build)
+    assert new_etag != etag
+    assert value[-1] == 'E'
+    assert builds == [4, 5]
+
+
+def test_cursor_round_trip():
+    for key in [('Apple', 0), ('', 12), ('Crème brûlée', 3), ('a/b+c', 99)]:
+        cursor = encode_cursor(key)
+        assert '=' not in cursor and '/' not in cursor and '+' not in cursor
+        assert decode_cursor(cursor) == key
+
+
+def test_invalid_cursors():
+    for cursor in ['', '!!!', encode_cursor(('a', 1))[:-2], 'WzEsMl0', 'eyJhIjoxfQ', 'WyJhIiwiYiJd']:
+        try:
+            decode_cursor(cursor)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f'expected ValueError for {cursor!r}')
+
+
+def test_paging_with_a_filter():
+    store, view = make_view()
+    rows, after = view.page(limit=2)
+    assert item_numbers(rows) == ['A', 'A2']
+    rows, after = view.page(after, limit=2)
+    assert item_numbers(rows) == ['B', 'C'] and after is None
+
+    apples, after = view.page(limit=5, match=lambda row: row['description'] == 'Apple')
+    assert item_numbers(apples) == ['A', 'A2'] and after is None
+
+
+def test_pages_stay_consistent_while_inventory_changes():
+    store, view = make_view()
+    rows, after = view.page(limit=2)
+    seen = item_numbers(rows)
+
+    # Items before the cursor change and new items arrive on both sides of it
+    apply(store, view, [set_quantity_op('A', 0), add_op('AA', 1, 'each', 'Aardvark'),
+                        add_op('Z', 1, 'each', 'Zucchini')])
+    while after is not None:
+        rows, after = view.page(after, limit=2)
+        seen += item_numbers(rows)
+    assert seen == ['A', 'A2', 'B', 'C', 'Z']
+    assert len(seen) == len(set(seen))
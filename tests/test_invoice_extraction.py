@@ -0,0 +1,119 @@
+import invoice_extraction
+import line_parsers
+from invoice_extraction import GRAND_TOTAL_RE, iter_invoice_items, iter_page_contents
+
+HEADER = """PERFORMANCE FOODSERVICE
+Invoice #: INV-2026-009
+Date: 01/06/2026
+Vendor: Performance Food Group
+QTY UNIT PACK ITEM CODE DESCRIPTION PRICE EXT
+"""
+
+
+def read_pages(monkeypatch, pages):
+    monkeypatch.setattr(invoice_extraction, 'iter_page_contents', lambda *args, **kwargs: (page for page in pages))
+    header = {'invoice_number': None, 'date': None, 'supplier': None, 'total': None}
+    items = list(iter_invoice_items('invoice.pdf', header))
+    return items, header
+
+
+def test_grand_total_pattern():
+    assert GRAND_TOTAL_RE.search('TOTAL: $405.95').group(1) == '405.95'
+    assert GRAND_TOTAL_RE.search('  Invoice Total 1,200.00').group(1) == '1,200.00'
+    assert GRAND_TOTAL_RE.search('SUBTOTAL: $100.00') is None
+    assert GRAND_TOTAL_RE.search('PAGE TOTAL: $100.00') is None
+
+
+def test_subtotal_does_not_stop_reading(monkeypatch):
+    pages = [
+        HEADER + '2 CS 1/5GAL GF662 SOFT ICE CREAM MIX SFTSRV VAN 42.50 85.00\nSUBTOTAL: $85.00\n',
+        '3 CS 15/40CNT AJW24 DQ CUP PAPER 32OZ 600 38.25 114.75\nPAGE TOTAL: $114.75\n',
+        '1 CS 1/25LB RR730 GENERIC SUGAR GRANULATED FINE 45.80 45.80\nTOTAL: $245.55\n',
+        '9 CS 1/1 ZZ999 NOT A LINE ITEM AFTER THE TOTAL 1.00 9.00\n',
+    ]
+    items, header = read_pages(monkeypatch, pages)
+    assert len(items) == 3
+    assert header['total'] == 245.55
+    assert [item['price'] for item in items] == [85.0, 114.75, 45.8]
+
+
+def test_subtotal_is_kept_without_grand_total(monkeypatch):
+    items, header = read_pages(monkeypatch, [
+        HEADER + '2 CS 1/5GAL GF662 SOFT ICE CREAM MIX SFTSRV VAN 42.50 85.00\nSUBTOTAL: $85.00\n'])
+    assert len(items) == 1
+    assert header['total'] == 85.0
+
+
+def test_table_mode_without_a_template_uses_the_line_parser(monkeypatch):
+    monkeypatch.setattr(line_parsers, 'PARSERS', dict(line_parsers.PARSERS))
+    line_parsers.register_parser(line_parsers.LineParser(
+        'sysco', r'^\s*(?P<quantity>\d+)\s+(?P<description>.+?)\s+(?P<extension>[\d.]+)$', supplier_pattern='sysco'))
+    page = [(50, 0, 'SYSCO'), (50, 20, '4'), (80, 20, 'PAPER'), (120, 20, 'TOWELS'), (200, 20, '20.00'),
+            (50, 40, 'TOTAL:'), (100, 40, '$20.00')]
+    monkeypatch.setattr(invoice_extraction, 'iter_page_contents', lambda *args, **kwargs: (p for p in [page]))
+    header = {'invoice_number': None, 'date': None, 'supplier': None, 'total': None}
+    items = list(iter_invoice_items('invoice.pdf', header, mode='table'))
+    assert items == [{'name': 'PAPER TOWELS', 'quantity': 4, 'price': 20.0}]
+    assert header['total'] == 20.0
+    items = list(iter_invoice_items('invoice.pdf', dict(header), supplier='sysco', mode='table'))
+    assert len(items) == 1
+
+
+def write_pdf(path, page_count):
+    """A PDF whose page n says 'Page n'."""
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>',
+               '<< /Type /Pages /Kids [%s] /Count %d >>' % (
+                   ' '.join(f'{4 + 2 * n} 0 R' for n in range(page_count)), page_count),
+               '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    for n in range(page_count):
+        stream = f'BT /F1 12 Tf 72 720 Td (Page {n + 1}) Tj ET'
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                       f'/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * n} 0 R >>')
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+    data = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += f'{number} 0 obj\n{body}\nendobj\n'.encode('latin-1')
+    xref = len(data)
+    data += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('latin-1')
+    data += ''.join(f'{offset:010d} 00000 n \n' for offset in offsets).encode('latin-1')
+    data += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('latin-1')
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_pages_from_the_pool_come_in_order(tmp_path):
+    pdf_path = write_pdf(tmp_path / 'long.pdf', 20)
+    serial = list(iter_page_contents(pdf_path))
+    assert [page.strip() for page in serial] == [f'Page {n}' for n in range(1, 21)]
+    assert list(iter_page_contents(pdf_path, page_workers=2)) == serial
+    # The pool is kept for the next PDF instead of being shut down
+    pool = invoice_extraction.process_pool(2)
+    assert list(iter_page_contents(pdf_path, page_workers=2)) == serial
+    assert invoice_extraction.process_pool(2) is pool
+
+    pages = iter_page_contents(pdf_path, page_workers=2)
+    assert next(pages).strip() == 'Page 1'
+    pages.close()
+
+
+def test_no_page_pool_inside_a_worker(tmp_path, monkeypatch):
+    pdf_path = write_pdf(tmp_path / 'long.pdf', 20)
+
+    def no_pool(workers):
+        raise AssertionError('opened a pool inside a worker')
+
+    monkeypatch.setattr(invoice_extraction.multiprocessing, 'parent_process', lambda: object())
+    monkeypatch.setattr(invoice_extraction, 'process_pool', no_pool)
+    assert len(list(iter_page_contents(pdf_path, page_workers=4))) == 20
+
+
+def test_pool_that_cannot_start_falls_back_to_serial(tmp_path, monkeypatch):
+    pdf_path = write_pdf(tmp_path / 'long.pdf', 20)
+
+    def unavailable(workers):
+        raise OSError('no processes here')
+
+    monkeypatch.setattr(invoice_extraction, 'process_pool', unavailable)
+    assert [page.strip() for page in iter_page_contents(pdf_path, page_workers=4)][-1] == 'Page 20'
@@ -0,0 +1,126 @@
+import os
+import time
+import subprocess
+import sys
+
+import jobs
+from jobs import DONE, FAILED, QUEUED, RUNNING, JobQueue
+
+
+def wait_for(queue, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in (DONE, FAILED):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f'job {job_id} did not finish')
+
+
+def set_running(queue, job_id, owner):
+    queue._execute("UPDATE jobs SET status = ?, owner = ?, started_at = ? WHERE id = ?",
+                   (RUNNING, owner, time.time(), job_id))
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_submit_get_and_position(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), lambda job: None)
+    first = queue.submit('upload', {'files': []}, 'store1')
+    second = queue.submit('upload', {'files': []}, 'store1', job_id='chosen')
+    assert second == 'chosen'
+
+    job = queue.get(second)
+    assert job['status'] == QUEUED
+    assert job['store'] == 'store1'
+    assert job['position'] == 1
+    assert queue.get(first)['position'] == 0
+    assert queue.get('missing') is None
+    assert queue.active('store1') == {first, second}
+    assert queue.active('other') == set()
+
+
+def test_claim_in_order(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), lambda job: None)
+    first = queue.submit('upload', {'n': 1})
+    queue.submit('upload', {'n': 2})
+    job = queue._claim()
+    assert job.id == first and job.payload == {'n': 1}
+    assert queue.get(first)['status'] == RUNNING
+    assert queue._claim().payload == {'n': 2}
+    assert queue._claim() is None
+
+
+def test_workers_run_jobs(tmp_path):
+    def handler(job):
+        job.report({'seen': job.payload['n']})
+        if job.payload['n'] < 0:
+            raise ValueError('negative')
+        return {'double': job.payload['n'] * 2}
+
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), handler, poll_interval=0.05)
+    queue.start()
+    try:
+        ok = wait_for(queue, queue.submit('upload', {'n': 21}))
+        failed = wait_for(queue, queue.submit('upload', {'n': -1}))
+    finally:
+        queue.stop()
+
+    assert ok['status'] == DONE
+    assert ok['result'] == {'double': 42}
+    assert ok['progress'] == {'seen': 21}
+    assert failed['status'] == FAILED
+    assert failed['error'] == 'negative'
+    assert failed['result'] is None
+    assert queue.stats()['completed'] == 1 and queue.stats()['failed'] == 1
+
+
+def test_recover_fails_interrupted_jobs(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), lambda job: None)
+    ours = queue.submit('upload', {})
+    replaced = queue.submit('upload', {})
+    dead = queue.submit('upload', {})
+    alive = queue.submit('upload', {})
+    legacy = queue.submit('upload', {})
+    waiting = queue.submit('upload', {})
+    set_running(queue, ours, jobs._owner())
+    # Same pid as this process, but from before a restart
+    set_running(queue, replaced, f'{os.getpid()}:{"0" * 32}')
+    set_running(queue, dead, f'{dead_pid()}:{"1" * 32}')
+    set_running(queue, alive, f'{os.getppid()}:{"2" * 32}')
+    # Owner written as a bare pid
+    set_running(queue, legacy, os.getpid())
+
+    assert queue.recover() == 3
+    assert queue.get(ours)['status'] == RUNNING
+    assert queue.get(alive)['status'] == RUNNING
+    assert queue.get(waiting)['status'] == QUEUED
+    for job_id in (replaced, dead, legacy):
+        job = queue.get(job_id)
+        assert job['status'] == FAILED
+        assert job['error'].startswith('Interrupted')
+        assert job['finished_at'] is not None
+    assert queue.active('') == {ours, alive, waiting}
+
+
+def test_prune(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), lambda job: None, retention=0)
+    finished = queue.submit('upload', {})
+    waiting = queue.submit('upload', {})
+    queue._finish(queue._claim(), DONE, result={})
+    time.sleep(0.01)
+    queue.prune()
+    assert queue.get(finished) is None
+    assert queue.get(waiting)['status'] == QUEUED
+
+
+def test_queue_survives_reopen(tmp_path):
+    path = str(tmp_path / 'jobs.sqlite3')
+    job_id = JobQueue(path, lambda job: None).submit('upload', {'n': 1})
+    reopened = JobQueue(path, lambda job: None)
+    assert reopened.get(job_id)['status'] == QUEUED
+    assert reopened._claim().id == job_id
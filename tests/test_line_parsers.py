@@ -0,0 +1,85 @@
+import pytest
+
+import line_parsers
+from line_parsers import (DEFAULT_PARSER, LineParser, PARSERS, build_item, clean_description, detect_parser,
+                          get_parser, register_parser)
+
+PERFORMANCE_LINES = [
+    ('2 CS 1/5GAL GF662 SOFT ICE CREAM MIX SFTSRV VAN 42.50 85.00',
+     {'name': 'ICE CREAM MIX SFTSRV VAN', 'quantity': 2, 'price': 85.0}),
+    ('  12 EA 1 99887 XY 100 200 NAPKINS 1,234.50 14,814.00',
+     {'name': 'NAPKINS', 'quantity': 12, 'price': 14814.0}),
+    ('3 CS 15/40CNT AJW24 DQ CUP PAPER 32OZ 600 38.25 114.75',
+     {'name': 'CUP PAPER 32OZ 600', 'quantity': 3, 'price': 114.75}),
+]
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """PARSERS restored after the test, so registering one doesn't leak."""
+    monkeypatch.setattr(line_parsers, 'PARSERS', dict(PARSERS))
+    return line_parsers.PARSERS
+
+
+def test_clean_description():
+    assert clean_description('100 200 NAPKINS') == 'NAPKINS'
+    # Only the first three words lose their numbers
+    assert clean_description('CUP 1 2 3 4') == 'CUP 3 4'
+    assert clean_description('12 24') == '12 24'
+
+
+def test_build_item_filters_headers_and_charges():
+    assert build_item('2', 'CHICKEN BREAST', '1,090.00') == {'name': 'CHICKEN BREAST', 'quantity': 2,
+                                                             'price': 1090.0}
+    assert build_item('1', 'DESCRIPTION', '5.00') is None
+    assert build_item('1', 'FUEL SURCHARGE', '5.00') is None
+    assert build_item('0', 'CHICKEN BREAST', '5.00') is None
+    assert build_item('1', 'CHICKEN BREAST', 'N/A') is None
+    assert build_item('1', 'X' * 80, '5.00', max_name_length=10)['name'] == 'X' * 10
+
+
+@pytest.mark.parametrize('line, item', PERFORMANCE_LINES)
+def test_performance_row_format(line, item):
+    assert get_parser('performance').parse(line) == item
+
+
+@pytest.mark.parametrize('line', [
+    '',
+    'QTY UNIT PACK ITEM CODE DESCRIPTION PRICE EXT',
+    'TOTAL: $245.55',
+    '2 PK 1/5GAL GF662 SOFT ICE CREAM MIX 42.50 85.00',
+    '1 CS 1/1 FS100 FS DELIVERY 5.00 5.00',
+])
+def test_performance_rejects_non_items(line):
+    assert get_parser('performance').parse(line) is None
+
+
+def test_every_registered_parser_reads_its_own_rows():
+    for name, parser in PARSERS.items():
+        assert parser.name == name
+        assert parser.pattern.groupindex.keys() >= {'quantity', 'description', 'extension'}
+    assert get_parser().parse_lines([line for line, _ in PERFORMANCE_LINES] + ['SUBTOTAL 10.00']) == \
+        [item for _, item in PERFORMANCE_LINES]
+
+
+def test_get_parser():
+    assert get_parser() is get_parser(DEFAULT_PARSER)
+    with pytest.raises(KeyError):
+        get_parser('nobody')
+
+
+def test_detect_parser(registry):
+    register_parser(LineParser('sysco', r'^\s*(?P<quantity>\d+)\s+(?P<description>.+?)\s+(?P<extension>[\d.]+)$',
+                               supplier_pattern=r'sysco'))
+    assert detect_parser('Vendor: Performance Food Group').name == 'performance'
+    assert detect_parser('SYSCO CORPORATION\nInvoice 1').name == 'sysco'
+    # Unknown suppliers get the default grammar
+    assert detect_parser('Somebody Else Inc.').name == DEFAULT_PARSER
+    assert get_parser('sysco').parse('4 PAPER TOWELS 20.00') == {'name': 'PAPER TOWELS', 'quantity': 4,
+                                                                'price': 20.0}
+
+
+def test_parser_without_supplier_pattern_is_never_detected(registry):
+    register_parser(LineParser('generic', r'(?P<quantity>\d+) (?P<description>.+) (?P<extension>[\d.]+)'))
+    assert not get_parser('generic').matches_supplier('generic')
+    assert detect_parser('generic').name == DEFAULT_PARSER
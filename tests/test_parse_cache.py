@@ -0,0 +1,76 @@
+import hashlib
+import os
+import time
+
+from parse_cache import ParseCache, hash_file
+
+
+def data(n):
+    return {'items': [{'name': f'ITEM {n}', 'quantity': n}], 'invoice_number': str(n)}
+
+
+def test_hash_file(tmp_path):
+    path = tmp_path / 'invoice.pdf'
+    path.write_bytes(b'%PDF' * 1000)
+    assert hash_file(str(path)) == hashlib.sha256(b'%PDF' * 1000).hexdigest()
+
+
+def test_put_get_and_counters(tmp_path):
+    cache = ParseCache(str(tmp_path / 'cache'), parser_version=2)
+    assert cache.get('a') is None
+    cache.put('a', data(1))
+    assert cache.get('a') == data(1)
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+    assert cache.stats()['entries'] == 1
+
+
+def test_evicts_least_recently_used_by_count(tmp_path):
+    cache = ParseCache(str(tmp_path), parser_version=2, max_entries=2)
+    cache.put('a', data(1))
+    cache.put('b', data(2))
+    cache.get('a')
+    cache.put('c', data(3))
+    assert cache.get('b') is None
+    assert cache.get('a') == data(1) and cache.get('c') == data(3)
+    assert sorted(os.listdir(tmp_path)) == ['a.json', 'c.json']
+
+
+def test_evicts_by_size(tmp_path):
+    cache = ParseCache(str(tmp_path), parser_version=2, max_bytes=250)
+    for key in 'abc':
+        cache.put(key, data(1))
+    assert cache.stats()['bytes'] <= 250
+    assert cache.get('c') == data(1)
+    assert cache.get('a') is None
+
+
+def test_older_parser_version_is_a_miss(tmp_path):
+    ParseCache(str(tmp_path), parser_version=1).put('a', data(1))
+    cache = ParseCache(str(tmp_path), parser_version=2)
+    assert cache.get('a') is None
+    assert cache.stats()['entries'] == 0
+    cache.put('a', data(2))
+    assert ParseCache(str(tmp_path), parser_version=2).get('a') == data(2)
+
+
+def test_unreadable_entry_is_a_miss(tmp_path):
+    cache = ParseCache(str(tmp_path), parser_version=2)
+    cache.put('a', data(1))
+    (tmp_path / 'a.json').write_text('{torn')
+    assert cache.get('a') is None
+
+
+def test_lru_order_survives_a_restart(tmp_path):
+    cache = ParseCache(str(tmp_path), parser_version=2)
+    cache.put('a', data(1))
+    cache.put('b', data(2))
+    old = time.time() - 100
+    os.utime(tmp_path / 'a.json', (old, old))
+    os.utime(tmp_path / 'b.json', (old + 1, old + 1))
+    # Reading 'a' marks it as recently used on disk too
+    assert cache.get('a') == data(1)
+
+    restarted = ParseCache(str(tmp_path), parser_version=2, max_entries=2)
+    restarted.put('c', data(3))
+    assert restarted.get('b') is None
+    assert restarted.get('a') == data(1)
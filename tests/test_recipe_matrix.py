@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+import recipe_matrix
+from recipe_matrix import RecipeMatrix
+from records import RecipeIngredient
+
+
+RECIPES = {
+    'SM BLIZZARD': [RecipeIngredient('GF662', 'MIX', 5, 'oz'), RecipeIngredient('AJW24', 'CUP', 1, 'cup')],
+    'MED BLIZZARD': [RecipeIngredient('GF662', 'MIX', 8, 'oz'), RecipeIngredient('AJW24', 'CUP', 1, 'cup'),
+                     RecipeIngredient('GF662', 'MIX', 1, 'oz')],
+    'CONE': [RecipeIngredient('CN1', 'CONE', 1, 'each'), RecipeIngredient('ZERO', 'NOTHING', 0, 'each')],
+}
+
+
+def dense_deductions(recipes, sold):
+    """The per-row loop the matrix replaces."""
+    totals = {}
+    for pos_item, quantity in sold.items():
+        for ingredient in recipes.get(pos_item, []):
+            totals[ingredient.item_number] = totals.get(ingredient.item_number, 0) + quantity * ingredient.quantity_used
+    return totals
+
+
+def test_rows_and_membership():
+    matrix = RecipeMatrix(RECIPES)
+    assert len(matrix) == 3
+    assert 'CONE' in matrix and 'SHAKE' not in matrix
+    assert matrix.row('MED BLIZZARD') == [('GF662', 8), ('AJW24', 1), ('GF662', 1)]
+
+
+def test_duplicate_ingredients_are_summed():
+    assert RecipeMatrix(RECIPES).deductions({'MED BLIZZARD': 2}) == {'GF662': 18, 'AJW24': 2}
+
+
+def test_zero_quantity_ingredient_is_reported():
+    assert RecipeMatrix(RECIPES).deductions({'CONE': 3}) == {'CN1': 3, 'ZERO': 0}
+
+
+def test_unknown_pos_items_are_ignored():
+    assert RecipeMatrix(RECIPES).deductions({'SHAKE': 4}) == {}
+    assert RecipeMatrix({}).deductions({'SHAKE': 4}) == {}
+
+
+def test_matches_dense_loop():
+    rng = random.Random(7)
+    items = [f'I{n}' for n in range(30)]
+    recipes = {f'P{p}': [RecipeIngredient(rng.choice(items), '', rng.randint(0, 9) / 2, 'oz')
+                         for _ in range(rng.randint(1, 6))] for p in range(50)}
+    matrix = RecipeMatrix(recipes)
+    for _ in range(20):
+        sold = {f'P{rng.randrange(60)}': rng.randint(1, 40) for _ in range(15)}
+        expected = dense_deductions(recipes, sold)
+        assert matrix.deductions(sold) == pytest.approx(expected)
+
+
+def test_scipy_and_csr_walk_agree(monkeypatch):
+    pytest.importorskip('scipy')
+    rng = random.Random(11)
+    items = [f'I{n}' for n in range(40)]
+    recipes = {f'P{p}': [RecipeIngredient(rng.choice(items), '', rng.randint(0, 9) / 2, 'oz')
+                         for _ in range(rng.randint(1, 6))] for p in range(80)}
+    sales = [{f'P{rng.randrange(100)}': rng.randint(1, 40) for _ in range(rng.randint(0, 30))}
+             for _ in range(20)]
+    sales.append({'SM BLIZZARD': 3, 'MED BLIZZARD': 2, 'CONE': 5})
+    recipes.update(RECIPES)
+
+    with_scipy = RecipeMatrix(recipes)
+    assert with_scipy._csr is not None
+    monkeypatch.setattr(recipe_matrix, 'HAS_SCIPY', False)
+    walk = RecipeMatrix(recipes)
+    for sold in sales:
+        assert with_scipy.deductions(sold) == pytest.approx(walk.deductions(sold))
+        assert sorted(with_scipy.deductions(sold)) == sorted(walk.deductions(sold))
@@ -0,0 +1,135 @@
+import json
+
+from inventory_store import InventoryStore, add_op, deduct_op, set_quantity_op
+from records import Conversion
+from reorder import OK, OUT, REORDER, ReorderEngine
+
+DAY = 740000
+CONVERSIONS = {
+    'A': Conversion('Apple', 'case', '12', 'each'),
+    'B': Conversion('Banana', 'case', 'depends on size', 'each'),
+}
+
+
+def make(tmp_path, **options):
+    store = InventoryStore({
+        'A': {'quantity': 100, 'unit': 'each', 'description': 'Apple'},
+        'B': {'quantity': 50, 'unit': 'each', 'description': 'Banana'},
+    })
+    engine = ReorderEngine(str(tmp_path / 'usage.json'), **options)
+    return store, engine
+
+
+def run(store, engine, ops, day=DAY):
+    engine.apply(store.apply_batch(ops), CONVERSIONS, day=day)
+
+
+def test_rate_and_reorder_row(tmp_path):
+    store, engine = make(tmp_path)
+    run(store, engine, [deduct_op('A', 30)])
+    row, = engine.report(store.items(), CONVERSIONS, day=DAY)
+    assert row['status'] == REORDER
+    assert row['daily_usage'] == 30
+    assert row['reorder_point'] == 90
+    assert row['days_of_cover'] == 2.3
+    # Three days of lead time plus seven of cover, less the 70 on hand
+    assert row['suggested_units'] == 230
+    assert row['suggested_cases'] == 20
+
+
+def test_rate_averages_over_window(tmp_path):
+    store, engine = make(tmp_path, window_days=10)
+    run(store, engine, [deduct_op('A', 10)], day=DAY)
+    run(store, engine, [deduct_op('A', 10)], day=DAY + 1)
+    rows = engine.report(store.items(), CONVERSIONS, include_ok=True, day=DAY + 3)
+    # 20 used over the 4 days since usage was first seen
+    assert rows[0]['daily_usage'] == 5
+    assert rows[0]['status'] == OK
+
+    rows = engine.report(store.items(), CONVERSIONS, include_ok=True, day=DAY + 10)
+    # The first day dropped out of the window
+    assert rows[0]['daily_usage'] == 1
+    rows = engine.report(store.items(), CONVERSIONS, include_ok=True, day=DAY + 11)
+    assert rows[0]['daily_usage'] == 0 and rows[0]['days_of_cover'] is None
+
+
+def test_alert_changes(tmp_path):
+    store, engine = make(tmp_path)
+    run(store, engine, [deduct_op('A', 30)])
+    run(store, engine, [deduct_op('A', 1)])  # still REORDER, no new change
+    run(store, engine, [deduct_op('B', 60)])
+    run(store, engine, [set_quantity_op('A', 1000)])
+
+    changes = engine.changes()
+    assert changes['seq'] == 3 and changes['complete']
+    assert [(change['item_number'], change['previous'], change['status'])
+            for change in changes['changes']] == [('A', OK, REORDER), ('B', OK, OUT), ('A', REORDER, OK)]
+    # B's case size isn't a number, so no case count is suggested
+    assert changes['changes'][1]['row']['suggested_cases'] is None
+    assert changes['changes'][2]['row']['status'] == OK
+
+    newer = engine.changes(since=2)
+    assert [change['seq'] for change in newer['changes']] == [3] and newer['complete']
+    assert engine.changes(since=3) == {'seq': 3, 'changes': [], 'complete': True}
+
+
+def test_dropped_changes_are_incomplete(tmp_path):
+    store, engine = make(tmp_path, max_changes=2)
+    run(store, engine, [deduct_op('A', 30)])
+    run(store, engine, [deduct_op('B', 60)])
+    run(store, engine, [add_op('B', 100, 'each', 'Banana')])
+    assert engine.changes(since=0)['complete'] is False
+    assert engine.changes(since=1)['complete'] is True
+
+
+def test_seq_survives_restart(tmp_path):
+    store, engine = make(tmp_path)
+    run(store, engine, [deduct_op('A', 30)])
+    run(store, engine, [deduct_op('B', 60)])
+    engine.save()
+    assert json.loads((tmp_path / 'usage.json').read_text())['seq'] == 2
+
+    restarted = ReorderEngine(engine.path)
+    restarted.load()
+    restarted.reset(store.to_dict(), CONVERSIONS, day=DAY)
+    changes = restarted.changes(since=2)
+    # The alerts found again on load come after the seq clients already have
+    assert [change['seq'] for change in changes['changes']] == [3, 4]
+    assert changes['complete']
+    rows = {row['item_number']: row for row in restarted.report(store.items(), CONVERSIONS, day=DAY)}
+    assert rows['A']['daily_usage'] == 30 and rows['B']['status'] == OUT
+
+
+def test_since_ahead_of_seq_asks_for_resync(tmp_path):
+    store, engine = make(tmp_path)
+    run(store, engine, [deduct_op('A', 30)])
+    # e.g. the usage file was lost, so seq started again from 0
+    assert engine.changes(since=50) == {'seq': 1, 'changes': [], 'complete': False}
+
+
+def test_alert_changes_are_saved(tmp_path):
+    store, engine = make(tmp_path)
+    # No usage recorded, but B ran out: the new seq still has to be saved
+    run(store, engine, [set_quantity_op('B', 0)])
+    engine.save()
+    restarted = ReorderEngine(engine.path)
+    restarted.load()
+    assert restarted.stats()['seq'] == 1
+
+
+def test_reset_and_clear(tmp_path):
+    store, engine = make(tmp_path)
+    run(store, engine, [deduct_op('A', 30)])
+    engine.clear()
+    engine.reset({}, CONVERSIONS, day=DAY)
+    changes = engine.changes(since=1)['changes']
+    assert [(change['item_number'], change['status'], change['row']) for change in changes] == [('A', OK, None)]
+    assert engine.stats()['alerts'] == 0 and engine.stats()['items_with_usage'] == 0
+
+
+def test_unreadable_usage_file_starts_empty(tmp_path):
+    path = tmp_path / 'usage.json'
+    path.write_text('{not json')
+    engine = ReorderEngine(str(path))
+    engine.load()
+    assert engine.stats()['seq'] == 0 and engine.stats()['items_with_usage'] == 0
@@ -0,0 +1,128 @@
+import threading
+from types import SimpleNamespace
+
+from stores import StoreRegistry, valid_store_id
+
+
+def make_registry(max_stores=2, fail=()):
+    opened, closed = [], []
+
+    def open_store(store_id):
+        if store_id in fail:
+            raise IOError(f'cannot load {store_id}')
+        opened.append(store_id)
+        return SimpleNamespace(store_id=store_id)
+
+    def close_store(store):
+        closed.append(store.store_id)
+
+    return StoreRegistry(open_store, close_store, max_stores=max_stores), opened, closed
+
+
+def test_valid_store_id():
+    assert valid_store_id('store_12-a')
+    assert not valid_store_id('')
+    assert not valid_store_id(None)
+    assert not valid_store_id('../etc')
+    assert not valid_store_id('a' * 65)
+
+
+def test_loads_once_and_reuses():
+    registry, opened, closed = make_registry()
+    with registry.checkout('a') as first:
+        pass
+    with registry.checkout('a') as second:
+        pass
+    assert first is second
+    assert opened == ['a']
+    assert registry.loads == 1
+    assert closed == []
+
+
+def test_evicts_least_recently_used():
+    registry, opened, closed = make_registry(max_stores=2)
+    for store_id in ('a', 'b', 'a', 'c'):
+        with registry.checkout(store_id):
+            pass
+    # 'b' was used before the second 'a', so it goes first
+    assert closed == ['b']
+    assert registry.loaded() == ['a', 'c']
+    assert registry.evictions == 1
+
+    with registry.checkout('b'):
+        pass
+    assert opened == ['a', 'b', 'c', 'b']
+    assert closed == ['b', 'a']
+
+
+def test_pinned_store_is_not_evicted():
+    registry, opened, closed = make_registry(max_stores=1)
+    registry.acquire('a')
+    with registry.checkout('b'):
+        # Every store is pinned, so the registry goes over max_stores
+        assert registry.loaded() == ['a', 'b']
+        assert registry.stats()['in_use'] == 2
+        assert closed == []
+    # 'a' is still pinned, so the released 'b' makes the room
+    assert closed == ['b']
+    assert registry.loaded() == ['a']
+
+    registry.release('a')
+    assert registry.loaded() == ['a']
+
+
+def test_evicted_store_is_closed_before_reload():
+    events = []
+    closing = threading.Event()
+    resume = threading.Event()
+
+    def open_store(store_id):
+        events.append(('open', store_id))
+        return SimpleNamespace(store_id=store_id)
+
+    def close_store(store):
+        closing.set()
+        resume.wait(5)
+        events.append(('close', store.store_id))
+
+    registry = StoreRegistry(open_store, close_store, max_stores=1)
+    with registry.checkout('a'):
+        pass
+    evicting = threading.Thread(target=lambda: registry.checkout('b').__enter__())
+    evicting.start()
+    assert closing.wait(5)
+
+    reload = threading.Thread(target=lambda: registry.acquire('a'))
+    reload.start()
+    reload.join(0.2)
+    # 'a' is still being written out, so the reload waits for it
+    assert reload.is_alive()
+    resume.set()
+    evicting.join(5)
+    reload.join(5)
+    assert events.index(('close', 'a')) < events.index(('open', 'a'), 1)
+
+
+def test_load_error_propagates_and_is_not_cached():
+    registry, opened, closed = make_registry(fail={'bad'})
+    try:
+        registry.acquire('bad')
+    except IOError:
+        pass
+    else:
+        raise AssertionError('expected IOError')
+    assert registry.loaded() == []
+    assert registry.stats()['in_use'] == 0
+
+    registry._open_store = lambda store_id: SimpleNamespace(store_id=store_id)
+    assert registry.acquire('bad').store_id == 'bad'
+
+
+def test_close_all():
+    registry, opened, closed = make_registry(max_stores=4)
+    for store_id in ('a', 'b', 'c'):
+        with registry.checkout(store_id):
+            pass
+    registry.close_all()
+    assert sorted(closed) == ['a', 'b', 'c']
+    assert registry.loaded() == []
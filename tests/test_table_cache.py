@@ -0,0 +1,67 @@
+import json
+import os
+import shutil
+
+import pytest
+
+import table_cache
+from table_cache import CompiledTables, compile_tables, open_tables, read_csv_tables, table_files, tables_checksum
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def csv_paths(tmp_path):
+    paths = table_files(str(tmp_path))
+    for path in paths:
+        shutil.copy(os.path.join(REPO, 'inventory', os.path.basename(path)), path)
+    return paths
+
+
+def test_compiled_tables_match_the_csvs(tmp_path, csv_paths):
+    output = str(tmp_path / 'tables.json')
+    checksum = compile_tables(csv_paths, output)
+    conversions, recipes = read_csv_tables(*csv_paths)
+    with CompiledTables(output) as tables:
+        assert tables.checksum == checksum == tables_checksum(csv_paths)
+        assert dict(tables.conversions()) == conversions
+        assert dict(tables.recipes()) == recipes
+        assert list(dict(tables.recipes())) == list(recipes)
+        assert tables.conversion_count == len(conversions)
+        assert tables.ingredient_count == sum(map(len, recipes.values()))
+
+
+def test_changed_csv_is_compiled_again(tmp_path, csv_paths):
+    cache_paths = [str(tmp_path / 'tables.json')]
+    with open_tables(cache_paths, csv_paths) as tables:
+        first = tables.checksum
+    with open(csv_paths[0], 'a', encoding='utf-8') as f:
+        f.write('\nZZ999,NEW ITEM,CS,12,each,\n')
+    with open_tables(cache_paths, csv_paths) as tables:
+        assert tables.checksum != first
+        assert dict(tables.conversions())['ZZ999'][0] == 'NEW ITEM'
+
+
+@pytest.mark.parametrize('content', ['{torn', '[]', json.dumps({'format': 2}), json.dumps({'format': 3})])
+def test_unusable_file_is_compiled_again(tmp_path, csv_paths, content):
+    cache_path = tmp_path / 'tables.json'
+    cache_path.write_text(content)
+    with pytest.raises(ValueError):
+        CompiledTables(str(cache_path))
+    with open_tables([str(cache_path)], csv_paths) as tables:
+        assert tables.checksum == tables_checksum(csv_paths)
+    assert json.loads(cache_path.read_text())['format'] == table_cache.FORMAT_VERSION
+
+
+def test_read_only_location_falls_back(tmp_path, csv_paths):
+    fallback = tmp_path / 'scratch'
+    fallback.mkdir()
+    cache_paths = [str(tmp_path / 'missing' / 'tables.json'), str(fallback / 'tables.json')]
+    with open_tables(cache_paths, csv_paths) as tables:
+        assert tables.path == cache_paths[1]
+    assert not os.path.exists(cache_paths[0])
+
+
+def test_no_writable_location(tmp_path, csv_paths):
+    with pytest.raises(OSError):
+        open_tables([str(tmp_path / 'missing' / 'tables.json')], csv_paths)
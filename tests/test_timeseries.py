@@ -0,0 +1,174 @@
+import os
+import time
+
+from inventory_store import InventoryStore, add_op, deduct_op, set_quantity_op
+from timeseries import DAILY, HOURLY, RAW, TimeSeriesStore, _RECORD
+
+NOW = time.time()
+
+
+def make(tmp_path, **options):
+    store = InventoryStore({'A': {'quantity': 10, 'unit': 'each', 'description': 'Apple'}})
+    series = TimeSeriesStore(str(tmp_path), **options)
+    series.load()
+    return store, series
+
+
+def record(store, series, ops, event_type, t):
+    series.record(store.apply_batch(ops), event_type, t=t)
+
+
+def reopen(tmp_path, **options):
+    series = TimeSeriesStore(str(tmp_path), **options)
+    series.load()
+    return series
+
+
+def everything(series, item_number, resolution=RAW):
+    return series.query(item_number, 0, NOW + 3600, resolution)['columns']
+
+
+def test_record_and_query(tmp_path):
+    store, series = make(tmp_path)
+    record(store, series, [add_op('A', 5, 'each', 'Apple')], 'invoice_added', NOW - 7200)
+    record(store, series, [deduct_op('A', 3)], 'sales_deducted', NOW - 60)
+    # Unchanged quantities and unknown items add no points
+    record(store, series, [set_quantity_op('A', 12), set_quantity_op('MISSING', 1)], 'manual_update', NOW)
+
+    raw = everything(series, 'A')
+    assert raw['quantity'] == [15, 12]
+    assert raw['change'] == [5, -3]
+    assert raw['source'] == ['invoice_added', 'sales_deducted']
+
+    hourly = everything(series, 'A', HOURLY)
+    assert sum(hourly['changes']) == 2
+    daily = everything(series, 'A', DAILY)
+    assert daily['quantity'][-1] == 12 and sum(daily['changes']) == 2
+
+    later = series.query('A', NOW - 3600, NOW, RAW)
+    assert later['columns']['quantity'] == [12]
+    assert later['quantity_at_start'] == 15
+    assert series.query('B', 0, NOW)['columns']['t'] == []
+
+
+def test_log_round_trip(tmp_path):
+    store, series = make(tmp_path)
+    record(store, series, [add_op('A', 5, 'each', 'Apple'), add_op('Ä-1', 2, 'each', 'Ümlaut')],
+           'invoice_added', NOW - 10)
+    series.flush()
+    record(store, series, [deduct_op('A', 1)], 'sales_deducted', NOW)
+    series.flush()
+
+    loaded = reopen(tmp_path)
+    assert everything(loaded, 'A') == everything(series, 'A')
+    assert everything(loaded, 'Ä-1')['quantity'] == [2]
+    assert loaded.stats()['logged_since_snapshot'] == 3
+
+
+def test_unflushed_points_are_lost_but_not_the_rest(tmp_path):
+    store, series = make(tmp_path)
+    record(store, series, [add_op('A', 5, 'each', 'Apple')], 'invoice_added', NOW - 10)
+    series.flush()
+    record(store, series, [deduct_op('A', 1)], 'sales_deducted', NOW)
+    assert everything(reopen(tmp_path), 'A')['quantity'] == [15]
+
+
+def test_torn_tail_is_cut_before_the_next_append(tmp_path):
+    store, series = make(tmp_path)
+    record(store, series, [add_op('A', 5, 'each', 'Apple')], 'invoice_added', NOW - 10)
+    record(store, series, [deduct_op('A', 1)], 'sales_deducted', NOW - 5)
+    series.flush()
+    log_path = series.log_path
+    good = _RECORD.size + 1
+    with open(log_path, 'r+b') as f:
+        # The second record was only partly written
+        f.truncate(os.path.getsize(log_path) - 3)
+
+    loaded = reopen(tmp_path)
+    assert everything(loaded, 'A')['quantity'] == [15]
+    assert os.path.getsize(log_path) == good
+
+    record(store, loaded, [deduct_op('A', 2)], 'sales_deducted', NOW)
+    loaded.flush()
+    assert everything(reopen(tmp_path), 'A')['quantity'] == [15, 12]
+
+
+def test_undecodable_record_ends_the_log(tmp_path):
+    store, series = make(tmp_path)
+    record(store, series, [add_op('A', 5, 'each', 'Apple')], 'invoice_added', NOW - 10)
+    series.flush()
+    with open(series.log_path, 'ab') as f:
+        f.write(_RECORD.pack(99, NOW, 1, 1, 0, 2) + b'\xff\xfe')
+        f.write(_RECORD.pack(100, NOW, 1, 1, 0, 1) + b'A')
+
+    loaded = reopen(tmp_path)
+    assert everything(loaded, 'A')['quantity'] == [15]
+    assert os.path.getsize(series.log_path) == _RECORD.size + 1
+    assert loaded.stats()['items'] == 1
+
+
+def test_snapshot_compaction(tmp_path):
+    store, series = make(tmp_path, compact_every=2)
+    record(store, series, [add_op('A', 1, 'each', 'Apple')], 'invoice_added', NOW - 20)
+    series.flush()
+    assert not os.path.exists(series.snapshot_path)
+    record(store, series, [add_op('A', 1, 'each', 'Apple')], 'invoice_added', NOW - 10)
+    series.flush()
+    assert os.path.exists(series.snapshot_path)
+    assert not os.path.exists(series.log_path)
+    assert series.stats()['logged_since_snapshot'] == 0
+
+    record(store, series, [add_op('A', 1, 'each', 'Apple')], 'invoice_added', NOW)
+    series.flush()
+    loaded = reopen(tmp_path, compact_every=2)
+    assert everything(loaded, 'A')['quantity'] == [11, 12, 13]
+    assert loaded.stats()['logged_since_snapshot'] == 1
+
+
+def test_log_points_already_in_the_snapshot_are_skipped(tmp_path):
+    store, series = make(tmp_path, compact_every=1)
+    record(store, series, [add_op('A', 1, 'each', 'Apple')], 'invoice_added', NOW)
+    series.flush()
+    # A crash between writing the snapshot and removing the log leaves both
+    with open(series.log_path, 'wb') as f:
+        f.write(_RECORD.pack(1, NOW, 11, 1, 1, 1) + b'A')
+    assert everything(reopen(tmp_path), 'A')['quantity'] == [11]
+
+
+def test_retention(tmp_path):
+    store, series = make(tmp_path, raw_days=1, hourly_days=2, daily_days=3)
+    record(store, series, [add_op('A', 1, 'each', 'Apple')], 'invoice_added', NOW - 10 * 86400)
+    record(store, series, [add_op('A', 1, 'each', 'Apple')], 'invoice_added', NOW - 36 * 3600)
+    record(store, series, [add_op('A', 1, 'each', 'Apple')], 'invoice_added', NOW)
+    series.flush()
+
+    loaded = reopen(tmp_path, raw_days=1, hourly_days=2, daily_days=3)
+    assert everything(loaded, 'A')['quantity'] == [13]
+    assert everything(loaded, 'A', HOURLY)['quantity'] == [12, 13]
+    assert everything(loaded, 'A', DAILY)['quantity'][-1] == 13
+    assert len(everything(loaded, 'A', DAILY)['t']) <= 3
+    # Auto resolution picks the finest tier kept for the whole range
+    assert loaded.query('A', NOW - 3600, NOW)['resolution'] == RAW
+    assert loaded.query('A', NOW - 86400 * 1.5, NOW)['resolution'] == HOURLY
+    assert loaded.query('A', NOW - 86400 * 2.5, NOW)['resolution'] == DAILY
+
+
+def test_unknown_resolution(tmp_path):
+    store, series = make(tmp_path)
+    try:
+        series.query('A', 0, NOW, 'weekly')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('expected ValueError')
+
+
+def test_clear(tmp_path):
+    store, series = make(tmp_path, compact_every=1)
+    record(store, series, [add_op('A', 1, 'each', 'Apple')], 'invoice_added', NOW)
+    series.flush()
+    record(store, series, [add_op('A', 1, 'each', 'Apple')], 'invoice_added', NOW)
+    series.clear()
+    series.flush()
+    assert not os.path.exists(series.snapshot_path) and not os.path.exists(series.log_path)
+    assert reopen(tmp_path).stats()['items'] == 0
@@ -0,0 +1,121 @@
+import threading
+import time
+
+from write_behind import WriteBehindScheduler
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.005)
+    return False
+
+
+class Saves:
+    """flush_fn that records its calls and can be made to fail."""
+
+    def __init__(self, failures=0):
+        self.calls = []
+        self.failures = failures
+        self.lock = threading.Lock()
+
+    def __call__(self, **kwargs):
+        with self.lock:
+            self.calls.append(kwargs)
+            if self.failures:
+                self.failures -= 1
+                raise OSError('disk full')
+
+
+def test_flushes_once_max_pending_is_reached():
+    saves = Saves()
+    scheduler = WriteBehindScheduler(saves, interval=60, max_pending=3)
+    scheduler.mark_dirty()
+    scheduler.mark_dirty()
+    time.sleep(0.05)
+    assert saves.calls == [] and scheduler.pending == 2
+
+    scheduler.mark_dirty()
+    assert wait_until(lambda: len(saves.calls) == 1)
+    assert scheduler.pending == 0
+    scheduler.stop()
+
+
+def test_flushes_after_the_interval():
+    saves = Saves()
+    scheduler = WriteBehindScheduler(saves, interval=0.1, max_pending=100)
+    started = time.monotonic()
+    for _ in range(5):
+        scheduler.mark_dirty()
+    assert wait_until(lambda: len(saves.calls) == 1)
+    assert time.monotonic() - started >= 0.1
+    # Five changes, one save
+    time.sleep(0.2)
+    assert len(saves.calls) == 1
+    assert scheduler.stats()['flush_count'] == 1
+    scheduler.stop()
+
+
+def test_stop_flushes_pending_changes():
+    saves = Saves()
+    scheduler = WriteBehindScheduler(saves, interval=60, max_pending=100)
+    scheduler.mark_dirty(4)
+    scheduler.stop()
+    assert len(saves.calls) == 1 and scheduler.pending == 0
+
+    # Nothing pending: no extra save
+    WriteBehindScheduler(saves, interval=60).stop()
+    assert len(saves.calls) == 1
+
+
+def test_changes_after_stop_are_saved_inline():
+    saves = Saves()
+    scheduler = WriteBehindScheduler(saves, interval=60)
+    scheduler.stop()
+    scheduler.mark_dirty()
+    assert len(saves.calls) == 1
+
+
+def test_failed_save_is_retried():
+    saves = Saves(failures=1)
+    scheduler = WriteBehindScheduler(saves, interval=0.05, max_pending=1)
+    scheduler.mark_dirty()
+    assert wait_until(lambda: len(saves.calls) == 2)
+    assert scheduler.stats()['last_error'] is None
+    assert scheduler.pending == 0
+    scheduler.stop()
+
+
+def test_flush_reports_failure_and_keeps_changes_dirty():
+    saves = Saves(failures=1)
+    scheduler = WriteBehindScheduler(saves, interval=60)
+    assert scheduler.flush(full=True) is False
+    assert saves.calls == [{'full': True}]
+    assert scheduler.pending == 1
+    assert scheduler.stats()['last_error'] == 'disk full'
+
+    assert scheduler.flush() is True
+    assert scheduler.pending == 0 and scheduler.stats()['last_error'] is None
+
+
+def test_flushes_never_overlap():
+    running = []
+    overlaps = []
+
+    def slow_save():
+        if running:
+            overlaps.append(True)
+        running.append(True)
+        time.sleep(0.02)
+        running.pop()
+
+    scheduler = WriteBehindScheduler(slow_save, interval=60)
+    threads = [threading.Thread(target=scheduler.flush) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert overlaps == []
+    assert scheduler.stats()['flush_count'] == 5
@@ -0,0 +1,353 @@
+"""
+Inventory Time Series
+Per-item quantity changes kept in columns, with hourly and daily rollups.
+
+Every applied change adds a raw point (time, quantity after the change, the
+change itself and what caused it) to the item's series, and folds it into the
+item's current hourly and daily buckets (closing quantity, low, high, net
+change and number of changes). Each tier keeps its values in typed arrays, one
+per column, so a series costs a few bytes per point and a time range is two
+binary searches and a slice. Raw points are kept for raw_days, hourly buckets
+for hourly_days and daily buckets for daily_days.
+
+New points are appended to a binary log on each save. Once the log holds
+compact_every points the whole store is written to a snapshot, old points are
+dropped by the retention policies, and the log starts over.
+"""
+
+import os
+import time
+import struct
+import pickle
+import threading
+import logging
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Any, List, Optional, Tuple
+
+from inventory_store import OpResult
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+
+RAW = 'raw'
+HOURLY = 'hourly'
+DAILY = 'daily'
+# Finest first
+RESOLUTIONS = (RAW, HOURLY, DAILY)
+BUCKET_SECONDS = {HOURLY: 3600, DAILY: 86400}
+
+# Event types stored as one byte per raw point; 0 is anything else
+SOURCES = ('other', 'invoice_added', 'sales_deducted', 'starting_inventory_set', 'manual_update')
+SOURCE_CODES = {source: code for code, source in enumerate(SOURCES)}
+
+# Log record: seq, time, quantity, change, source code, item number length (item number bytes follow)
+_RECORD = struct.Struct('<QdddBH')
+
+# Columns of each tier, with their array type codes
+RAW_COLUMNS = (('t', 'd'), ('quantity', 'd'), ('change', 'd'), ('source', 'B'))
+BUCKET_COLUMNS = (('t', 'd'), ('quantity', 'd'), ('low', 'd'), ('high', 'd'), ('change', 'd'), ('changes', 'L'))
+
+
+def _columns(spec) -> Dict[str, array]:
+    return {name: array(typecode) for name, typecode in spec}
+
+
+class _Series:
+    """Raw points and hourly/daily buckets of one item."""
+
+    __slots__ = ('raw', 'hourly', 'daily')
+
+    def __init__(self):
+        self.raw = _columns(RAW_COLUMNS)
+        self.hourly = _columns(BUCKET_COLUMNS)
+        self.daily = _columns(BUCKET_COLUMNS)
+
+    def tier(self, resolution: str) -> Dict[str, array]:
+        return getattr(self, resolution)
+
+    def add(self, t: float, quantity: float, change: float, source: int):
+        raw = self.raw
+        if raw['t'] and t < raw['t'][-1]:
+            # Clock stepped back; keep the columns sorted
+            t = raw['t'][-1]
+        raw['t'].append(t)
+        raw['quantity'].append(quantity)
+        raw['change'].append(change)
+        raw['source'].append(source)
+
+        for resolution, seconds in BUCKET_SECONDS.items():
+            buckets = self.tier(resolution)
+            start = t - t % seconds
+            if buckets['t'] and buckets['t'][-1] == start:
+                buckets['quantity'][-1] = quantity
+                buckets['low'][-1] = min(buckets['low'][-1], quantity)
+                buckets['high'][-1] = max(buckets['high'][-1], quantity)
+                buckets['change'][-1] += change
+                buckets['changes'][-1] += 1
+            else:
+                buckets['t'].append(start)
+                buckets['quantity'].append(quantity)
+                buckets['low'].append(quantity)
+                buckets['high'].append(quantity)
+                buckets['change'].append(change)
+                buckets['changes'].append(1)
+
+    def trim(self, cutoffs: Dict[str, float]):
+        """Drop the points of each tier older than its cutoff."""
+        for resolution, cutoff in cutoffs.items():
+            columns = self.tier(resolution)
+            count = bisect_left(columns['t'], cutoff)
+            if count:
+                for values in columns.values():
+                    del values[:count]
+
+    def __len__(self) -> int:
+        return len(self.raw['t']) + len(self.hourly['t']) + len(self.daily['t'])
+
+
+class TimeSeriesStore:
+    """
+    Quantity history of every item in one store.
+
+    Args:
+        folder: Folder for the snapshot and log files (must exist)
+        raw_days: Days raw points are kept
+        hourly_days: Days hourly buckets are kept
+        daily_days: Days daily buckets are kept
+        compact_every: Logged points that trigger a new snapshot
+    """
+
+    def __init__(self, folder: str, raw_days: float = 7, hourly_days: float = 90,
+                 daily_days: float = 5 * 365, compact_every: int = 10000):
+        self.snapshot_path = os.path.join(folder, 'timeseries.snapshot')
+        self.log_path = os.path.join(folder, 'timeseries.log')
+        self.retention = {RAW: raw_days * 86400, HOURLY: hourly_days * 86400, DAILY: daily_days * 86400}
+        self.compact_every = compact_every
+
+        self._lock = threading.Lock()  # guards the series and the pending points
+        self._write_lock = threading.Lock()  # one flush at a time
+        self._series: Dict[str, _Series] = {}
+        self._pending: List[Tuple[int, float, float, float, int, str]] = []  # points not yet logged
+        self._seq = 0  # sequence number of the last point added
+        self._logged = 0  # points in the log since the last snapshot
+
+    def _cutoffs(self, now: float) -> Dict[str, float]:
+        return {resolution: now - seconds for resolution, seconds in self.retention.items()}
+
+    def _add(self, item_number: str, t: float, quantity: float, change: float, source: int):
+        series = self._series.get(item_number)
+        if series is None:
+            series = self._series[item_number] = _Series()
+        series.add(t, quantity, change, source)
+
+    def record(self, results: List[OpResult], event_type: str, t: Optional[float] = None):
+        """
+        Add a point for every item whose quantity a batch changed.
+
+        Args:
+            results: OpResults from InventoryStore.apply_batch
+            event_type: Event type of the batch (see SOURCES)
+            t: Time of the change (default now)
+        """
+        t = time.time() if t is None else t
+        source = SOURCE_CODES.get(event_type, 0)
+        with self._lock:
+            for result in results:
+                if not result.applied or result.new is None:
+                    continue
+                quantity = result.new['quantity']
+                old = result.old['quantity'] if result.old is not None else 0.0
+                if result.old is not None and quantity == old:
+                    continue
+                item_number = result.op.item_number
+                self._seq += 1
+                self._add(item_number, t, quantity, quantity - old, source)
+                self._pending.append((self._seq, t, quantity, quantity - old, source, item_number))
+
+    def query(self, item_number: str, start: float, end: float, resolution: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Points of one item between two times.
+
+        Args:
+            item_number: Item to read
+            start: Range start (epoch seconds, inclusive)
+            end: Range end (epoch seconds, inclusive)
+            resolution: RAW, HOURLY or DAILY; None picks the finest one still kept for all of the range
+
+        Returns:
+            dict: {'item_number', 'resolution', 'start', 'end', 'quantity_at_start' (quantity just before
+                  the range, None if unknown), 'columns' (name -> list of values)}
+
+        Raises:
+            ValueError: If resolution is not one of RESOLUTIONS
+        """
+        if resolution is None:
+            # A minute of slack so "the last 90 days" still gets the tier kept for 90 days
+            cutoffs = self._cutoffs(time.time() - 60)
+            resolution = next((name for name in RESOLUTIONS if start >= cutoffs[name]), DAILY)
+        elif resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution '{resolution}' (use one of {', '.join(RESOLUTIONS)})")
+
+        spec = RAW_COLUMNS if resolution == RAW else BUCKET_COLUMNS
+        with self._lock:
+            series = self._series.get(item_number)
+            if series is None:
+                columns = {name: [] for name, _ in spec}
+                quantity_at_start = None
+            else:
+                tier = series.tier(resolution)
+                if resolution == RAW:
+                    first = bisect_left(tier['t'], start)
+                else:
+                    # The bucket that contains start
+                    first = max(bisect_right(tier['t'], start) - 1, 0)
+                    if first < len(tier['t']) and tier['t'][first] + BUCKET_SECONDS[resolution] <= start:
+                        first += 1
+                last = bisect_right(tier['t'], end)
+                columns = {name: values[first:last].tolist() for name, values in tier.items()}
+                quantity_at_start = tier['quantity'][first - 1] if first > 0 else None
+
+        if resolution == RAW:
+            columns['source'] = [SOURCES[code] for code in columns['source']]
+        return {
+            'item_number': item_number,
+            'resolution': resolution,
+            'start': start,
+            'end': end,
+            'quantity_at_start': quantity_at_start,
+            'columns': columns
+        }
+
+    def flush(self):
+        """Append the points added since the last flush to the log, writing a new snapshot when it is due."""
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            try:
+                if pending:
+                    with open(self.log_path, 'ab') as f:
+                        f.write(b''.join(_RECORD.pack(seq, t, quantity, change, source, len(encoded)) + encoded
+                                         for seq, t, quantity, change, source, item_number in pending
+                                         for encoded in (item_number.encode('utf-8'),)))
+                    self._logged += len(pending)
+                if self._logged >= self.compact_every:
+                    self._compact()
+            except OSError as e:
+                # Still in memory; try again on the next save
+                with self._lock:
+                    self._pending[:0] = pending
+                logger.error(f"Failed to write time series log: {str(e)}")
+
+    def _compact(self):
+        with self._lock:
+            cutoffs = self._cutoffs(time.time())
+            for item_number in list(self._series):
+                series = self._series[item_number]
+                series.trim(cutoffs)
+                if not len(series):
+                    del self._series[item_number]
+            snapshot = {
+                'format': SNAPSHOT_FORMAT,
+                'seq': self._seq,
+                'series': {item_number: (series.raw, series.hourly, series.daily)
+                           for item_number, series in self._series.items()}
+            }
+            # Pickled while no point can be added, so the snapshot matches seq. Points still
+            # pending are logged later with lower seqs, which the loader skips
+            data = pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.snapshot_path)
+        # Points up to seq are in the snapshot; a crash before this only leaves points the loader skips
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+        self._logged = 0
+
+    def load(self):
+        """
+        Read the snapshot and replay the log written after it, then apply the retention policies.
+
+        An incomplete or unreadable record ends the replay and is cut off the log
+        with everything after it.
+        """
+        seq = 0
+        series: Dict[str, _Series] = {}
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, 'rb') as f:
+                    snapshot = pickle.load(f)
+                if snapshot.get('format') != SNAPSHOT_FORMAT:
+                    raise ValueError(f"unsupported format {snapshot.get('format')}")
+                seq = snapshot['seq']
+                for item_number, (raw, hourly, daily) in snapshot['series'].items():
+                    series[item_number] = item_series = _Series()
+                    item_series.raw, item_series.hourly, item_series.daily = raw, hourly, daily
+            except Exception as e:
+                logger.error(f"Failed to read time series snapshot: {str(e)}")
+                seq, series = 0, {}
+
+        logged = 0
+        with self._lock:
+            self._series = series
+            if os.path.exists(self.log_path):
+                with open(self.log_path, 'rb') as f:
+                    data = f.read()
+                offset = 0  # end of the last good record
+                while offset + _RECORD.size <= len(data):
+                    try:
+                        point_seq, t, quantity, change, source, length = _RECORD.unpack_from(data, offset)
+                        end = offset + _RECORD.size + length
+                        if end > len(data) or source >= len(SOURCES):
+                            break
+                        item_number = data[offset + _RECORD.size:end].decode('utf-8')
+                    except (struct.error, UnicodeDecodeError):
+                        break
+                    offset = end
+                    if point_seq > seq:
+                        self._add(item_number, t, quantity, change, source)
+                        seq = point_seq
+                    logged += 1
+                if offset != len(data):
+                    # Torn write at the end of the log - everything before it is good. Cut it
+                    # off, or the next flush would append after it and those points be lost too
+                    logger.warning(f"Dropping {len(data) - offset} bytes of incomplete time series log record")
+                    try:
+                        with open(self.log_path, 'r+b') as f:
+                            f.truncate(offset)
+                    except OSError as e:
+                        logger.error(f"Failed to truncate time series log: {str(e)}")
+
+            cutoffs = self._cutoffs(time.time())
+            for item_series in self._series.values():
+                item_series.trim(cutoffs)
+            self._seq = seq
+            self._pending = []
+        self._logged = logged
+
+    def clear(self):
+        """Forget every series and remove the files (the store was cleared)."""
+        with self._write_lock:
+            with self._lock:
+                self._series = {}
+                self._pending = []
+            for path in (self.snapshot_path, self.log_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._logged = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for GET /timeseries."""
+        with self._lock:
+            points = {resolution: sum(len(series.tier(resolution)['t']) for series in self._series.values())
+                      for resolution in RESOLUTIONS}
+            items = len(self._series)
+        return {
+            'items': items,
+            'points': points,
+            'retention_days': {resolution: seconds / 86400 for resolution, seconds in self.retention.items()},
+            'logged_since_snapshot': self._logged
+        }
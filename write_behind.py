@@ -0,0 +1,148 @@
+"""
+Write-Behind Save Scheduler
+Coalesces inventory saves and runs them off the request thread.
+"""
+
+import threading
+import time
+import logging
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindScheduler:
+    """
+    Background flusher for dirty state.
+
+    Request handlers call ``mark_dirty`` after changing state. A daemon thread
+    calls ``flush_fn`` once ``interval`` seconds have passed since the first
+    unsaved change, or straight away once ``max_pending`` changes have piled up.
+    Flushes never overlap, and ``flush`` / ``stop`` run one synchronously.
+
+    Args:
+        flush_fn: Callable that persists the current state
+        interval: Longest time (seconds) a change may stay unsaved
+        max_pending: Number of changes that triggers an immediate flush
+    """
+
+    def __init__(self, flush_fn: Callable[..., None], interval: float = 2.0, max_pending: int = 50):
+        self.flush_fn = flush_fn
+        self.interval = interval
+        self.max_pending = max_pending
+
+        self._pending = 0
+        self._first_dirty_at: Optional[float] = None
+        self._state_lock = threading.Lock()   # guards _pending/_first_dirty_at
+        self._flush_lock = threading.Lock()   # one flush at a time
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+        self.flush_count = 0
+        self.last_flush_seconds = 0.0
+        self.last_error: Optional[str] = None
+
+    @property
+    def pending(self) -> int:
+        """Number of changes not yet flushed."""
+        return self._pending
+
+    def _ensure_thread(self):
+        # Started on first use so importing the app (reloader parent, CLI tools)
+        # doesn't spawn a thread that never has work
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def mark_dirty(self, count: int = 1):
+        """
+        Note that state changed and needs saving.
+
+        Args:
+            count: Number of changes being reported
+        """
+        with self._state_lock:
+            if self._stopped:
+                run_now = True
+            else:
+                run_now = False
+                self._pending += count
+                if self._first_dirty_at is None:
+                    self._first_dirty_at = time.monotonic()
+                self._ensure_thread()
+                if self._pending >= self.max_pending:
+                    self._wakeup.set()
+        if run_now:
+            # After shutdown there is no thread left, so save inline
+            self.flush()
+
+    def flush(self, **kwargs) -> bool:
+        """
+        Save now on the calling thread.
+
+        Args:
+            **kwargs: Passed through to flush_fn
+
+        Returns:
+            bool: True if the flush ran without raising
+        """
+        with self._flush_lock:
+            with self._state_lock:
+                self._pending = 0
+                self._first_dirty_at = None
+            started = time.monotonic()
+            try:
+                self.flush_fn(**kwargs)
+                self.last_error = None
+                return True
+            except Exception as e:
+                # Keep the changes marked dirty so the next flush retries them
+                with self._state_lock:
+                    self._pending += 1
+                    if self._first_dirty_at is None:
+                        self._first_dirty_at = time.monotonic()
+                self.last_error = str(e)
+                logger.error(f"Write-behind flush failed: {str(e)}")
+                return False
+            finally:
+                self.flush_count += 1
+                self.last_flush_seconds = time.monotonic() - started
+
+    def _run(self):
+        while not self._stopped:
+            with self._state_lock:
+                if self._first_dirty_at is None:
+                    timeout = self.interval
+                else:
+                    timeout = max(0.0, self._first_dirty_at + self.interval - time.monotonic())
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+            if self._stopped:
+                break
+            with self._state_lock:
+                due = self._pending > 0 and (
+                    self._pending >= self.max_pending or
+                    time.monotonic() - self._first_dirty_at >= self.interval
+                )
+            if due:
+                self.flush()
+
+    def stop(self):
+        """Stop the background thread and flush anything still pending."""
+        with self._state_lock:
+            self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
+        if self._pending:
+            self.flush()
+
+    def stats(self) -> dict:
+        """Counters for the /flush endpoint and debugging."""
+        return {
+            'pending': self._pending,
+            'flush_count': self.flush_count,
+            'last_flush_seconds': round(self.last_flush_seconds, 4),
+            'last_error': self.last_error
+        }